@@ -0,0 +1,7 @@
+"""Benchmarks of spateo hot paths on locally generated synthetic data.
+
+Run all benchmarks at all sizes with ``python -m benchmarks`` from the repository root, see ``python -m benchmarks
+--help`` for selecting cases and sizes and for writing the results to a JSON or CSV file.
+"""
+from .cases import CASES, SIZES
+from .run import run_benchmarks
@@ -0,0 +1,142 @@
+"""Benchmark cases. Each case generates its inputs with ``setup(size, seed)`` (not timed) and runs the benchmarked
+call with ``run(inputs)`` (timed). ``SIZES`` maps each case to the size parameter used at each size label.
+"""
+import os
+import shutil
+import tempfile
+
+import anndata
+import numpy as np
+import pandas as pd
+
+from spateo.alignment import morpho_align
+from spateo.io import read_bgi_agg
+from spateo.segmentation import score_and_mask_pixels
+from spateo.tools import construct_nn_graph, moran_i
+from spateo.tools.CCI_effects_modeling import MuSIC, define_spateo_argparse
+
+from . import synthetic
+
+SIZES = {
+    # Pixels along each axis of the GEM / pixel image.
+    "gem_ingest": {"small": 200, "medium": 600, "large": 1500},
+    "score_and_mask_pixels": {"small": 200, "medium": 500, "large": 1000},
+    # Number of cells.
+    "construct_nn_graph": {"small": 1000, "medium": 3000, "large": 10000},
+    "moran_i": {"small": 1000, "medium": 5000, "large": 20000},
+    "morpho_align": {"small": 1000, "medium": 5000, "large": 20000},
+    "music_fit": {"small": 200, "medium": 500, "large": 1500},
+}
+
+
+def _setup_gem_ingest(size, seed):
+    directory = tempfile.mkdtemp(prefix="spateo_benchmark_")
+    path = os.path.join(directory, "synthetic.gem.gz")
+    n_rows = synthetic.write_gem(path, size, seed=seed)
+    return {"path": path, "n_rows": n_rows}
+
+
+def _run_gem_ingest(inputs):
+    return read_bgi_agg(inputs["path"])
+
+
+def _teardown_gem_ingest(inputs):
+    os.remove(inputs["path"])
+    os.rmdir(os.path.dirname(inputs["path"]))
+
+
+def _setup_score_and_mask_pixels(size, seed):
+    return {"adata": synthetic.simulate_pixels(size, seed=seed)}
+
+
+def _run_score_and_mask_pixels(inputs):
+    adata = inputs["adata"]
+    score_and_mask_pixels(adata, "X", k=5, method="EM+gauss")
+    return adata
+
+
+def _setup_construct_nn_graph(size, seed):
+    adata, _ = synthetic.random_counts(size, 10, seed=seed)
+    return {"adata": adata}
+
+
+def _run_construct_nn_graph(inputs):
+    adata = inputs["adata"]
+    construct_nn_graph(adata, n_neighbors=8)
+    return adata
+
+
+def _setup_moran_i(size, seed):
+    adata, _ = synthetic.random_counts(size, 50, seed=seed)
+    return {"adata": adata}
+
+
+def _run_moran_i(inputs):
+    return moran_i(inputs["adata"], k=8, permutations=99)
+
+
+def _setup_morpho_align(size, seed):
+    rng = np.random.default_rng(seed)
+    source, coords = synthetic.random_counts(size, 50, seed=seed)
+    # The target slice is a rotated, translated and jittered copy of the source slice.
+    angle = np.pi / 8
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    target_coords = coords @ rotation.T + 5 + rng.normal(scale=0.3, size=coords.shape)
+    target, _ = synthetic.random_counts(size, 50, seed=seed + 1, coords=target_coords)
+    return {"models": [source, target]}
+
+
+def _run_morpho_align(inputs):
+    return morpho_align(inputs["models"], max_iter=50, verbose=False)
+
+
+def _setup_music_fit(size, seed):
+    rng = np.random.default_rng(seed)
+    adata, coords = synthetic.random_counts(size, 6, density=0.5, seed=seed)
+    X = np.log1p(adata.X[:, 1:].toarray())
+    betas = rng.normal(scale=0.2, size=X.shape[1])
+    y = rng.poisson(np.exp(0.5 + X @ betas))
+    # MuSIC reads coordinates, target and independent variables, in this order, from the columns of a .csv file.
+    data = pd.DataFrame(
+        np.column_stack([coords, y, X]),
+        index=adata.obs_names,
+        columns=["x", "y", "target"] + [f"feature{i}" for i in range(X.shape[1])],
+    )
+    directory = tempfile.mkdtemp(prefix="spateo_benchmark_")
+    csv_path = os.path.join(directory, "data.csv")
+    data.to_csv(csv_path)
+    os.makedirs(os.path.join(directory, "output"))
+
+    parser, args_list = define_spateo_argparse(
+        csv_path=csv_path,
+        output_path=os.path.join(directory, "output", "music.csv"),
+        mod_type="niche",
+        target="target",
+        distr="poisson",
+        bw=50.0,
+    )
+    model = MuSIC(parser, args_list, verbose=False, save_subsampling=False)
+    model._set_up_model(verbose=False)
+    # Fitting reads the cell type of each sample from an AnnData object, which a .csv input does not provide.
+    model.adata = anndata.AnnData(obs=pd.DataFrame({model.group_key: "NA"}, index=data.index))
+    return {"model": model, "directory": directory}
+
+
+def _run_music_fit(inputs):
+    # Adaptive bisquare bandwidth of 50 neighbors, so that the fit skips the bandwidth search.
+    inputs["model"].fit(verbose=False)
+    return inputs["model"]
+
+
+def _teardown_music_fit(inputs):
+    shutil.rmtree(inputs["directory"])
+
+
+CASES = {
+    "gem_ingest": (_setup_gem_ingest, _run_gem_ingest, _teardown_gem_ingest),
+    "score_and_mask_pixels": (_setup_score_and_mask_pixels, _run_score_and_mask_pixels, None),
+    "construct_nn_graph": (_setup_construct_nn_graph, _run_construct_nn_graph, None),
+    "moran_i": (_setup_moran_i, _run_moran_i, None),
+    "morpho_align": (_setup_morpho_align, _run_morpho_align, None),
+    "music_fit": (_setup_music_fit, _run_music_fit, _teardown_music_fit),
+}
@@ -0,0 +1,137 @@
+"""Runner of the benchmark cases, recording wall time and peak RSS with the profiling of the spateo logger manager."""
+import argparse
+import gc
+import time
+from typing import Callable, List, Optional, Union
+
+from spateo.logging import logger_manager as lm
+
+from .cases import CASES, SIZES
+
+
+def run_benchmarks(
+    cases: Optional[List[str]] = None,
+    sizes: Optional[List[str]] = None,
+    repeat: int = 1,
+    seed: int = 0,
+    output: Optional[str] = None,
+    warmup: bool = True,
+) -> List[dict]:
+    """Run benchmark cases on synthetic inputs.
+
+    Args:
+        cases: Names of the cases to run, all cases in :data:`CASES` if None.
+        sizes: Size labels to run each case at ("small", "medium", "large"), all sizes if None.
+        repeat: Number of timed runs of each case at each size. Inputs are regenerated for every run.
+        seed: Random seed of the synthetic inputs.
+        output: Optional path of a JSON or CSV file to write all profiling records to, including the records of
+            profiled spateo API calls nested in the benchmarked calls.
+        warmup: Whether to run each case once untimed on its smallest inputs before the timed runs, so that the timed
+            runs do not measure one-off costs such as numba compilation.
+
+    Returns:
+        Profiling records of the benchmarked calls, named "benchmark.<case>" and annotated with the size label and
+        size parameter. A failed run has an "error" entry with the exception type, including runs whose setup or
+        warm-up failed.
+    """
+    cases = list(CASES) if cases is None else cases
+    sizes = ["small", "medium", "large"] if sizes is None else sizes
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark cases {sorted(unknown)}, available cases are {list(CASES)}.")
+
+    lm.enable_profiling()
+    try:
+        for case in cases:
+            setup, run, teardown = CASES[case]
+            if warmup:
+                try:
+                    _warm_up(setup, run, teardown, SIZES[case]["small"], seed)
+                except Exception as e:
+                    lm.main_warning(f"Benchmark {case} failed in warm-up: {type(e).__name__}: {e}")
+                    for size in sizes:
+                        _record_failure(case, size, "warm-up", e)
+                    continue
+            for size in sizes:
+                size_param = SIZES[case][size]
+                for r in range(repeat):
+                    try:
+                        inputs = setup(size_param, seed + r)
+                    except Exception as e:
+                        lm.main_warning(f"Benchmark {case} ({size}) failed in setup: {type(e).__name__}: {e}")
+                        _record_failure(case, size, r, e)
+                        continue
+                    gc.collect()
+                    try:
+                        with lm.profile(f"benchmark.{case}", size=size, size_param=size_param, run=r):
+                            run(inputs)
+                    except Exception as e:
+                        # The profiling record of the run has the error.
+                        lm.main_warning(f"Benchmark {case} ({size}) failed: {type(e).__name__}: {e}")
+                    finally:
+                        if teardown is not None:
+                            teardown(inputs)
+                        del inputs
+    finally:
+        lm.disable_profiling()
+
+    if output is not None:
+        lm.dump_profile(output)
+    return [record for record in lm.get_profile_records() if record["name"].startswith("benchmark.")]
+
+
+def _warm_up(setup: Callable, run: Callable, teardown: Optional[Callable], size_param: int, seed: int):
+    """Untimed run of a benchmark case."""
+    inputs = setup(size_param, seed)
+    try:
+        run(inputs)
+    finally:
+        if teardown is not None:
+            teardown(inputs)
+
+
+def _record_failure(case: str, size: str, run: Union[int, str], error: Exception):
+    """Add the profiling record of a benchmark run that failed before its timed call."""
+    lm.profile_records.append(
+        {
+            "name": f"benchmark.{case}",
+            "depth": 0,
+            "start_time": time.time(),
+            "size": size,
+            "size_param": SIZES[case][size],
+            "run": run,
+            "error": type(error).__name__,
+            "wall_time_s": None,
+            "peak_rss_mb": None,
+            "peak_rss_increase_mb": None,
+        }
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point. Returns a non-zero exit status if any benchmark run failed."""
+    parser = argparse.ArgumentParser(description="Benchmark spateo hot paths on synthetic data.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), help="Cases to run (default: all).")
+    parser.add_argument(
+        "--sizes", nargs="+", choices=["small", "medium", "large"], help="Input sizes to run (default: all)."
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Number of timed runs per case and size.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic inputs.")
+    parser.add_argument("--output", help="JSON or CSV file to write all profiling records to.")
+    parser.add_argument("--no-warmup", action="store_true", help="Skip the untimed warm-up run of each case.")
+    args = parser.parse_args(argv)
+
+    records = run_benchmarks(args.cases, args.sizes, args.repeat, args.seed, args.output, warmup=not args.no_warmup)
+    print(f"{'case':<24}{'size':<8}{'param':>8}{'run':>8}{'time (s)':>12}{'peak RSS (MB)':>16}")
+    for record in records:
+        status = record["wall_time_s"] if "error" not in record else float("nan")
+        print(
+            f"{record['name'][len('benchmark.'):]:<24}{record['size']:<8}{record['size_param']:>8}{record['run']:>8}"
+            f"{status:>12.3f}{record['peak_rss_mb'] or float('nan'):>16.1f}"
+        )
+
+    failed = [record for record in records if "error" in record]
+    if failed:
+        lm.main_warning(f"{len(failed)} of {len(records)} benchmark runs failed.")
+        return 1
+    return 0
@@ -0,0 +1,112 @@
+"""Generators of synthetic benchmark inputs. Everything is generated locally from a seed, no data is downloaded."""
+import gzip
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from anndata import AnnData
+from scipy.sparse import csr_matrix
+
+from spateo.configuration import SKM
+from spateo.segmentation.simulation import simulate_cells
+
+
+def simulate_pixels(side: int, cell_density: float = 0.002, seed: int = 0) -> AnnData:
+    """Simulate a square pixel-level UMI count image with elliptical cells.
+
+    Args:
+        side: Number of pixels along each axis.
+        cell_density: Number of cells per pixel.
+        seed: Random seed.
+
+    Returns:
+        AnnData of shape (side, side) as returned by :func:`spateo.segmentation.simulation.simulate_cells`.
+    """
+    return simulate_cells((side, side), max(int(side * side * cell_density), 1), seed=seed)
+
+
+def write_gem(path: str, side: int, n_genes: int = 200, seed: int = 0) -> int:
+    """Write a gzipped Stereo-seq GEM file (geneID, x, y, MIDCounts) with simulated pixel counts.
+
+    The total UMI count of each pixel is taken from :func:`simulate_pixels` and split over randomly chosen genes.
+
+    Args:
+        path: Path of the output file, should end with ``.gz``.
+        side: Number of pixels along each axis.
+        n_genes: Number of distinct genes.
+        seed: Random seed.
+
+    Returns:
+        Number of rows written.
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.asarray(simulate_pixels(side, seed=seed).X)
+    x, y = np.nonzero(counts)
+    total = counts[x, y].astype(np.int64)
+    # Split each pixel's counts over one to three genes.
+    n_split = rng.integers(1, 4, size=len(x))
+    rows = np.repeat(np.arange(len(x)), n_split)
+    split = np.maximum(np.repeat(total, n_split) // np.repeat(n_split, n_split), 1)
+    df = pd.DataFrame(
+        {
+            "geneID": np.char.add("gene", rng.integers(0, n_genes, size=len(rows)).astype(str)),
+            "x": x[rows],
+            "y": y[rows],
+            "MIDCounts": split,
+        }
+    )
+    with gzip.open(path, "wt") as f:
+        df.to_csv(f, sep="\t", index=False)
+    return len(df)
+
+
+def random_points(n: int, dim: int = 2, seed: int = 0) -> np.ndarray:
+    """Uniformly random spatial coordinates in a square (cube) with unit density.
+
+    Args:
+        n: Number of points.
+        dim: Number of spatial dimensions.
+        seed: Random seed.
+
+    Returns:
+        Array of shape (n, dim).
+    """
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, n ** (1 / dim), size=(n, dim))
+
+
+def random_counts(
+    n_obs: int, n_vars: int, density: float = 0.1, seed: int = 0, coords: np.ndarray = None
+) -> Tuple[AnnData, np.ndarray]:
+    """Sparse count matrix of cells at random spatial positions, wrapped in an AnnData.
+
+    Half of the genes follow a smooth spatial pattern so that spatial statistics and alignment have signal to find.
+
+    Args:
+        n_obs: Number of cells.
+        n_vars: Number of genes.
+        density: Fraction of nonzero counts.
+        seed: Random seed.
+        coords: Optional coordinates of shape (n_obs, 2), generated with :func:`random_points` if not given.
+
+    Returns:
+        AnnData with counts in ``.X`` (CSR) and coordinates in ``.obsm["spatial"]``, and the coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    if coords is None:
+        coords = random_points(n_obs, seed=seed)
+    # Smooth spatial signal for the first half of the genes.
+    freq = rng.uniform(0.5, 2, size=(2, n_vars)) * 2 * np.pi / coords.max()
+    rate = 1 + np.sin(coords @ freq)
+    rate[:, n_vars // 2 :] = 1
+    mask = rng.random((n_obs, n_vars)) < density
+    values = rng.poisson(rate[mask] * 3) + 1
+    rows, cols = np.nonzero(mask)
+    X = csr_matrix((values.astype(np.float32), (rows, cols)), shape=(n_obs, n_vars))
+
+    adata = AnnData(X=X)
+    adata.obs_names = [f"cell{i}" for i in range(n_obs)]
+    adata.var_names = [f"gene{i}" for i in range(n_vars)]
+    adata.obsm["spatial"] = coords
+    SKM.init_adata_type(adata, SKM.ADATA_UMI_TYPE)
+    return adata, coords
@@ -1,11 +1,34 @@
 """Spatiotemporal modeling of spatial transcriptomics
 """
 
+import importlib
+from typing import TYPE_CHECKING
+
 from .get_version import get_version
 
 __version__ = get_version(__file__)
 del get_version
 
-from . import align, cs, dd, io, pl, pp, sample_data, svg, tdr, tl
 from .configuration import config
 from .data_io import *
+
+# Subpackages are imported on first attribute access (e.g. `st.tl`), so that `import spateo` and light-weight entry
+# points such as `st.io` do not pay for the heavy backends (torch, tensorflow, pyvista, ...) of the other subpackages.
+_LAZY_SUBMODULES = ("align", "cs", "dd", "io", "pl", "pp", "sample_data", "svg", "tdr", "tl")
+
+if TYPE_CHECKING:
+    from . import align, cs, dd, io, pl, pp, sample_data, svg, tdr, tl
+
+
+def __getattr__(name: str):
+    if name in _LAZY_SUBMODULES:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module
+        # Apply the thread settings to backends (torch, tensorflow, ...) loaded by the subpackage.
+        config._set_backend_threads(config.n_threads, loaded_only=True)
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY_SUBMODULES))
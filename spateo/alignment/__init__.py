@@ -4,6 +4,7 @@ from .morpho_alignment import morpho_align, morpho_align_ref, morpho_align_spars
 from .paste_alignment import paste_align, paste_align_ref
 from .transform import BA_transform, BA_transform_and_assignment, paste_transform
 from .utils import (
+    coords_tree,
     downsampling,
     get_labels_based_on_coords,
     get_optimal_mapping_relationship,
@@ -3,7 +3,6 @@ try:
 except ImportError:
     from typing_extensions import Literal
 
-from itertools import chain
 from typing import List, Optional, Tuple, Union
 
 import numpy as np
@@ -14,11 +13,23 @@ from scipy.spatial import ConvexHull, Delaunay
 from .transform import BA_transform
 
 
-def _merge_models(models):
-    merged_model = models[0]
-    for model in models[1:]:
-        merged_model = merged_model.merge(model)
-    return merged_model
+def _grid_lines(min_vec: np.ndarray, max_vec: np.ndarray, grid_num: np.ndarray, line_points: int) -> np.ndarray:
+    """Points of the grid lines parallel to each axis, stacked line after line.
+
+    The lines parallel to an axis are placed at every combination of ``grid_num`` levels along the other axes, and
+    each consists of ``line_points`` points evenly spaced along the axis.
+    """
+    dims = len(min_vec)
+    lines = []
+    for axis in range(dims):
+        others = [d for d in range(dims) if d != axis]
+        levels = np.meshgrid(*[np.linspace(min_vec[d], max_vec[d], grid_num[d]) for d in others], indexing="ij")
+        levels = np.stack(levels, axis=-1).reshape(-1, dims - 1)
+        line = np.empty((levels.shape[0], line_points, dims))
+        line[:, :, axis] = np.linspace(min_vec[axis], max_vec[axis], line_points)
+        line[:, :, others] = levels[:, None, :]
+        lines.append(line.reshape(-1, dims))
+    return np.concatenate(lines, axis=0)
 
 
 def grid_deformation(
@@ -30,71 +41,53 @@ def grid_deformation(
     grid_num: Optional[np.asarray] = None,
     dtype: str = "float64",
     device: str = "cpu",
+    line_points: int = 1000,
 ):
+    """Generate a regular grid (or 3D lattice) of lines spanning the model and its deformation by the vector field.
+
+    All grid points are transformed in a single ``BA_transform`` call and both grids are built as a single polydata.
+
+    Args:
+        model: AnnData object containing the coordinates and the vector field.
+        spatial_key: The key in ``.obsm`` that corresponds to the spatial coordinates.
+        vecfld_key: The key in ``.uns`` that corresponds to the vector field.
+        key_added: The key in ``.point_data`` of the deformed grid under which to add the mean absolute velocity.
+        deformation_scale: If deformation_scale is greater than 1, increase the degree of deformation.
+        grid_num: Number of lines along each axis. Defaults to 20 along each axis.
+        dtype: The floating-point number type. Only ``float32`` and ``float64``.
+        device: Equipment used to run the program. You can also set the specified GPU for running. ``E.g.: '0'``.
+        line_points: Number of points along each line.
+
+    Returns:
+        The grid and the deformed grid.
+    """
+    coords = np.asarray(model.obsm[spatial_key])
+    dims = coords.shape[1]
     # Check the number of lines
-    grid_num = np.asarray([20, 20]) if grid_num is None else grid_num
+    grid_num = np.asarray([20] * dims) if grid_num is None else np.asarray(grid_num)
 
     # Generate grid
-    grid, deformed_grid = [], []
-    x_min, y_min = np.min(model.obsm[spatial_key], axis=0)
-    x_max, y_max = np.max(model.obsm[spatial_key], axis=0)
-
-    x_level_list = np.linspace(x_min, x_max, grid_num[0], endpoint=True)  # np.arange(x_min, x_max, grid_num[0])
-    for x_level in x_level_list:
-        liney = np.linspace(y_min, y_max, 1000)[:, np.newaxis]
-        liney = np.concatenate((x_level * np.ones_like(liney), liney), axis=1)
-        deform_liney, quary_velocities, _ = BA_transform(
-            vecfld=model.uns[vecfld_key],
-            quary_points=liney,
-            deformation_scale=deformation_scale,
-            device=device,
-            dtype=dtype,
-        )
-
-        liney = np.c_[liney, np.zeros(shape=(liney.shape[0], 1))]
-        liney = np.asarray(list(chain.from_iterable(zip(liney[:-1, :], liney[1:, :]))))
-        pv_liney = pv.line_segments_from_points(liney)
-        pv_liney.point_data[key_added] = np.zeros(shape=(liney.shape[0],))
-        grid.append(pv_liney)
-
-        deform_liney = np.c_[deform_liney, np.zeros(shape=(deform_liney.shape[0], 1))]
-        deform_liney = np.asarray(list(chain.from_iterable(zip(deform_liney[:-1, :], deform_liney[1:, :]))))
-        pv_deform_liney = pv.line_segments_from_points(deform_liney)
-
-        velocities = np.mean(np.abs(quary_velocities), axis=1).flatten()
-        velocities = np.asarray(list(chain.from_iterable(zip(velocities[:-1], velocities[1:]))))
-        pv_deform_liney.point_data[key_added] = velocities
-        deformed_grid.append(pv_deform_liney)
-
-    y_level_list = np.linspace(y_min, y_max, grid_num[1], endpoint=True)  # np.arange(y_min, y_max, grid_num[1])
-    for y_level in y_level_list:
-        linex = np.linspace(x_min, x_max, 1000)[:, np.newaxis]
-        linex = np.concatenate((linex, y_level * np.ones_like(linex)), axis=1)
-        deform_linex, quary_velocities, _ = BA_transform(
-            vecfld=model.uns[vecfld_key],
-            quary_points=linex,
-            deformation_scale=deformation_scale,
-            device=device,
-            dtype=dtype,
-        )
-
-        linex = np.c_[linex, np.zeros(shape=(linex.shape[0], 1))]
-        linex = np.asarray(list(chain.from_iterable(zip(linex[:-1, :], linex[1:, :]))))
-        pv_linex = pv.line_segments_from_points(linex)
-        pv_linex.point_data[key_added] = np.zeros(shape=(linex.shape[0],))
-        grid.append(pv_linex)
-
-        deform_linex = np.c_[deform_linex, np.zeros(shape=(deform_linex.shape[0], 1))]
-        deform_linex = np.asarray(list(chain.from_iterable(zip(deform_linex[:-1, :], deform_linex[1:, :]))))
-        pv_deform_linex = pv.line_segments_from_points(deform_linex)
-
-        velocities = np.mean(np.abs(quary_velocities), axis=1).flatten()
-        velocities = np.asarray(list(chain.from_iterable(zip(velocities[:-1], velocities[1:]))))
-        pv_deform_linex.point_data[key_added] = velocities
-        deformed_grid.append(pv_deform_linex)
-
-    pv_grid = _merge_models(grid)
-    pv_deformed_grid = _merge_models(deformed_grid)
+    grid = _grid_lines(np.min(coords, axis=0), np.max(coords, axis=0), grid_num, line_points)
+    deformed_grid, quary_velocities, _ = BA_transform(
+        vecfld=model.uns[vecfld_key],
+        quary_points=grid,
+        deformation_scale=deformation_scale,
+        device=device,
+        dtype=dtype,
+    )
+
+    # Connect consecutive points of each line
+    line_starts = np.arange(0, grid.shape[0], line_points)
+    segment_starts = (line_starts[:, None] + np.arange(line_points - 1)).ravel()
+    lines = np.column_stack([np.full(segment_starts.shape[0], 2), segment_starts, segment_starts + 1]).ravel()
+
+    if dims == 2:
+        grid = np.c_[grid, np.zeros(shape=(grid.shape[0], 1))]
+        deformed_grid = np.c_[deformed_grid, np.zeros(shape=(deformed_grid.shape[0], 1))]
+    pv_grid = pv.PolyData(grid, lines=lines)
+    pv_grid.point_data[key_added] = np.zeros(shape=(grid.shape[0],))
+    pv_deformed_grid = pv.PolyData(deformed_grid, lines=lines)
+    pv_deformed_grid.point_data[key_added] = np.mean(np.abs(quary_velocities), axis=1).flatten()
     return pv_grid, pv_deformed_grid
 
 
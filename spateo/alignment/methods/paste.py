@@ -4,6 +4,8 @@ import numpy as np
 import ot
 import torch
 from anndata import AnnData
+from scipy.sparse import csr_matrix, issparse
+from sklearn.cluster import MiniBatchKMeans
 from sklearn.decomposition import NMF
 
 from spateo.logging import logger_manager as lm
@@ -23,6 +25,106 @@ from .utils import (
 ######################################
 
 
+def _fgw(nx, coordsA, coordsB, M, a, b, alpha, G0, norm, numItermax, numItermaxEmd):
+    """Fused Gromov-Wasserstein coupling of two sets of points with dense spatial distance matrices."""
+    D_A = ot.dist(coordsA, coordsA, metric="euclidean")
+    D_B = ot.dist(coordsB, coordsB, metric="euclidean")
+
+    if norm:
+        D_A /= nx.min(D_A[D_A > 0])
+        D_B /= nx.min(D_B[D_B > 0])
+
+    # Run OT
+    constC, hC1, hC2 = ot.gromov.init_matrix(D_A, D_B, a, b, "square_loss")
+
+    try:
+        from ot.optim import cg
+    except ImportError:
+        from ot.gromov import cg
+
+    return cg(
+        a,
+        b,
+        (1 - alpha) * M,
+        alpha,
+        lambda G: ot.gromov.gwloss(constC, hC1, hC2, G),
+        lambda G: ot.gromov.gwggrad(constC, hC1, hC2, G),
+        G0,
+        armijo=False,
+        C1=D_A,
+        C2=D_B,
+        constC=constC,
+        numItermax=numItermax,
+        numItermaxEmd=numItermaxEmd,
+        log=True,
+    )
+
+
+def _anchor_assignments(coords: np.ndarray, n_anchors: int, random_seed: Optional[int] = None) -> csr_matrix:
+    """Cluster spots into at most `n_anchors` spatial anchors with mini-batch k-means.
+
+    Returns:
+        Sparse (spots x anchors) indicator matrix of the anchor of each spot. Empty clusters are dropped.
+    """
+    N = coords.shape[0]
+    if n_anchors >= N:
+        labels = np.arange(N)
+    else:
+        kmeans = MiniBatchKMeans(n_clusters=n_anchors, random_state=random_seed, n_init=3, batch_size=4096)
+        labels = np.unique(kmeans.fit_predict(coords), return_inverse=True)[1]
+    return csr_matrix((np.ones(N), (np.arange(N), labels)), shape=(N, labels.max() + 1))
+
+
+def _extend_anchor_coupling(
+    nx,
+    pi_anchors: np.ndarray,
+    assignA: csr_matrix,
+    assignB: csr_matrix,
+    a: np.ndarray,
+    X_A,
+    X_B,
+    dissimilarity: str,
+    n_neighbors: int,
+    threshold: float = 1e-3,
+) -> csr_matrix:
+    """Extend a coupling between anchors to a sparse coupling between spots.
+
+    Entries of the anchor coupling below `threshold` times the mass of their row are residues of the conditional
+    gradient line search and are dropped, rows are rescaled to keep their mass. The mass that the anchor coupling moves
+    from anchor p to anchor q is then split among the spots of p in proportion to their mass, and each spot sends its
+    share to its `n_neighbors` most similar spots (in expression) of q. Row marginals of the spot coupling are therefore
+    exactly `a`. Column marginals are not `b`: the mass an anchor of sampleB receives goes to the spots nearest in
+    expression rather than being spread over its spots by their mass, and the dropped entries are moved to the other
+    entries of their row.
+    """
+    anchor_mass_A = assignA.T @ a
+    row_mass = pi_anchors.sum(axis=1, keepdims=True)
+    pi_anchors = np.where(pi_anchors >= threshold * row_mass, pi_anchors, 0)
+    # Anchors without mass (e.g. spots with zero weight in `a`) keep an empty row instead of dividing 0 by 0.
+    kept_mass = pi_anchors.sum(axis=1, keepdims=True)
+    pi_anchors *= np.divide(row_mass, kept_mass, out=np.zeros_like(row_mass), where=kept_mass > 0)
+    spotsA = np.split(assignA.tocsc().indices, assignA.tocsc().indptr[1:-1])
+    spotsB = np.split(assignB.tocsc().indices, assignB.tocsc().indptr[1:-1])
+    rows, cols, vals = [], [], []
+    for p, q in zip(*np.nonzero(pi_anchors)):
+        if anchor_mass_A[p] <= 0:
+            continue
+        idxA, idxB = spotsA[p], spotsB[q]
+        k = min(n_neighbors, len(idxB))
+        dist = nx.to_numpy(calc_exp_dissimilarity(X_A=X_A[idxA], X_B=X_B[idxB], dissimilarity=dissimilarity))
+        nearest = (
+            np.argpartition(dist, k - 1, axis=1)[:, :k] if k < len(idxB) else np.tile(np.arange(k), (len(idxA), 1))
+        )
+        share = pi_anchors[p, q] * a[idxA] / anchor_mass_A[p] / k
+        rows.append(np.repeat(idxA, k))
+        cols.append(idxB[nearest].ravel())
+        vals.append(np.repeat(share, k))
+    return csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(assignA.shape[0], assignB.shape[0]),
+    )
+
+
 def paste_pairwise_align(
     sampleA: AnnData,
     sampleB: AnnData,
@@ -40,7 +142,10 @@ def paste_pairwise_align(
     dtype: str = "float32",
     device: str = "cpu",
     verbose: bool = True,
-) -> Tuple[np.ndarray, Optional[int]]:
+    n_anchors: Optional[int] = None,
+    anchor_neighbors: int = 1,
+    random_seed: Optional[int] = None,
+) -> Tuple[Union[np.ndarray, csr_matrix], Optional[int]]:
     """
     Calculates and returns optimal alignment of two slices.
 
@@ -63,10 +168,19 @@ def paste_pairwise_align(
         dtype: The floating-point number type. Only float32 and float64.
         device: Equipment used to run the program. You can also set the specified GPU for running. E.g.: '0'.
         verbose: If ``True``, print progress updates.
+        n_anchors: If provided and smaller than the number of spots of a slice, run in scalable mode: the spots of
+            each slice are clustered into at most this many spatial anchors with mini-batch k-means, FGW-OT is solved
+            between the anchors (with mean anchor expression), and the anchor coupling is extended to the spots by
+            matching each spot to its ``anchor_neighbors`` most similar spots of the coupled anchors. Memory then
+            grows linearly with the number of spots, and ``pi`` is returned as a sparse matrix. Its row marginals are
+            `a_distribution`, but its column marginals only approximate `b_distribution`.
+        anchor_neighbors: Number of spots of sampleB each spot of sampleA is coupled to, per coupled anchor, in
+            scalable mode.
+        random_seed: Random seed of the anchor clustering in scalable mode.
 
     Returns:
-        pi: Alignment of spots.
-        obj: Objective function output of FGW-OT.
+        pi: Alignment of spots. A ``scipy.sparse.csr_matrix`` in scalable mode.
+        obj: Objective function output of FGW-OT (between anchors in scalable mode).
     """
 
     # Preprocessing
@@ -83,55 +197,69 @@ def paste_pairwise_align(
         verbose=verbose,
     )
 
-    # Calculate spatial distances
     coordsA, coordsB = spatial_coords[0], spatial_coords[1]
-    D_A = ot.dist(coordsA, coordsA, metric="euclidean")
-    D_B = ot.dist(coordsB, coordsB, metric="euclidean")
-
-    # Calculate expression dissimilarity
     X_A, X_B = exp_matrices[0], exp_matrices[1]
-    M = calc_exp_dissimilarity(X_A=X_A, X_B=X_B, dissimilarity=dissimilarity)
 
     # init distributions
     a = np.ones((sampleA.shape[0],)) / sampleA.shape[0] if a_distribution is None else np.asarray(a_distribution)
     b = np.ones((sampleB.shape[0],)) / sampleB.shape[0] if b_distribution is None else np.asarray(b_distribution)
-    a = nx.from_numpy(a, type_as=type_as)
-    b = nx.from_numpy(b, type_as=type_as)
 
-    if norm:
-        D_A /= nx.min(D_A[D_A > 0])
-        D_B /= nx.min(D_B[D_B > 0])
+    if n_anchors is not None and max(sampleA.shape[0], sampleB.shape[0]) > n_anchors:
+        # Coarsen both slices into spatial anchors with mean expression and summed mass.
+        assignA = _anchor_assignments(nx.to_numpy(coordsA), n_anchors, random_seed)
+        assignB = _anchor_assignments(nx.to_numpy(coordsB), n_anchors, random_seed)
+        if verbose:
+            lm.main_info(f"Aligning {assignA.shape[1]} and {assignB.shape[1]} spatial anchors.")
+        meanA = csr_matrix(assignA.multiply(1 / assignA.sum(axis=0)))
+        meanB = csr_matrix(assignB.multiply(1 / assignB.sum(axis=0)))
+        anchor_coordsA = nx.from_numpy(meanA.T @ nx.to_numpy(coordsA), type_as=type_as)
+        anchor_coordsB = nx.from_numpy(meanB.T @ nx.to_numpy(coordsB), type_as=type_as)
+        M = calc_exp_dissimilarity(
+            X_A=nx.from_numpy(meanA.T @ nx.to_numpy(X_A), type_as=type_as),
+            X_B=nx.from_numpy(meanB.T @ nx.to_numpy(X_B), type_as=type_as),
+            dissimilarity=dissimilarity,
+        )
+        anchor_a = assignA.T @ a
+        anchor_b = assignB.T @ b
+        if G_init is None:
+            G0 = anchor_a[:, None] * anchor_b[None, :]
+        else:
+            G0 = np.asarray((assignA.T @ csr_matrix(G_init) @ assignB).todense())
+            G0 = G0 / G0.sum()
+        pi, log = _fgw(
+            nx,
+            anchor_coordsA,
+            anchor_coordsB,
+            M,
+            nx.from_numpy(anchor_a, type_as=type_as),
+            nx.from_numpy(anchor_b, type_as=type_as),
+            alpha,
+            nx.from_numpy(G0, type_as=type_as),
+            norm,
+            numItermax,
+            numItermaxEmd,
+        )
+        pi = _extend_anchor_coupling(
+            nx, nx.to_numpy(pi), assignA, assignB, a, X_A, X_B, dissimilarity, anchor_neighbors
+        )
+        obj = nx.to_numpy(log["loss"][-1])
+        if device != "cpu":
+            torch.cuda.empty_cache()
+        return pi, obj
 
-    # Run OT
-    constC, hC1, hC2 = ot.gromov.init_matrix(D_A, D_B, a, b, "square_loss")
+    # Calculate expression dissimilarity
+    M = calc_exp_dissimilarity(X_A=X_A, X_B=X_B, dissimilarity=dissimilarity)
+
+    a = nx.from_numpy(a, type_as=type_as)
+    b = nx.from_numpy(b, type_as=type_as)
 
     if G_init is None:
         G0 = a[:, None] * b[None, :]
     else:
-        G_init = nx.from_numpy(G_init, type_as=type_as)
+        G_init = nx.from_numpy(G_init.toarray() if issparse(G_init) else G_init, type_as=type_as)
         G0 = (1 / nx.sum(G_init)) * G_init
 
-    try:
-        from ot.optim import cg
-    except ImportError:
-        from ot.gromov import cg
-
-    pi, log = ot.gromov.cg(
-        a,
-        b,
-        (1 - alpha) * M,
-        alpha,
-        lambda G: ot.gromov.gwloss(constC, hC1, hC2, G),
-        lambda G: ot.gromov.gwggrad(constC, hC1, hC2, G),
-        G0,
-        armijo=False,
-        C1=D_A,
-        C2=D_B,
-        constC=constC,
-        numItermax=numItermax,
-        numItermaxEmd=numItermaxEmd,
-        log=True,
-    )
+    pi, log = _fgw(nx, coordsA, coordsB, M, a, b, alpha, G0, norm, numItermax, numItermaxEmd)
 
     pi = nx.to_numpy(pi)
     obj = nx.to_numpy(log["loss"][-1])
@@ -182,7 +310,9 @@ def paste_center_align(
     dtype: str = "float32",
     device: str = "cpu",
     verbose: bool = True,
-) -> Tuple[AnnData, List[np.ndarray]]:
+    n_anchors: Optional[int] = None,
+    anchor_neighbors: int = 1,
+) -> Tuple[AnnData, List[Union[np.ndarray, csr_matrix]]]:
     """
     Computes center alignment of slices.
 
@@ -209,6 +339,9 @@ def paste_center_align(
         dtype: The floating-point number type. Only float32 and float64.
         device: Equipment used to run the program. You can also set the specified GPU for running. E.g.: '0'.
         verbose: If ``True``, print progress updates.
+        n_anchors: If provided, run the pairwise alignments in scalable mode with at most this many spatial anchors per
+            slice (see :func:`paste_pairwise_align`); the mappings are then sparse matrices.
+        anchor_neighbors: Number of spots each spot is coupled to, per coupled anchor, in scalable mode.
 
     Returns:
         - Inferred center sample with full and low dimensional representations (W, H) of the gene expression matrix.
@@ -246,10 +379,7 @@ def paste_center_align(
     else:
         pis = pis_init
         B = init_center_sample.shape[0] * sum(
-            [
-                lmbda[i] * np.dot(pis[i], to_dense_matrix(check_exp(samples[i], layer=layer)))
-                for i in range(len(samples))
-            ]
+            [lmbda[i] * (pis[i] @ to_dense_matrix(check_exp(samples[i], layer=layer))) for i in range(len(samples))]
         )
     init_NMF_model = center_NMF(n_components=n_components, random_seed=random_seed, dissimilarity=dissimilarity)
     W = init_NMF_model.fit_transform(B)
@@ -281,6 +411,9 @@ def paste_center_align(
                 dtype=dtype,
                 device=device,
                 verbose=verbose,
+                n_anchors=n_anchors,
+                anchor_neighbors=anchor_neighbors,
+                random_seed=random_seed,
             )
             new_pis.append(p)
             r.append(r_q)
@@ -288,10 +421,7 @@ def paste_center_align(
         pis = new_pis.copy()
         NMF_model = center_NMF(n_components, random_seed, dissimilarity=dissimilarity)
         B = W.shape[0] * sum(
-            [
-                lmbda[i] * np.dot(pis[i], to_dense_matrix(check_exp(samples[i], layer=layer)))
-                for i in range(len(samples))
-            ]
+            [lmbda[i] * (pis[i] @ to_dense_matrix(check_exp(samples[i], layer=layer))) for i in range(len(samples))]
         )
         W = NMF_model.fit_transform(B)
         H = NMF_model.components_
@@ -309,7 +439,7 @@ def paste_center_align(
     center_sample.uns["paste_W"] = W
     center_sample.uns["paste_H"] = H
     center_sample.uns["full_rank"] = center_sample.shape[0] * sum(
-        [lmbda[i] * np.dot(pis[i], to_dense_matrix(samples[i].X)) for i in range(len(samples))]
+        [lmbda[i] * (pis[i] @ to_dense_matrix(samples[i].X)) for i in range(len(samples))]
     )
     center_sample.uns["obj"] = R
     return center_sample, pis
@@ -327,16 +457,16 @@ def generalized_procrustes_analysis(X, Y, pi):
     Args:
         X: np array of spatial coordinates.
         Y: np array of spatial coordinates.
-        pi: mapping between the two layers output by PASTE.
+        pi: mapping between the two layers output by PASTE, dense or sparse.
 
     Returns:
         Aligned spatial coordinates of X, Y and the mapping relations.
     """
-    tX = pi.sum(axis=1).dot(X)
-    tY = pi.sum(axis=0).dot(Y)
+    tX = np.asarray(pi.sum(axis=1)).ravel().dot(X)
+    tY = np.asarray(pi.sum(axis=0)).ravel().dot(Y)
     X = X - tX
     Y = Y - tY
-    H = Y.T.dot(pi.T.dot(X))
+    H = Y.T.dot(pi.T @ X)
     U, S, Vt = np.linalg.svd(H)
     R = Vt.T.dot(U.T)
     Y = R.dot(Y.T).T
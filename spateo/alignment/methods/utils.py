@@ -8,9 +8,15 @@ import torch
 from anndata import AnnData
 from numpy import ndarray
 from scipy.linalg import pinv
-from scipy.sparse import issparse
+from scipy.sparse import csr_matrix, issparse, spmatrix
+from scipy.spatial import cKDTree
 from scipy.special import psi
 
+try:
+    from typing import Literal
+except ImportError:
+    from typing_extensions import Literal
+
 from spateo.logging import logger_manager as lm
 
 # Get the intersection of lists
@@ -1095,9 +1101,10 @@ def inlier_from_NN_debug(
 
 def voxel_data(
     coords: Union[np.ndarray, torch.Tensor],
-    gene_exp: Union[np.ndarray, torch.Tensor],
+    gene_exp: Union[np.ndarray, torch.Tensor, spmatrix],
     voxel_size: Optional[float] = None,
     voxel_num: Optional[int] = 10000,
+    method: Literal["ball", "grid"] = "ball",
 ):
     """
     Voxelization of the data.
@@ -1105,47 +1112,70 @@ def voxel_data(
     ----------
     coords: np.ndarray or torch.Tensor
         The coordinates of the data points.
-    gene_exp: np.ndarray or torch.Tensor
+    gene_exp: np.ndarray, torch.Tensor or scipy sparse matrix
         The gene expression of the data points.
     voxel_size: float
         The size of the voxel.
     voxel_num: int
         The number of voxels.
+    method: {'ball', 'grid'}
+        How data points are assigned to voxels. With ``'ball'``, a point belongs to every voxel whose center is
+        closer than ``voxel_size / 2``, found with a KD-tree range query between the voxel centers and the points.
+        With ``'grid'``, each point belongs only to the voxel with the nearest center, found from its integer grid
+        indices, and ``voxel_size`` is ignored.
     Returns
     -------
-    voxel_coords: np.ndarray or torch.Tensor
+    voxel_coords: np.ndarray
         The coordinates of the voxels.
-    voxel_gene_exp: np.ndarray or torch.Tensor
-        The gene expression of the voxels.
+    voxel_gene_exp: np.ndarray
+        The gene expression of the voxels, i.e. the mean expression of the data points assigned to them.
     """
-    nx = ot.backend.get_backend(coords, gene_exp)
+    if issparse(gene_exp):
+        nx = ot.backend.get_backend(coords)
+        gene_exp = csr_matrix(gene_exp)
+    else:
+        nx = ot.backend.get_backend(coords, gene_exp)
+        gene_exp = nx.to_numpy(gene_exp)
     N, D = coords.shape[0], coords.shape[1]
     coords = nx.to_numpy(coords)
-    gene_exp = nx.to_numpy(gene_exp)
 
     # create the voxel grid
     min_coords = np.min(coords, axis=0)
     max_coords = np.max(coords, axis=0)
     if voxel_size is None:
         voxel_size = np.sqrt(np.prod(max_coords - min_coords)) / (np.sqrt(N) / 5)
-        # print(voxel_size)
     voxel_steps = (max_coords - min_coords) / int(np.sqrt(voxel_num))
     voxel_coords = [
         np.arange(min_coord, max_coord, voxel_step)
         for min_coord, max_coord, voxel_step in zip(min_coords, max_coords, voxel_steps)
     ]
+    grid_shape = tuple(len(c) for c in voxel_coords)
     voxel_coords = np.stack(np.meshgrid(*voxel_coords), axis=-1).reshape(-1, D)
-    voxel_gene_exps = np.zeros((voxel_coords.shape[0], gene_exp.shape[1]))
-    is_voxels = np.zeros((voxel_coords.shape[0],))
-    # assign the data points to the voxels
-    for i, voxel_coord in enumerate(voxel_coords):
-        dists = np.sqrt(np.sum((coords - voxel_coord) ** 2, axis=1))
-        mask = dists < voxel_size / 2
-        if np.any(mask):
-            voxel_gene_exps[i] = np.mean(gene_exp[mask], axis=0)
-            is_voxels[i] = 1
-    voxel_coords = voxel_coords[is_voxels == 1, :]
-    voxel_gene_exps = voxel_gene_exps[is_voxels == 1, :]
+
+    # assign the data points to the voxels, as a (voxels x points) membership matrix
+    if method == "ball":
+        pairs = cKDTree(voxel_coords).sparse_distance_matrix(cKDTree(coords), voxel_size / 2, output_type="ndarray")
+        pairs = pairs[pairs["v"] < voxel_size / 2]
+        voxel_idx, point_idx = pairs["i"], pairs["j"]
+    elif method == "grid":
+        grid_idx = np.rint((coords - min_coords) / voxel_steps).astype(np.int64)
+        grid_idx = np.minimum(grid_idx, np.array(grid_shape) - 1)
+        # meshgrid uses "xy" indexing: the first two axes are swapped in the flattened voxel order.
+        grid_idx = grid_idx[:, [1, 0] + list(range(2, D))] if D > 1 else grid_idx
+        meshgrid_shape = (grid_shape[1], grid_shape[0]) + grid_shape[2:] if D > 1 else grid_shape
+        point_idx = np.arange(N)
+        voxel_idx = np.ravel_multi_index(tuple(grid_idx.T), meshgrid_shape)
+    else:
+        raise ValueError(f"Unknown voxelization method {method}, must be one of `ball`, `grid`.")
+    membership = csr_matrix((np.ones(len(voxel_idx)), (voxel_idx, point_idx)), shape=(voxel_coords.shape[0], N))
+
+    counts = np.asarray(membership.sum(axis=1)).ravel()
+    is_voxels = counts > 0
+    membership = membership[is_voxels]
+    voxel_gene_exps = membership @ gene_exp
+    voxel_gene_exps = voxel_gene_exps.toarray() if issparse(voxel_gene_exps) else np.asarray(voxel_gene_exps)
+    voxel_gene_exps = voxel_gene_exps.astype(np.float64) / counts[is_voxels, None]
+    voxel_coords = voxel_coords[is_voxels, :]
     return voxel_coords, voxel_gene_exps
 
 
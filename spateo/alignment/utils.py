@@ -214,22 +214,67 @@ def mapping_center_coords(modelA: AnnData, modelB: AnnData, center_key: str) ->
     }
 
 
+def coords_tree(model: AnnData, spatial_key: str = "align_spatial") -> cKDTree:
+    """Build a KD-tree of the coordinates of a model, to be reused across calls to
+    :func:`get_labels_based_on_coords`.
+
+    Args:
+        model: The model (AnnData Object).
+        spatial_key: The key in ``.obsm`` that corresponds to the coordinates.
+
+    Returns:
+        A ``scipy.spatial.cKDTree`` of ``model.obsm[spatial_key]``.
+    """
+    return cKDTree(np.asarray(model.obsm[spatial_key], dtype=np.float64))
+
+
 def get_labels_based_on_coords(
     model: AnnData,
     coords: np.ndarray,
     labels_key: Union[str, List[str]],
     spatial_key: str = "align_spatial",
+    tol: float = 1e-6,
+    tree: Optional[cKDTree] = None,
 ) -> pd.DataFrame:
-    """Obtain the label information in anndata.obs[key] corresponding to the coords."""
+    """Obtain the label information in anndata.obs[key] corresponding to the coords.
+
+    Each coordinate is matched to the nearest point of the model, and kept if it is within `tol` times the coordinate
+    scale of the model (its largest absolute coordinate) of it, so that coordinates that differ from the model's by
+    rounding noise (e.g. after a transformation, or a round trip through float32) are still matched.
+
+    Args:
+        model: The model (AnnData Object).
+        coords: Coordinates of shape (N, 2) or (N, 3) to get labels for.
+        labels_key: Key(s) in ``.obs`` of the labels.
+        spatial_key: The key in ``.obsm`` that corresponds to the coordinates of the model.
+        tol: Maximum distance between a coordinate and the nearest point of the model to be matched, relative to the
+            coordinate scale of the model. The default is about ten times the float32 machine epsilon, e.g. a
+            distance of 0.01 for coordinates up to 1e4.
+        tree: KD-tree of the coordinates of the model as returned by :func:`coords_tree`. Built if not provided; pass
+            it to reuse it across many sets of coordinates.
+
+    Returns:
+        A DataFrame with one row per matched coordinate, in the order of `coords`, with the coordinates (``x``, ``y``
+        and ``z`` for 3D coordinates), their index in `coords` (``map_index``), the index of the matched point of the
+        model (``model_index``), the distance between them (``distance``) and the labels.
+    """
 
     key = [labels_key] if isinstance(labels_key, str) else labels_key
+    tree = coords_tree(model, spatial_key) if tree is None else tree
 
-    cols = ["x", "y", "z"] if coords.shape[1] == 3 else ["x", "y"]
-    X_data = pd.DataFrame(model.obsm[spatial_key], columns=cols)
-    X_data[key] = model.obs[key].values
-    X_data.drop_duplicates(inplace=True, keep="first")
+    coords = np.asarray(coords, dtype=np.float64)
+    scale = max(np.abs(tree.mins).max(), np.abs(tree.maxes).max())
+    # The upper bound is exclusive and compared squared, so it is slightly enlarged to include exact matches.
+    upper_bound = max(tol * scale * (1 + 1e-12), 1e-150)
+    distance, model_index = tree.query(coords, k=1, distance_upper_bound=upper_bound)
+    # Unmatched coordinates have an infinite distance.
+    map_index = np.flatnonzero(np.isfinite(distance))
 
-    Y_data = pd.DataFrame(coords.copy(), columns=cols)
-    Y_data["map_index"] = Y_data.index
-    merge_data = pd.merge(Y_data, X_data, on=cols, how="inner")
+    cols = ["x", "y", "z"] if coords.shape[1] == 3 else ["x", "y"]
+    merge_data = pd.DataFrame(coords[map_index], columns=cols)
+    merge_data["map_index"] = map_index
+    merge_data["model_index"] = model_index[map_index]
+    merge_data["distance"] = distance[map_index]
+    for k in key:
+        merge_data[k] = model.obs[k].values[model_index[map_index]]
     return merge_data
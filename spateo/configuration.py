@@ -2,6 +2,7 @@
 import inspect
 import logging
 import os
+import sys
 import warnings
 from functools import wraps
 from typing import List, Optional, Tuple, Union
@@ -31,7 +32,9 @@ class SpateoConfig:
         n_threads: int = os.cpu_count(),
     ):
         self.logging_level = logging_level
-        self.n_threads = n_threads
+        # Only configure the threading backends that are already imported, so that importing spateo does not import
+        # torch or tensorflow. Setting :attr:`n_threads` explicitly later configures all available backends.
+        self._set_backend_threads(n_threads, loaded_only=True)
 
     @property
     def logging_level(self):
@@ -62,25 +65,31 @@ class SpateoConfig:
     @n_threads.setter
     def n_threads(self, n: int):
         lm.main_debug(f"Setting n_threads to {n}.")
-        try:
-            import torch
-
-            torch.set_num_threads(n)
-        except:
-            pass
-        try:
-            import cv2
-
-            cv2.setNumThreads(n)
-        except:
-            pass
-        try:
-            import tensorflow as tf
-
-            tf.config.threading.set_intra_op_parallelism_threads(n)
-            tf.config.threading.set_inter_op_parallelism_threads(n)
-        except:
-            pass
+        self._set_backend_threads(n)
+
+    def _set_backend_threads(self, n: int, loaded_only: bool = False):
+        if not loaded_only or "torch" in sys.modules:
+            try:
+                import torch
+
+                torch.set_num_threads(n)
+            except:
+                pass
+        if not loaded_only or "cv2" in sys.modules:
+            try:
+                import cv2
+
+                cv2.setNumThreads(n)
+            except:
+                pass
+        if not loaded_only or "tensorflow" in sys.modules:
+            try:
+                import tensorflow as tf
+
+                tf.config.threading.set_intra_op_parallelism_threads(n)
+                tf.config.threading.set_inter_op_parallelism_threads(n)
+            except:
+                pass
         self.__n_threads = n
 
 
@@ -201,8 +210,14 @@ class SpateoAdataKeyManager:
                         )
                     else:
                         raise ConfigurationError(f"AnnData is not AnnData object, but {type(adata)}.")
+                # Record a profiling record for the public API call, unless an inner check of the same function
+                # already does:
+                if lm.profiling and not getattr(func, "_profiled_api_call", False):
+                    with lm.profile(f"{unwrapped.__module__}.{unwrapped.__qualname__}", adata):
+                        return func(*args, **kwargs)
                 return func(*args, **kwargs)
 
+            wrapper._profiled_api_call = True
             return wrapper
 
         return decorator
@@ -6,6 +6,11 @@ from typing import Tuple
 import numpy as np
 from anndata import AnnData
 
+try:
+    from typing import Literal
+except ImportError:
+    from typing_extensions import Literal
+
 from ..configuration import SKM
 from ..logging import logger_manager as lm
 from .utils import *
@@ -26,6 +31,7 @@ def digitize(
     max_itr: int = 1e5,
     lh: float = 1,
     hh: float = 100,
+    solver: Literal["jacobi", "direct", "cg", "amg"] = "jacobi",
 ) -> None:
     """Calculate the "heat" for a closed area of interests by solving a PDE, partial differential equation, the heat
         equation. Boundary conditions are defined upon four user provided coordinates that set the direction of heat
@@ -47,6 +53,9 @@ def digitize(
         max_itr: Maximum number of iterations dedicated to solving the heat equation.
         lh: lowest digital-heat (temperature). Defaults to 1.
         hh: highest digital-heat (temperature). Defaults to 100.
+        solver: The method used to solve the heat equation, passed to `domain_heat_eqn_solver`. `jacobi` runs the
+            diffusion iterations while `direct`, `cg` and `amg` solve the equivalent sparse linear system, which is
+            much faster for large domains.
 
     Returns:
         Nothing but update the `adata` object with the following keys in `.obs`:
@@ -78,13 +87,13 @@ def digitize(
         lh=lh,
         hh=hh,
         max_itr=max_itr,
+        solver=solver,
     )
 
+    coords = adata.obsm[spatial_key][:, :2].astype(int)
+
     lm.main_info(f"Saving layer heat values to {dgl_layer_key}.")
-    adata.obs[dgl_layer_key] = 0.0
-    print(adata.obs[dgl_layer_key])
-    for i in range(len(adata)):
-        adata.obs[dgl_layer_key][i] = of_layer[int(adata.obsm[spatial_key][i, 0]), int(adata.obsm[spatial_key][i, 1])]
+    adata.obs[dgl_layer_key] = of_layer[coords[:, 0], coords[:, 1]]
 
     lm.main_info("Solve the column heat equation on spatial domain with the iso-column-line conditions.")
     of_column = domain_heat_eqn_solver(
@@ -98,12 +107,11 @@ def digitize(
         lh=lh,
         hh=hh,
         max_itr=max_itr,
+        solver=solver,
     )
 
     lm.main_info(f"Saving column heat values to {dgl_column_key}.")
-    adata.obs[dgl_column_key] = 0.0
-    for i in range(len(adata)):
-        adata.obs[dgl_column_key][i] = of_column[int(adata.obsm[spatial_key][i, 0]), int(adata.obsm[spatial_key][i, 1])]
+    adata.obs[dgl_column_key] = of_column[coords[:, 0], coords[:, 1]]
 
 
 @SKM.check_adata_is_type(SKM.ADATA_UMI_TYPE)
@@ -6,9 +6,16 @@ from typing import List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
+import scipy.sparse as sp
 from anndata import AnnData
+from scipy.sparse.linalg import bicgstab, cg, spsolve
 from skimage import morphology
 
+try:
+    from typing import Literal
+except ImportError:
+    from typing_extensions import Literal
+
 from ..configuration import SKM
 from ..logging import logger_manager as lm
 
@@ -87,17 +94,17 @@ def fill_grid_label(
         f"Assign layer/column number for each bucket with the {layer_label_key} and {column_label_key}, "
         f"respectively."
     )
-    for i in range(len(adata)):
-        if adata.obs[layer_label_key][i] == 0:
-            adata.obs[layer_label_key][i] = (
-                layer_grid_img[int(adata.obsm[spatial_key][i, 0]), int(adata.obsm[spatial_key][i, 1])] * curr_sign
-            )
-        if adata.obs[column_label_key][i] == 0:
-            adata.obs[column_label_key][i] = column_grid_img[
-                int(adata.obsm[spatial_key][i, 0]), int(adata.obsm[spatial_key][i, 1])
-            ]
-    adata.obs[layer_label_key][abs(adata.obs[layer_label_key]) == 255] = 0
-    adata.obs[column_label_key][adata.obs[column_label_key] == 255] = 0
+    coords = adata.obsm[spatial_key][:, :2].astype(int)
+    layer_labels = adata.obs[layer_label_key].values
+    column_labels = adata.obs[column_label_key].values
+    layer_labels = np.where(
+        layer_labels == 0, layer_grid_img[coords[:, 0], coords[:, 1]].astype(int) * curr_sign, layer_labels
+    )
+    column_labels = np.where(column_labels == 0, column_grid_img[coords[:, 0], coords[:, 1]].astype(int), column_labels)
+    layer_labels[np.abs(layer_labels) == 255] = 0
+    column_labels[column_labels == 255] = 0
+    adata.obs[layer_label_key] = layer_labels
+    adata.obs[column_label_key] = column_labels
 
     return layer_grid_img, column_grid_img
 
@@ -461,6 +468,103 @@ def effective_L2_error(
     return np.sqrt(np.sum((heat_field_j - heat_field_i) ** 2 * field_mask) / np.sum(heat_field_j**2 * field_mask))
 
 
+def _solve_sparse_system(
+    A: sp.spmatrix,
+    b: np.ndarray,
+    solver: Literal["direct", "cg", "amg"] = "direct",
+    max_err: float = 1e-5,
+    max_itr: float = 1e5,
+    symmetric: bool = True,
+) -> np.ndarray:
+    """Solve the sparse linear system `A x = b` that arises from the Dirichlet problem of the heat equation.
+
+    Args:
+        A: The sparse (n, n) system matrix.
+        b: The (n,) right hand side, carrying the contributions of the fixed boundary values.
+        solver: The backend used to solve the system. `direct` uses a sparse LU factorization, `cg` uses (bi)conjugate
+            gradients and `amg` uses an algebraic multigrid preconditioned Krylov solver from `pyamg`.
+        max_err: The relative residual tolerance for the iterative solvers.
+        max_itr: The maximal number of iterations for the iterative solvers.
+        symmetric: Whether `A` is symmetric positive definite.
+
+    Returns:
+        The (n,) solution vector.
+    """
+    A = sp.csr_matrix(A)
+    max_itr = int(max_itr)
+
+    if solver == "direct":
+        x = spsolve(A.tocsc(), b)
+    elif solver == "cg":
+        krylov = cg if symmetric else bicgstab
+        try:
+            x, info = krylov(A, b, rtol=max_err, maxiter=max_itr)
+        except TypeError:
+            # scipy < 1.12 names the tolerance `tol`.
+            x, info = krylov(A, b, tol=max_err, maxiter=max_itr)
+        if info > 0:
+            lm.main_info(f"Max iteration reached before the solver converged to the tolerance {max_err}.")
+    elif solver == "amg":
+        try:
+            import pyamg
+        except ImportError:
+            raise ImportError("You need to install the package `pyamg`." "\nInstall pyamg via `pip install pyamg`")
+
+        ml = pyamg.smoothed_aggregation_solver(A, symmetry="hermitian" if symmetric else "nonsymmetric")
+        x = ml.solve(b, tol=max_err, maxiter=max_itr, accel="cg" if symmetric else "gmres")
+    else:
+        raise ValueError(f"`solver` must be one of `jacobi`, `direct`, `cg` or `amg`, but got `{solver}`.")
+
+    return np.asarray(x).ravel()
+
+
+def _grid_dirichlet_system(
+    init_field: np.ndarray,
+    field_border: np.ndarray,
+    field_mask: np.ndarray,
+) -> Tuple[sp.csr_matrix, np.ndarray, np.ndarray]:
+    """Assemble the 5-point Laplacian of the heat equation on the interior of a spatial domain, with the values on the
+    domain border (and the image frame) as Dirichlet boundary conditions.
+
+    Args:
+        init_field: The field with the boundary values already set.
+        field_border: The border of the field of the spatial domain of interests.
+        field_mask: The field of the spatial domain of interests, used for masking.
+
+    Returns:
+        A: The sparse (n, n) system matrix over the n interior pixels.
+        b: The (n,) right hand side with the contributions of the neighboring boundary pixels.
+        free: A boolean mask of the interior pixels, in the same order as the rows of `A`.
+    """
+    free = (field_mask != 0) & (field_border == 0)
+    # pixels on the image frame are never updated by the diffusion, so they act as boundary values as well.
+    free[0, :] = free[-1, :] = free[:, 0] = free[:, -1] = False
+
+    n = int(free.sum())
+    index = np.full(free.shape, -1, dtype=np.int64)
+    index[free] = np.arange(n)
+    rows, cols = np.nonzero(free)
+    center = index[rows, cols]
+
+    A_rows, A_cols = [center], [center]
+    A_vals = [np.full(n, 4.0)]
+    b = np.zeros(n)
+    for dr, dc in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+        nbr = index[rows + dr, cols + dc]
+        is_free = nbr >= 0
+        A_rows.append(center[is_free])
+        A_cols.append(nbr[is_free])
+        A_vals.append(np.full(is_free.sum(), -1.0))
+        b[~is_free] += init_field[rows[~is_free] + dr, cols[~is_free] + dc]
+
+    A = sp.csr_matrix(
+        (np.concatenate(A_vals), (np.concatenate(A_rows), np.concatenate(A_cols))),
+        shape=(n, n),
+    )
+
+    return A, b, free
+
+
 def domain_heat_eqn_solver(
     heat_field: np.ndarray,
     min_line: np.ndarray,
@@ -473,6 +577,7 @@ def domain_heat_eqn_solver(
     max_itr: float = 1e5,
     lh: float = 1,
     hh: float = 100,
+    solver: Literal["jacobi", "direct", "cg", "amg"] = "jacobi",
 ) -> np.ndarray:
     """Given the boundaries and boundary conditions of a close spatial domain, solve heat equation (a simple partial
     differential equation) to define the "heat" for each spatial pixel which can be used to digitize the
@@ -494,6 +599,10 @@ def domain_heat_eqn_solver(
         max_itr: The maximal diffusion iteration error. Default to 1e5.
         lh: Lowest heat value. Defaults to 1.
         hh: Highest heat value. Defaults to 100.
+        solver: The method used to solve the heat equation. `jacobi` runs the diffusion update above until the field
+            converges. `direct`, `cg` and `amg` instead assemble the steady state of the diffusion as a sparse linear
+            system over the pixels inside the domain and solve it with a sparse LU factorization, conjugate gradients
+            or algebraic multigrid (requires `pyamg`), respectively; these are much faster on large domains.
 
     Returns:
         grid_field: The resultant field filled with final values after solving the heat equation.
@@ -505,6 +614,13 @@ def domain_heat_eqn_solver(
     add_gh_boundary(init_field, edge_line_a, lh, hh)
     add_gh_boundary(init_field, edge_line_b, lh, hh)
 
+    if solver != "jacobi":
+        A, b, free = _grid_dirichlet_system(init_field, field_border, field_mask)
+        lm.main_info(f"Solve the heat equation over {A.shape[0]} pixels with the `{solver}` solver.")
+        grid_field = init_field.copy()
+        grid_field[free] = _solve_sparse_system(A, b, solver=solver, max_err=max_err, max_itr=max_itr)
+        return grid_field * field_mask
+
     err = 1
     itr = 0
     grid_field = init_field.copy()
@@ -526,12 +642,13 @@ def domain_heat_eqn_solver(
 
 def digitize_general(
     pc: np.ndarray,
-    adj_mtx: np.ndarray,
+    adj_mtx: Union[np.ndarray, sp.spmatrix],
     boundary_lower: np.ndarray,
     boundary_upper: np.ndarray,
     max_itr: int = 1e5,
     lh: float = 1,
     hh: float = 100,
+    solver: Literal["jacobi", "direct", "cg", "amg"] = "jacobi",
 ) -> np.ndarray:
     """Calculate the "heat" for a general point cloud of interests by solving a PDE, partial differential equation,
     the heat equation. The two polar boundaries are given by their indices within the point cloud. The neighbor network
@@ -539,12 +656,15 @@ def digitize_general(
 
     Args:
         pc: An array of 3-D coordinates, representing the point cloud.
-        adj: A 2-D adjacency matrix of the neighbor network.
+        adj: A 2-D adjacency matrix of the neighbor network, either dense or sparse.
         boundary_low: The indices of points selected as lower boundary in the point cloud.
         boundary_low: The indices of points selected as upper boundary in the point cloud.
         max_itr: Maximum number of iterations dedicated to solving the heat equation.
         lh: lowest digital-heat (temperature). Defaults to 1.
         hh: highest digital-heat (temperature). Defaults to 100.
+        solver: The method used to solve the heat equation. `jacobi` iterates `field = field @ adj_mtx` until
+            convergence, while `direct`, `cg` and `amg` solve for the steady state of this iteration as a sparse linear
+            system (see `domain_heat_eqn_solver`).
 
     Returns:
         An array of "heat" values of each point in the point cloud.
@@ -555,6 +675,23 @@ def digitize_general(
     mask_field[boundary_upper] = hh
 
     max_err = 1e-5
+
+    if solver != "jacobi":
+        # The steady state satisfies field[free] = field @ adj_mtx[:, free], i.e.
+        # (I - adj_mtx[free][:, free].T) field[free] = adj_mtx[fixed][:, free].T @ field[fixed].
+        adj_mtx = sp.csr_matrix(adj_mtx)
+        free = mask_field == 0
+        adj_t = adj_mtx.T.tocsr()
+        A = sp.identity(free.sum(), format="csr") - adj_t[free][:, free]
+        b = adj_t[free][:, ~free] @ mask_field[~free]
+        symmetric = (abs(A - A.T) > 1e-12).nnz == 0
+        lm.main_info(f"Solve the heat equation over {A.shape[0]} points with the `{solver}` solver.")
+        grid_field = mask_field.copy()
+        grid_field[free] = _solve_sparse_system(
+            A, b, solver=solver, max_err=max_err, max_itr=max_itr, symmetric=symmetric
+        )
+        return grid_field
+
     err = 1
     itr = 0
     grid_field = mask_field.copy()
@@ -562,7 +699,8 @@ def digitize_general(
     while (err > max_err) and (itr <= max_itr):
         grid_field_pre = grid_field.copy()
 
-        grid_field = np.matmul(grid_field, adj_mtx)
+        # equivalent to `grid_field @ adj_mtx`, but also works for sparse adjacency matrices.
+        grid_field = np.asarray(adj_mtx.T @ grid_field).ravel()
 
         grid_field = np.where(mask_field != 0, mask_field, grid_field)
         err = np.sqrt(np.sum((grid_field - grid_field_pre) ** 2) / np.sum(grid_field**2))
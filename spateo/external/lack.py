@@ -1,9 +1,18 @@
+import csv
 import functools
+import json
 import logging
+import os
 import sys
+import threading
 import time
 from contextlib import contextmanager
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
 
 def silence_logger(name):
     """Given a logger name, silence it completely.
@@ -230,6 +239,43 @@ class Logger:
             self.finish_progress(progress_name="download")
 
 
+def peak_rss_mb():
+    """Peak resident set size of the current process in MB, or None if it cannot be determined on this platform."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def data_sizes(data):
+    """Sizes of an input data object for profiling records: n_obs, n_vars and nnz for AnnData-like objects, shape and
+    nnz for arrays and sparse matrices. nnz is only reported for sparse data, where it is available without a pass
+    over the data. Lists and tuples of AnnData-like objects report the summed n_obs and nnz.
+
+    :param data: the input data object
+    :return: dictionary of sizes
+    :rtype: dict
+    """
+    if isinstance(data, (list, tuple)):
+        sizes = [data_sizes(d) for d in data]
+        sizes = [s for s in sizes if "n_obs" in s]
+        if len(sizes) == 0:
+            return {}
+        nnz = [s["nnz"] for s in sizes]
+        return {
+            "n_obs": sum(s["n_obs"] for s in sizes),
+            "n_vars": sizes[0]["n_vars"],
+            "nnz": None if None in nnz else sum(nnz),
+        }
+    if hasattr(data, "n_obs") and hasattr(data, "n_vars"):
+        return {"n_obs": data.n_obs, "n_vars": data.n_vars, "nnz": getattr(getattr(data, "X", None), "nnz", None)}
+    shape = getattr(data, "shape", None)
+    if shape is not None and len(shape) == 2:
+        return {"n_obs": shape[0], "n_vars": shape[1], "nnz": getattr(data, "nnz", None)}
+    return {}
+
+
 class LoggerManager:
     DEBUG = logging.DEBUG
     INFO = logging.INFO
@@ -243,6 +289,10 @@ class LoggerManager:
     def __init__(self, namespace: str = "lack", temp_timer_logger: str = "lack-temp-timer-logger"):
         self.set_main_logger_namespace(namespace)
         self.temp_timer_logger = Logger(temp_timer_logger)
+        self.profiling = False
+        self.profile_records = []
+        # nesting depth of profiled calls, tracked per thread
+        self._profile_local = threading.local()
 
     def set_main_logger_namespace(self, namespace: str):
         self.main_logger = self.gen_logger(namespace)
@@ -341,3 +391,99 @@ class LoggerManager:
 
     def main_info_verbose_timeit(self, msg):
         self.main_logger.info(msg)
+
+    def enable_profiling(self, reset: bool = True):
+        """Start recording wall time, peak RSS and input sizes of profiled calls.
+
+        :param reset: whether to discard previously recorded profiling records
+        """
+        if reset:
+            self.reset_profile()
+        self.profiling = True
+
+    def disable_profiling(self):
+        """Stop recording profiling records. Recorded profiling records are kept."""
+        self.profiling = False
+
+    def reset_profile(self):
+        """Discard all recorded profiling records."""
+        self.profile_records = []
+
+    def get_profile_records(self):
+        """Recorded profiling records, one dictionary per profiled call, in the order the calls finished."""
+        return list(self.profile_records)
+
+    @contextmanager
+    def profile(self, name: str, data=None, **sizes):
+        """Context manager recording a profiling record for the enclosed block if profiling is enabled.
+
+        :param name: name of the profiled call
+        :param data: optional input data (e.g. AnnData) to record sizes of
+        :param sizes: additional sizes to record
+        """
+        if not self.profiling:
+            yield None
+            return
+        depth = getattr(self._profile_local, "depth", 0)
+        record = {"name": name, "depth": depth, "start_time": time.time()}
+        record.update(data_sizes(data))
+        record.update(sizes)
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        self._profile_local.depth = depth + 1
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            self._profile_local.depth = depth
+            record["wall_time_s"] = time.perf_counter() - start
+            record["peak_rss_mb"] = peak_rss_mb()
+            record["peak_rss_increase_mb"] = None if rss_before is None else record["peak_rss_mb"] - rss_before
+            self.profile_records.append(record)
+
+    def profiled(self, name: str = None, data_arg: int = 0):
+        """Function decorator recording a profiling record for each call of the function if profiling is enabled.
+
+        :param name: name of the profiled call, defaults to the qualified name of the function
+        :param data_arg: position of the argument to record input sizes of
+        """
+
+        def wrapper(func):
+            record_name = name if name is not None else f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def inner(*args, **kwargs):
+                if not self.profiling:
+                    return func(*args, **kwargs)
+                data = args[data_arg] if len(args) > data_arg else None
+                with self.profile(record_name, data):
+                    return func(*args, **kwargs)
+
+            return inner
+
+        return wrapper
+
+    def dump_profile(self, path: str, format: str = None):
+        """Write the recorded profiling records to a JSON or CSV file.
+
+        :param path: path of the output file
+        :param format: "json" or "csv", inferred from the file extension if not given
+        """
+        if format is None:
+            format = os.path.splitext(path)[1].lstrip(".").lower()
+        records = self.get_profile_records()
+        if format == "json":
+            with open(path, "w") as f:
+                json.dump(records, f, indent=2, default=str)
+        elif format == "csv":
+            fieldnames = []
+            for record in records:
+                fieldnames.extend(k for k in record if k not in fieldnames)
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            raise ValueError(f"Unsupported profiling output format {format}. Use 'json' or 'csv'.")
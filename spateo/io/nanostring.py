@@ -5,8 +5,9 @@ import glob
 import os
 import re
 import warnings
-from typing import List, NamedTuple, Optional, Union
+from typing import List, NamedTuple, Optional, Tuple, Union
 
+import imageio.v3 as iio
 import numpy as np
 import pandas as pd
 
@@ -15,6 +16,7 @@ with warnings.catch_warnings():
     import skimage.io
 
 from anndata import AnnData
+from joblib import Parallel, delayed
 from scipy.sparse import csr_matrix
 from typing_extensions import Literal
 
@@ -97,20 +99,44 @@ def read_nanostring_as_dataframe(path: str, label_columns: Optional[List[str]] =
     return df.rename(columns=rename)
 
 
-def stitch_images(stain_dir: str, positions_path: str, labels: bool = False) -> np.ndarray:
+def _fov_image_props(path: str) -> Tuple[Tuple[int, ...], np.dtype]:
+    """Shape and dtype of an FOV image, read from its header without decoding the pixels."""
+    props = iio.improps(path)
+    return tuple(props.shape), np.dtype(props.dtype)
+
+
+def stitch_images(
+    stain_dir: str,
+    positions_path: str,
+    labels: bool = False,
+    out_path: Optional[str] = None,
+    n_jobs: int = 1,
+) -> np.ndarray:
     """Stitch multiple FOVs into a single image using position information.
 
+    FOV images are decoded lazily, `n_jobs` at a time, and written into place
+    as soon as they are read, so at most a few FOVs are held in memory besides
+    the stitched image. When `out_path` is provided, the stitched image is a
+    disk-backed memory map, so peak memory stays bounded by the FOVs being
+    decoded.
+
     Args:
         stain_dir: Directory containing JPEG or TIFF files with filenames
             ending in '_FXXX' where XXX indicates the FOV index.
         positions_path: Path to CSV file containing FOV positions.
         labels: Whether these are labels (and therefore should be made unique).
+            Labels of each FOV are offset by the largest label of the FOVs
+            before it, in increasing FOV order.
+        out_path: Path of a `.npy` file to stitch the image into. If provided,
+            the returned array is a memory map of this file, which can be
+            reopened lazily with `np.load(out_path, mmap_mode="r")`.
+        n_jobs: Number of FOV images to decode in parallel.
 
     Returns:
         A numpy array containing the stitched image. May contain multiple channels,
             which is the last dimension of the array.
     """
-    # Load all images in stain_dir, indexed by FOV
+    # Find all images in stain_dir, indexed by FOV
     stain_fov_paths = {}
     for filename in os.listdir(stain_dir):
         path = os.path.join(stain_dir, filename)
@@ -120,6 +146,7 @@ def stitch_images(stain_dir: str, positions_path: str, labels: bool = False) ->
             if fov in stain_fov_paths:
                 raise IOError(f"Multiple images for FOV {fov} were found: {stain_fov_paths[fov]}, {path}.")
             stain_fov_paths[fov] = path
+    stain_fov_paths = dict(sorted(stain_fov_paths.items()))
     lm.main_debug(f"Found {len(stain_fov_paths)} FOV images.")
 
     # Read FOV positions and make sure they match exactly with the files.
@@ -129,40 +156,56 @@ def stitch_images(stain_dir: str, positions_path: str, labels: bool = False) ->
     fov_x = dict(fov_df["x_global_px"].astype(np.uint32))
     fov_y = dict(fov_df["y_global_px"].astype(np.uint32))
 
-    # Detect the size of the entire image.
+    # Detect the size of the entire image from the image headers.
     # Also, check that all the images have the same non-XY dimensions.
     xmin, ymin = min(fov_x.values()), min(fov_y.values())
     xmax, ymax = 0, 0
     extra_dims = None
     dtype = None
-    stain_fovs = {}
+    fov_shapes = {}
     for fov, path in stain_fov_paths.items():
         x, y = fov_x[fov], fov_y[fov]
-        img = skimage.io.imread(path)
-        xmax = max(xmax, x + img.shape[1] - 1)
-        ymax = max(ymax, y + img.shape[0] - 1)
-        stain_fovs[fov] = img
+        shape, _dtype = _fov_image_props(path)
+        xmax = max(xmax, x + shape[1] - 1)
+        ymax = max(ymax, y + shape[0] - 1)
+        fov_shapes[fov] = shape
 
         if extra_dims is None:
-            extra_dims = img.shape[2:]
-        elif extra_dims != img.shape[2:]:
+            extra_dims = shape[2:]
+        elif extra_dims != shape[2:]:
             raise IOError(f"FOV {path} has inconsistent non-XY dimensions.")
         if dtype is None:
-            dtype = img.dtype
-        elif dtype != img.dtype:
+            dtype = _dtype
+        elif dtype != _dtype:
             raise IOError(f"FOV {path} has inconsistent dtype.")
 
     if labels:
         dtype = np.uint
 
+    shape = (int(xmax - xmin + 1), int(ymax - ymin + 1)) + extra_dims
+    if out_path is not None:
+        lm.main_debug(f"Stitching {shape} image into {out_path}.")
+        img = np.lib.format.open_memmap(out_path, mode="w+", dtype=dtype, shape=shape)
+    else:
+        img = np.zeros(shape, dtype=dtype)
+
     last_label = 0
-    img = np.zeros((xmax - xmin + 1, ymax - ymin + 1) + extra_dims, dtype=dtype)
-    for fov, _img in stain_fovs.items():
-        x, y = fov_x[fov] - xmin, fov_y[fov] - ymin
-        if labels:
-            _img[_img > 0] += last_label
-            last_label = _img.max()
-        img[x : x + _img.shape[1], y : y + _img.shape[0]] = np.fliplr(np.swapaxes(_img, 0, 1))
+    fovs = list(stain_fov_paths.keys())
+    batch_size = 2 * max(n_jobs, 1)
+    with Parallel(n_jobs=n_jobs, backend="threading") as parallel:
+        for start in range(0, len(fovs), batch_size):
+            batch = fovs[start : start + batch_size]
+            for fov, _img in zip(batch, parallel(delayed(skimage.io.imread)(stain_fov_paths[fov]) for fov in batch)):
+                if _img.shape != fov_shapes[fov]:
+                    raise IOError(f"FOV {stain_fov_paths[fov]} has shape {_img.shape}, expected {fov_shapes[fov]}.")
+                x, y = fov_x[fov] - xmin, fov_y[fov] - ymin
+                if labels:
+                    _img = _img.astype(dtype)
+                    _img[_img > 0] += last_label
+                    last_label = max(last_label, _img.max())
+                img[x : x + _img.shape[1], y : y + _img.shape[0]] = np.fliplr(np.swapaxes(_img, 0, 1))
+    if out_path is not None:
+        img.flush()
     return img
 
 
@@ -212,6 +255,10 @@ def read_nanostring(
     label_columns: Optional[Union[str, List[str]]] = None,
     add_props: bool = True,
     version: Literal["cosmx"] = "cosmx",
+    stain_dir: Optional[str] = None,
+    positions_path: Optional[str] = None,
+    stain_out_path: Optional[str] = None,
+    n_jobs: int = 1,
 ) -> AnnData:
     """Read NanoString CosMx data as AnnData.
 
@@ -227,12 +274,23 @@ def read_nanostring(
             bounding box, centroid, etc.
         version: NanoString technology version. Currently only used to set the scale and
             scale units of each unit coordinate. This may change in the future.
+        stain_dir: Directory containing FOV stain images. If provided, the FOVs are
+            stitched with :func:`stitch_images` and the stitched image is stored in
+            `.uns["spatial"]["stain"]`.
+        positions_path: Path to CSV file containing FOV positions. Required when
+            `stain_dir` is provided.
+        stain_out_path: Path of a `.npy` file to stitch the stain image into. If
+            provided, the stain image is attached as a read-only memory map of this
+            file, which is loaded lazily. Otherwise, it is kept in memory.
+        n_jobs: Number of FOV images to decode in parallel.
 
     Returns:
         Bins x genes or labels x genes AnnData.
     """
     if sum([binsize is not None, label_columns is not None]) != 1:
         raise IOError("Exactly one of `binsize`, `label_columns` must be provided.")
+    if stain_dir is not None and positions_path is None:
+        raise IOError("`positions_path` must be provided when `stain_dir` is provided.")
     if binsize is not None and abs(int(binsize)) != binsize:
         raise IOError("Positive integer `binsize` must be provided when `segmentation_adata` is not provided.")
 
@@ -305,4 +363,12 @@ def read_nanostring(
     SKM.set_uns_spatial_attribute(adata, SKM.UNS_SPATIAL_BINSIZE_KEY, binsize)
     SKM.set_uns_spatial_attribute(adata, SKM.UNS_SPATIAL_SCALE_KEY, scale)
     SKM.set_uns_spatial_attribute(adata, SKM.UNS_SPATIAL_SCALE_UNIT_KEY, scale_unit)
+
+    if stain_dir is not None:
+        lm.main_info(f"Stitching stain images from {stain_dir}.")
+        stain = stitch_images(stain_dir, positions_path, out_path=stain_out_path, n_jobs=n_jobs)
+        if stain_out_path is not None:
+            del stain
+            stain = np.load(stain_out_path, mmap_mode="r")
+        SKM.set_uns_spatial_attribute(adata, SKM.STAIN_LAYER_KEY, stain)
     return adata
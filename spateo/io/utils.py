@@ -184,21 +184,90 @@ def get_bin_props(data: pd.DataFrame, binsize: int) -> pd.DataFrame:
     return props.set_index("label")
 
 
-def in_concave_hull(p: np.ndarray, concave_hull: Union[Polygon, MultiPolygon]) -> np.ndarray:
-    """Test if points in `p` are in `concave_hull` using scipy.spatial Delaunay's find_simplex.
+def _intersects_xy(concave_hull: Union[Polygon, MultiPolygon], p: np.ndarray) -> np.ndarray:
+    """Vectorized `concave_hull.intersects(Point(i))` for each point `i` in `p`."""
+    try:
+        import shapely
+
+        shapely.prepare(concave_hull)
+        return shapely.intersects_xy(concave_hull, p[:, 0], p[:, 1])
+    except (ImportError, AttributeError):
+        # shapely < 2.0
+        from shapely.prepared import prep
+
+        prepared = prep(concave_hull)
+        return np.array([prepared.intersects(Point(i)) for i in p], dtype=bool)
+
+
+def _in_concave_hull_raster(p: np.ndarray, concave_hull: Union[Polygon, MultiPolygon]) -> np.ndarray:
+    """Test if integer points in `p` are in `concave_hull` by rasterizing the hull over its bounding box.
+
+    Pixels close to the boundary of the hull are marked and the points on them are tested exactly, so that the result
+    is identical to the vectorized test.
+    """
+    x_min, y_min, x_max, y_max = concave_hull.bounds
+    # Pad by the width of the boundary lines.
+    x_min, y_min = math.floor(x_min) - 3, math.floor(y_min) - 3
+    x_max, y_max = math.ceil(x_max) + 3, math.ceil(y_max) + 3
+    mask = np.zeros((y_max - y_min + 1, x_max - x_min + 1), dtype=np.uint8)
+
+    def _ring(ring):
+        return np.round(np.asarray(ring.coords)[:, :2] - (x_min, y_min)).astype(np.int32)
+
+    polygons = concave_hull.geoms if isinstance(concave_hull, MultiPolygon) else [concave_hull]
+    rings = []
+    for polygon in polygons:
+        # Rasterize each polygon with its holes separately over its own bounding box, so that the holes of a polygon
+        # do not erase other polygons lying inside them.
+        exterior = _ring(polygon.exterior)
+        interiors = [_ring(interior) for interior in polygon.interiors]
+        (x0, y0), (x1, y1) = exterior.min(axis=0), exterior.max(axis=0)
+        polygon_mask = np.zeros((y1 - y0 + 1, x1 - x0 + 1), dtype=np.uint8)
+        cv2.fillPoly(polygon_mask, [exterior - (x0, y0)], 1)
+        if len(interiors) > 0:
+            cv2.fillPoly(polygon_mask, [interior - (x0, y0) for interior in interiors], 0)
+        mask[y0 : y1 + 1, x0 : x1 + 1] |= polygon_mask
+        rings.append(exterior)
+        rings.extend(interiors)
+    # Mark pixels close to the boundary as undecided.
+    cv2.polylines(mask, rings, True, 2, thickness=5)
+
+    res = np.zeros(p.shape[0], dtype=bool)
+    inside_box = (p[:, 0] >= x_min) & (p[:, 0] <= x_max) & (p[:, 1] >= y_min) & (p[:, 1] <= y_max)
+    idx = np.flatnonzero(inside_box)
+    values = mask[p[idx, 1] - y_min, p[idx, 0] - x_min]
+    res[idx[values == 1]] = True
+    undecided = idx[values == 2]
+    res[undecided] = _intersects_xy(concave_hull, p[undecided])
+    return res
+
+
+def in_concave_hull(
+    p: np.ndarray, concave_hull: Union[Polygon, MultiPolygon], rasterize: Optional[bool] = None
+) -> np.ndarray:
+    """Test if points in `p` are in `concave_hull` (points on the boundary included).
 
     Args:
         p: a `Nx2` coordinates of `N` points in `K` dimensions
         concave_hull: A polygon returned from the concave_hull function (the first value).
+        rasterize: Whether to rasterize the hull over its bounding box and look the points up in the resulting mask,
+            which is fastest for integer (e.g. bin) coordinates. Only points close to the boundary are then tested
+            against the polygon. Defaults to True for integer coordinates and False otherwise, in which case all
+            points are tested with a vectorized (shapely >= 2.0) or prepared geometry predicate.
 
     Returns:
-
+        A boolean array of length `N`, indicating whether each point is in the hull.
     """
     assert p.shape[1] == 2, "this function only works for two dimensional data points."
 
-    res = [concave_hull.intersects(Point(i)) for i in p]
-
-    return np.array(res)
+    p = np.asarray(p)
+    if rasterize is None:
+        rasterize = np.issubdtype(p.dtype, np.integer)
+    if rasterize:
+        if not np.issubdtype(p.dtype, np.integer):
+            raise ValueError("`rasterize` requires integer coordinates.")
+        return _in_concave_hull_raster(p.astype(np.int64), concave_hull)
+    return _intersects_xy(concave_hull, p)
 
 
 def in_convex_hull(p: np.ndarray, convex_hull: Union[Delaunay, np.ndarray]) -> np.ndarray:
@@ -9,15 +9,6 @@ import numpy as np
 from anndata import AnnData
 from pyvista import PolyData
 
-from spateo.tdr import (
-    add_model_labels,
-    center_to_zero,
-    collect_models,
-    construct_pc,
-    merge_models,
-    translate_model,
-)
-
 from .three_dims_plots import three_d_multi_plot
 
 
@@ -148,6 +139,15 @@ def multi_models(
                      according to your needs.
         **kwargs: Additional parameters that will be passed to ``three_d_multi_plot`` function.
     """
+    # Imported here to avoid a circular import between spateo.tdr and spateo.plotting.
+    from spateo.tdr import (
+        add_model_labels,
+        center_to_zero,
+        collect_models,
+        construct_pc,
+        merge_models,
+    )
+
     adata_list = adata[0]
     adata_list = adata_list if isinstance(adata_list, list) else [adata_list]
 
@@ -333,6 +333,15 @@ def deformation(
     text_kwargs: Optional[dict] = None,
     **kwargs,
 ):
+    # Imported here to avoid a circular import between spateo.tdr and spateo.plotting.
+    from spateo.tdr import (
+        add_model_labels,
+        center_to_zero,
+        collect_models,
+        construct_pc,
+        translate_model,
+    )
+
     adata_list = adata[0]
     adata_list = adata_list if isinstance(adata_list, list) else [adata_list]
 
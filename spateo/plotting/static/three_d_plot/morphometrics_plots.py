@@ -5,7 +5,6 @@ import pandas as pd
 from anndata import AnnData
 from pyvista import MultiBlock, PolyData, UnstructuredGrid
 
-from ....tdr import add_model_labels, collect_models
 from .three_dims_plots import three_d_multi_plot, three_d_plot
 
 try:
@@ -173,6 +172,9 @@ def jacobian(
             model_size=[3, 1]
         )
     """
+    # Imported here to avoid a circular import between spateo.tdr and spateo.plotting.
+    from ....tdr import add_model_labels, collect_models
+
     adata, model = adata.copy(), model.copy()
     jacobian_martix = _check_key_in_adata(adata=adata, key=jacobian_key, where="uns")
 
@@ -321,6 +323,8 @@ def feature(
             model_size=[3, 1]
         )
     """
+    # Imported here to avoid a circular import between spateo.tdr and spateo.plotting.
+    from ....tdr import add_model_labels
 
     adata, model = adata.copy(), model.copy()
     feature_values = _check_key_in_adata(adata=adata, key=feature_key, where="obs")
@@ -14,13 +14,6 @@ from pyvista import PolyData
 from scipy.sparse import issparse
 
 from ....alignment import get_optimal_mapping_relationship
-from ....tdr import (
-    add_model_labels,
-    collect_models,
-    construct_align_lines,
-    construct_pc,
-    merge_models,
-)
 from .three_dims_plots import three_d_animate, three_d_plot
 
 
@@ -198,6 +191,15 @@ def pairwise_mapping(
         pcB: The point cloud models of adataB.
         model_lines: Cell mapping lines between modelA and modelB.
     """
+    # Imported here to avoid a circular import between spateo.tdr and spateo.plotting.
+    from ....tdr import (
+        add_model_labels,
+        collect_models,
+        construct_align_lines,
+        construct_pc,
+        merge_models,
+    )
+
     # Check the spatial coordinates
     if adataA is not None and adataA.obsm[spatial_key].shape[1] == 2:
         z = np.zeros(shape=(adataA.obsm[spatial_key].shape[0], 1))
@@ -620,6 +622,9 @@ def pairwise_iteration(
         framerate: Frames per second.
         **kwargs: Additional parameters that will be passed to ``three_d_animate`` function.
     """
+    # Imported here to avoid a circular import between spateo.tdr and spateo.plotting.
+    from ....tdr import collect_models, construct_pc
+
     adataA, adataB = adataA.copy(), adataB.copy()
 
     group_key = id_key if group_key is None else group_key
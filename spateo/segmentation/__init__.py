@@ -22,6 +22,7 @@ from .density import merge_densities, segment_densities
 from .external.cellpose import cellpose
 from .external.deepcell import deepcell
 from .external.stardist import stardist
+from .external.tiling import tiled_segmentation
 from .icell import mask_cells_from_stain, mask_nuclei_from_stain, score_and_mask_pixels
 from .label import (
     augment_labels,
@@ -2,7 +2,7 @@
 """
 
 import math
-from typing import List, Optional, Union
+from typing import List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
@@ -18,13 +18,39 @@ from ..configuration import SKM
 from ..errors import SegmentationError
 from ..logging import logger_manager as lm
 from . import utils
+from .external.tiling import tile_slices
+
+
+def _normalized_coords(rows: slice, cols: slice, shape: Tuple[int, int], align_corners: bool) -> torch.Tensor:
+    """Normalized (x, y) coordinates, in [-1, 1], of the pixels of an image region
+    in row-major order.
+    """
+    ys = np.arange(shape[0])[rows]
+    xs = np.arange(shape[1])[cols]
+    if align_corners:
+        ys, xs = 2 * ys / (shape[0] - 1) - 1, 2 * xs / (shape[1] - 1) - 1
+    else:
+        ys, xs = (2 * ys + 1) / shape[0] - 1, (2 * xs + 1) / shape[1] - 1
+    y, x = np.meshgrid(ys, xs, indexing="ij")
+    return torch.tensor(np.stack([x.ravel(), y.ravel()], axis=1)).float()
 
 
 class AlignmentRefiner(nn.Module):
-    def __init__(self, reference: np.ndarray, to_align: np.ndarray):
+    # Whether the pixel grid the transformation is evaluated on places the
+    # centers of the corner pixels at -1 and 1.
+    align_corners = False
+
+    def __init__(self, reference: np.ndarray, to_align: np.ndarray, tiles: Optional[List[Tuple[slice, slice]]] = None):
         super().__init__()
         reference = reference.astype(float) / reference.max()
         to_align = to_align.astype(float) / to_align.max()
+        # When tiles are provided, only their pixels are evaluated.
+        self.points = None
+        if tiles:
+            self.points = torch.cat(
+                [_normalized_coords(rows, cols, reference.shape, self.align_corners) for rows, cols in tiles]
+            )
+            reference = np.concatenate([reference[rows, cols].ravel() for rows, cols in tiles])
         self.reference = torch.tensor(reference)[None][None].float()
         self.to_align = torch.tensor(to_align)[None][None].float()
         self.__optimizer = None
@@ -40,7 +66,11 @@ class AlignmentRefiner(nn.Module):
         return self.__optimizer
 
     def forward(self):
-        return self.transform(self.to_align, self.get_params(True), train=True)
+        params = self.get_params(True)
+        if self.points is None:
+            return self.transform(self.to_align, params, train=True)
+        grid = self.transform_points(self.points, params)
+        return F.grid_sample(self.to_align, grid[None, None], align_corners=False)
 
     def train(self, n_epochs: int = 100):
         optimizer = self.optimizer()
@@ -65,6 +95,10 @@ class AlignmentRefiner(nn.Module):
     def transform(x, params, train=False):
         raise NotImplementedError()
 
+    @staticmethod
+    def transform_points(points, params):
+        raise NotImplementedError()
+
 
 class NonRigidAlignmentRefiner(AlignmentRefiner):
     """Pytorch module to refine alignment between two images by evaluating the
@@ -73,20 +107,34 @@ class NonRigidAlignmentRefiner(AlignmentRefiner):
     points.
     """
 
-    def __init__(self, reference: np.ndarray, to_align: np.ndarray, meshsize: Optional[int] = None):
+    align_corners = True
+
+    def __init__(
+        self,
+        reference: np.ndarray,
+        to_align: np.ndarray,
+        meshsize: Optional[int] = None,
+        meshes: Optional[Tuple[int, int]] = None,
+        displacement: Optional[np.ndarray] = None,
+        tiles: Optional[List[Tuple[slice, slice]]] = None,
+    ):
         meshsize = meshsize or min(to_align.shape) // 3
-        meshes = (math.ceil(to_align.shape[0] / meshsize), math.ceil(to_align.shape[1] / meshsize))
+        if meshes is None:
+            meshes = (math.ceil(to_align.shape[0] / meshsize), math.ceil(to_align.shape[1] / meshsize))
         if meshes[0] <= 1 or meshes[1] <= 1:
             raise SegmentationError(
                 f"Using `meshsize` {meshsize} for image of shape {to_align.shape} "
                 f"results in {meshes} meshes. Please reduce `meshsize`."
             )
-        super().__init__(reference, to_align)
+        super().__init__(reference, to_align, tiles)
         self.src_points = torch.cartesian_prod(
             torch.linspace(-1, 1, meshes[1]),
             torch.linspace(-1, 1, meshes[0]),
         )
-        self.displacement = nn.Parameter(torch.zeros(self.src_points.shape))
+        if displacement is not None:
+            self.displacement = nn.Parameter(torch.tensor(displacement).float())
+        else:
+            self.displacement = nn.Parameter(torch.zeros(self.src_points.shape))
 
     def get_params(self, train=False):
         src_points, displacement = self.src_points, self.displacement
@@ -112,17 +160,30 @@ class NonRigidAlignmentRefiner(AlignmentRefiner):
         t = tps.warp_image_tps(x, src_points, kernel_weights, affine_weights).squeeze()
         return t if train else t.detach().numpy()
 
+    @staticmethod
+    def transform_points(points, params):
+        src_points = params["src_points"].unsqueeze(0)
+        dst_points = src_points + params["displacement"].unsqueeze(0)
+        kernel_weights, affine_weights = tps.get_tps_transform(dst_points, src_points)
+        return tps.warp_points_tps(points.unsqueeze(0), src_points, kernel_weights, affine_weights).squeeze(0)
+
 
 class RigidAlignmentRefiner(AlignmentRefiner):
     """Pytorch module to refine alignment between two images.
     Performs Autograd on the affine transformation matrix.
     """
 
-    def __init__(self, reference: np.ndarray, to_align: np.ndarray, theta: Optional[np.ndarray] = None):
-        super().__init__(reference, to_align)
+    def __init__(
+        self,
+        reference: np.ndarray,
+        to_align: np.ndarray,
+        theta: Optional[np.ndarray] = None,
+        tiles: Optional[List[Tuple[slice, slice]]] = None,
+    ):
+        super().__init__(reference, to_align, tiles)
         # Affine matrix
         if theta is not None:
-            self.theta = nn.Parameter(torch.tensor(theta))
+            self.theta = nn.Parameter(torch.tensor(theta).float())
         else:
             self.theta = nn.Parameter(
                 torch.tensor(
@@ -146,6 +207,11 @@ class RigidAlignmentRefiner(AlignmentRefiner):
         t = F.grid_sample(x, grid, align_corners=False)
         return t if train else t.detach().numpy().squeeze()
 
+    @staticmethod
+    def transform_points(points, params):
+        theta = params["theta"]
+        return points @ theta[:, :2].T + theta[:, 2]
+
     def get_params(self, train=False):
         theta = self.theta
         if not train:
@@ -156,6 +222,26 @@ class RigidAlignmentRefiner(AlignmentRefiner):
 MODULES = {"rigid": RigidAlignmentRefiner, "non-rigid": NonRigidAlignmentRefiner}
 
 
+def _informative_tiles(
+    reference: np.ndarray, to_align: np.ndarray, tile_size: int, n_tiles: int
+) -> Optional[List[Tuple[slice, slice]]]:
+    """Select the `n_tiles` non-overlapping tiles with the highest product of
+    mean (normalized) signal of both images. Returns None if the image does not
+    contain more than `n_tiles` tiles.
+    """
+    tiles = tile_slices(reference.shape, tile_size, 0)
+    if len(tiles) <= n_tiles:
+        return None
+    reference_max, to_align_max = reference.max(), to_align.max()
+    scores = np.array(
+        [
+            (reference[rows, cols].mean() / reference_max) * (to_align[rows, cols].mean() / to_align_max)
+            for rows, cols in tiles
+        ]
+    )
+    return [tiles[i] for i in np.sort(np.argsort(-scores)[:n_tiles])]
+
+
 @SKM.check_adata_is_type(SKM.ADATA_AGG_TYPE)
 def refine_alignment(
     adata: AnnData,
@@ -164,8 +250,11 @@ def refine_alignment(
     mode: Literal["rigid", "non-rigid"] = "rigid",
     downscale: float = 1,
     k: int = 5,
-    n_epochs: int = 100,
+    n_epochs: Union[int, List[int]] = 100,
     transform_layers: Optional[Union[str, List[str]]] = None,
+    levels: int = 1,
+    tile_size: Optional[int] = None,
+    n_tiles: int = 16,
     **kwargs,
 ):
     """Refine the alignment between the staining image and RNA coordinates.
@@ -175,6 +264,14 @@ def refine_alignment(
     This function attempts to refine these alignments based on the staining and
     (unspliced) RNA masks.
 
+    With `levels > 1`, the alignment is optimized coarse-to-fine on an image
+    pyramid: first on images downscaled by a further factor of
+    `2 ** (levels - 1)`, then on progressively larger levels, each initialized
+    with the parameters found on the previous one. Additionally providing
+    `tile_size` restricts the optimization, on levels with more than `n_tiles`
+    tiles, to the `n_tiles` tiles with the most stain and RNA signal, which
+    bounds the memory and time per epoch on large images.
+
     Args:
         adata: Input Anndata
         stain_layer: Layer containing staining image.
@@ -188,17 +285,33 @@ def refine_alignment(
                 by providing a `binsize` argument to this function (specifically,
                 as part of additional **kwargs).
         downscale: Downscale matrices by this factor to reduce memory and runtime.
+            This is the scale of the finest pyramid level.
         k: Kernel size for Gaussian blur of the RNA matrix.
-        n_epochs: Number of epochs to run optimization
+        n_epochs: Number of epochs to run optimization. Either a single number,
+            used for every pyramid level, or one number per level, from the
+            coarsest to the finest.
         transform_layers: Layers to transform and overwrite inplace.
+        levels: Number of pyramid levels. Each level halves the resolution of
+            the next one.
+        tile_size: Size of the tiles to optimize on. If not provided, whole images
+            are used on every level.
+        n_tiles: Number of most informative tiles to optimize on, when
+            `tile_size` is provided.
         **kwargs: Additional keyword arguments to pass to the Pytorch module.
     """
     if mode not in MODULES.keys():
         raise SegmentationError('`mode` must be one of "rigid" and "non-rigid"')
-    if adata.shape[0] * downscale > 10000 or adata.shape[1] * downscale > 10000:
+    if levels < 1:
+        raise SegmentationError("`levels` must be at least 1.")
+    if isinstance(n_epochs, int):
+        n_epochs = [n_epochs] * levels
+    if len(n_epochs) != levels:
+        raise SegmentationError(f"`n_epochs` must have one entry per level ({levels}), got {len(n_epochs)}.")
+    if tile_size is None and (adata.shape[0] * downscale > 10000 or adata.shape[1] * downscale > 10000):
         lm.main_warning(
             "Input has dimension > 10000. This may take a while and a lot of memory. "
-            "Consider downscaling using the `downscale` option."
+            "Consider downscaling using the `downscale` option, or optimizing on "
+            "tiles using the `levels` and `tile_size` options."
         )
 
     stain = SKM.select_layer_data(adata, stain_layer, make_dense=True)
@@ -211,13 +324,39 @@ def refine_alignment(
         stain = cv2.resize(stain.astype(float), (0, 0), fx=downscale, fy=downscale)
         rna = cv2.resize(rna.astype(float), (0, 0), fx=downscale, fy=downscale)
 
+    # Image pyramid, from the finest to the coarsest level.
+    pyramid = [(rna, stain)]
+    for _ in range(levels - 1):
+        pyramid.append(
+            tuple(
+                cv2.resize(img.astype(float), (0, 0), fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+                for img in pyramid[-1]
+            )
+        )
+    if mode == "non-rigid" and "meshes" not in kwargs:
+        # Keep the same mesh on every level.
+        meshsize = kwargs.get("meshsize") or min(stain.shape) // 3
+        kwargs["meshsize"] = meshsize
+        kwargs["meshes"] = (math.ceil(stain.shape[0] / meshsize), math.ceil(stain.shape[1] / meshsize))
+
     lm.main_info(f"Refining alignment in {mode} mode.")
     module = MODULES[mode]
-    # NOTE: we find a transformation FROM the stain coordinates TO the RNA coordinates
-    aligner = module(rna, stain, **kwargs)
-    aligner.train(n_epochs)
-
-    params = aligner.get_params()
+    params = {}
+    for level, ((reference, to_align), epochs) in enumerate(zip(pyramid[::-1], n_epochs)):
+        tiles = None
+        if tile_size is not None:
+            tiles = _informative_tiles(reference, to_align, tile_size, n_tiles)
+        if levels > 1:
+            lm.main_info(
+                f"Level {level + 1}/{levels}: optimizing on "
+                f"{'whole image' if tiles is None else f'{len(tiles)} tiles'} of shape {reference.shape}."
+            )
+        # NOTE: we find a transformation FROM the stain coordinates TO the RNA coordinates
+        # The parameters are in normalized coordinates and carry over between levels.
+        init = {key: value for key, value in params.items() if key != "src_points"}
+        aligner = module(reference, to_align, tiles=tiles, **{**kwargs, **init})
+        aligner.train(epochs)
+        params = aligner.get_params()
     SKM.set_uns_spatial_attribute(adata, SKM.UNS_SPATIAL_ALIGNMENT_KEY, params)
 
     if transform_layers:
@@ -5,11 +5,13 @@ https://iopscience.iop.org/article/10.1088/1742-6596/1324/1/012093/meta
 Written by @HailinPan, optimized by @Lioscro.
 """
 
+import math
 from functools import partial
-from typing import Dict, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 from joblib import Parallel, delayed
+from numba import njit, prange
 from scipy import special, stats
 from tqdm import tqdm
 
@@ -161,6 +163,218 @@ def nbn_em(
     return (prev_w, lamtheta_to_r(prev_lam, prev_theta), prev_theta) if use_prev else (w, r, theta)
 
 
+@njit(cache=True)
+def _digamma(x: float) -> float:
+    """Digamma function for positive `x`, by recurrence up to `x >= 6` followed
+    by the asymptotic expansion (absolute error below 1e-12).
+    """
+    result = 0.0
+    while x < 6.0:
+        result -= 1.0 / x
+        x += 1.0
+    f = 1.0 / (x * x)
+    return (
+        result
+        + math.log(x)
+        - 0.5 / x
+        - f * (1.0 / 12 - f * (1.0 / 120 - f * (1.0 / 252 - f * (1.0 / 240 - f * (1.0 / 132)))))
+    )
+
+
+@njit(cache=True)
+def _nbn_logpmf(r: float, p: float, x: float) -> float:
+    """Log PMF of the negative binomial distribution with `r` successes and
+    success probability `p`, matching :func:`stats.nbinom.logpmf`.
+    """
+    return math.lgamma(x + r) - math.lgamma(r) - math.lgamma(x + 1) + r * math.log(p) + x * math.log1p(-p)
+
+
+@njit(cache=True, error_model="numpy")
+def _nbn_em_single(
+    X: np.ndarray,
+    counts: np.ndarray,
+    w: np.ndarray,
+    lam: np.ndarray,
+    theta: np.ndarray,
+    max_iter: int,
+    precision: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Compiled equivalent of :func:`nbn_em` for one set of samples, given as
+    distinct values `X` occurring `counts` times each. Takes and returns
+    parameters as 2-element arrays of `w`, `lam`, `theta`. Divisions by zero
+    give NaNs, as in :func:`nbn_em`, and the previous parameters are returned.
+    """
+    n = X.shape[0]
+    tau = np.empty((2, n))
+    delta = np.empty((2, n))
+    r = -lam / np.log(theta)
+    if n == 0:
+        # No samples, keep the initial parameters.
+        return w, r, theta
+    prev_w = w.copy()
+    prev_lam = lam.copy()
+    prev_theta = theta.copy()
+    for _ in range(max_iter):
+        # E step
+        logw0 = math.log(w[0]) if w[0] > 0 else -np.inf
+        logw1 = math.log(w[1]) if w[1] > 0 else -np.inf
+        dr0 = _digamma(r[0])
+        dr1 = _digamma(r[1])
+        for j in range(n):
+            x = X[j]
+            t0 = min(max(math.exp(logw0 + _nbn_logpmf(r[0], theta[0], x)), 1e-10), 1e10)
+            t1 = min(max(math.exp(logw1 + _nbn_logpmf(r[1], theta[1], x)), 1e-10), 1e10)
+            total = t0 + t1
+            tau[0, j] = t0 / total
+            tau[1, j] = t1 / total
+            delta[0, j] = r[0] * (_digamma(r[0] + x) - dr0)
+            delta[1, j] = r[1] * (_digamma(r[1] + x) - dr1)
+
+        # M step
+        new_w = np.empty(2)
+        new_lam = np.empty(2)
+        new_theta = np.empty(2)
+        tau_total = 0.0
+        for k in range(2):
+            beta = 1 - 1 / (1 - theta[k]) - 1 / math.log(theta[k])
+            tau_sum = 0.0
+            tau_delta = 0.0
+            denom = 0.0
+            for j in range(n):
+                t = counts[j] * tau[k, j]
+                tau_sum += t
+                tau_delta += t * delta[k, j]
+                denom += t * (X[j] - (1 - beta) * delta[k, j])
+            new_w[k] = tau_sum
+            new_lam[k] = tau_delta / tau_sum
+            new_theta[k] = beta * tau_delta / denom
+            tau_total += tau_sum
+        new_w /= tau_total
+        w, lam, theta = new_w, new_lam, new_theta
+
+        r = -lam / np.log(theta)
+        use_prev = False
+        for k in range(2):
+            if not (np.isfinite(r[k]) and np.isfinite(w[k]) and np.isfinite(theta[k])):
+                use_prev = True
+            if r[k] <= 0 or theta[k] > 1 or theta[k] < 0 or w[k] < 0 or w[k] > 1:
+                use_prev = True
+        if use_prev:
+            return prev_w, -prev_lam / np.log(prev_theta), prev_theta
+
+        diff = max(np.abs(w - prev_w).max(), np.abs(lam - prev_lam).max(), np.abs(theta - prev_theta).max())
+        if diff < precision:
+            break
+
+        prev_w = w.copy()
+        prev_lam = lam.copy()
+        prev_theta = theta.copy()
+    return w, r, theta
+
+
+@njit(parallel=True, cache=True, error_model="numpy")
+def _nbn_em_batched(
+    X: np.ndarray,
+    counts: np.ndarray,
+    offsets: np.ndarray,
+    w: np.ndarray,
+    lam: np.ndarray,
+    theta: np.ndarray,
+    max_iter: int,
+    precision: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Run :func:`_nbn_em_single` for each batch of distinct values
+    `X[offsets[i]:offsets[i + 1]]` and their `counts` in parallel.
+    """
+    n_batches = offsets.shape[0] - 1
+    res_w = np.empty((n_batches, 2))
+    res_r = np.empty((n_batches, 2))
+    res_theta = np.empty((n_batches, 2))
+    for i in prange(n_batches):
+        start, end = offsets[i], offsets[i + 1]
+        _w, _r, _theta = _nbn_em_single(
+            X[start:end], counts[start:end], w[i].copy(), lam[i].copy(), theta[i].copy(), max_iter, precision
+        )
+        res_w[i] = _w
+        res_r[i] = _r
+        res_theta[i] = _theta
+    return res_w, res_r, res_theta
+
+
+def nbn_em_batched(
+    samples: List[np.ndarray],
+    w: Union[Tuple[float, float], np.ndarray] = (0.99, 0.01),
+    mu: Union[Tuple[float, float], np.ndarray] = (10.0, 300.0),
+    var: Union[Tuple[float, float], np.ndarray] = (20.0, 400.0),
+    max_iter: int = 2000,
+    precision: float = 1e-3,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Run the EM algorithm of :func:`nbn_em` for multiple sets of mixture
+    counts at once. Each set is reduced to its distinct values and their
+    multiplicities, and the reduced sets are stacked into a single array and
+    fitted in parallel by compiled kernels, which avoids the per-set
+    interpreter overhead of calling :func:`nbn_em` for each set.
+
+    Args:
+        samples: List of Numpy arrays containing mixture counts, one per set.
+        w: Initial proportions of cell and background, either as a tuple shared
+            by all sets or as an array of shape (len(samples), 2).
+        mu: Initial means of cell and background negative binomial
+            distributions, in the same format as `w`.
+        var: Initial variances of cell and background negative binomial
+            distributions, in the same format as `w`.
+        max_iter: Maximum number of iterations.
+        precision: Desired precision. Algorithm will stop once this is reached.
+
+    Returns:
+        Estimated `w`, `r`, `p`, each as an array of shape (len(samples), 2).
+    """
+    n = len(samples)
+    if n == 0:
+        return np.empty((0, 2)), np.empty((0, 2)), np.empty((0, 2))
+    w = np.broadcast_to(np.asarray(w, dtype=np.float64), (n, 2))
+    mu = np.broadcast_to(np.asarray(mu, dtype=np.float64), (n, 2))
+    var = np.broadcast_to(np.asarray(var, dtype=np.float64), (n, 2))
+    lam, theta = muvar_to_lamtheta(mu, var)
+
+    uniques = [np.unique(np.asarray(_samples, dtype=np.float64), return_counts=True) for _samples in samples]
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(values) for values, _ in uniques])
+    return _nbn_em_batched(
+        np.concatenate([values for values, _ in uniques]),
+        np.concatenate([counts for _, counts in uniques]).astype(np.float64),
+        offsets,
+        np.ascontiguousarray(w),
+        np.ascontiguousarray(lam),
+        np.ascontiguousarray(theta),
+        max_iter,
+        precision,
+    )
+
+
+def _pixel_parameters(
+    em_results: Dict[int, Tuple[Tuple[float, float], Tuple[float, float], Tuple[float, float]]], bins: np.ndarray
+) -> Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Look up the EM parameters of the bin of each pixel.
+
+    Args:
+        em_results: Return value of :func:`run_em` when `bins` was provided.
+        bins: Pixel bins, as was passed to :func:`run_em`.
+
+    Returns:
+        Boolean mask of the pixels whose bin has parameters, and the `w`, `r`,
+        `p` of these pixels, each as a float64 array of shape (mask.sum(), 2).
+    """
+    labels = np.array(sorted(em_results.keys()))
+    params = np.array([em_results[label] for label in labels], dtype=np.float64).reshape(len(labels), 3, 2)
+    if len(labels) == 0:
+        return np.zeros(bins.shape, dtype=bool), (params[:, 0], params[:, 1], params[:, 2])
+    idx = np.clip(np.searchsorted(labels, bins), 0, len(labels) - 1)
+    mask = labels[idx] == bins
+    idx = idx[mask]
+    return mask, (params[idx, 0], params[idx, 1], params[idx, 2])
+
+
 def conditionals(
     X: np.ndarray,
     em_results: Union[
@@ -190,11 +404,10 @@ def conditionals(
             raise SegmentationError("`em_results` indicate binning was used, but `bins` was not provided")
         background_cond = np.ones(X.shape)
         cell_cond = np.zeros(X.shape)
-        for label, (_, r, p) in em_results.items():
-            mask = bins == label
-            samples = X[mask]
-            background_cond[mask] = nbn_pmf(r[0], p[0], samples)
-            cell_cond[mask] = nbn_pmf(r[1], p[1], samples)
+        mask, (_, r, p) = _pixel_parameters(em_results, bins)
+        samples = X[mask]
+        background_cond[mask] = stats.nbinom.pmf(samples, r[:, 0], p[:, 0])
+        cell_cond[mask] = stats.nbinom.pmf(samples, r[:, 1], p[:, 1])
     else:
         _, r, p = em_results
         background_cond = nbn_pmf(r[0], p[0], X)
@@ -226,10 +439,9 @@ def confidence(
     tau0 = np.zeros(X.shape)
     tau1 = np.zeros(X.shape)
     if isinstance(em_results, dict):
-        for label, (w, _, _) in em_results.items():
-            mask = bins == label
-            tau0[mask] = w[0] * bp[mask]
-            tau1[mask] = w[1] * cp[mask]
+        mask, (w, _, _) = _pixel_parameters(em_results, bins)
+        tau0[mask] = w[:, 0] * bp[mask]
+        tau1[mask] = w[:, 1] * cp[mask]
     else:
         w, _, _ = em_results
         tau0 = w[0] * bp
@@ -247,6 +459,7 @@ def run_em(
     precision: float = 1e-6,
     bins: Optional[np.ndarray] = None,
     seed: Optional[int] = None,
+    batched: bool = True,
 ) -> Union[
     Tuple[Tuple[float, float], Tuple[float, float], Tuple[float, float]],
     Dict[int, Tuple[Tuple[float, float], Tuple[float, float], Tuple[float, float]]],
@@ -276,6 +489,8 @@ def run_em(
         bins: Bins of pixels to estimate separately, such as those obtained by
             density segmentation. Zeros are ignored.
         seed: Random seed.
+        batched: Fit all bins at once with :func:`nbn_em_batched`. Otherwise,
+            :func:`nbn_em` is called for each bin separately.
 
     Returns:
         Tuple of parameters estimated by the EM algorithm if `bins` is not provided.
@@ -307,8 +522,18 @@ def run_em(
             _samples = rng.choice(_samples, _downsample, replace=False, p=weights / weights.sum())
         final_samples[label] = np.array(_samples)
 
-    # Run in parallel
     results = {}
+    if batched:
+        labels = list(final_samples.keys())
+        init = {key: np.array([params.get(label, params)[key] for label in labels]) for key in ("w", "mu", "var")}
+        res_ws, res_rs, res_ps = nbn_em_batched(
+            [final_samples[label] for label in labels], max_iter=max_iter, precision=precision, **init
+        )
+        for label, res_w, res_r, res_p in zip(labels, res_ws, res_rs, res_ps):
+            results[label] = (tuple(res_w), tuple(res_r), tuple(res_p))
+        return results if bins is not None else results[0]
+
+    # Run in parallel
     for label, (res_w, res_r, res_p) in zip(
         final_samples.keys(),
         ParallelWithProgress(n_jobs=config.n_threads, total=len(final_samples), desc="Running EM")(
@@ -1 +1 @@
-from . import cellpose, deepcell, stardist
+from . import cellpose, deepcell, stardist, tiling
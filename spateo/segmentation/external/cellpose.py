@@ -19,7 +19,7 @@ from typing_extensions import Literal
 from ...configuration import SKM
 from ...errors import SegmentationError
 from ...logging import logger_manager as lm
-from ..utils import clahe
+from ..utils import clahe, sanitize_labels
 
 
 def _cellpose(
@@ -54,6 +54,7 @@ def cellpose(
     diameter: Optional[int] = None,
     normalize: bool = True,
     equalize: float = 2.0,
+    sanitize: bool = False,
     layer: str = SKM.STAIN_LAYER_KEY,
     out_layer: Optional[str] = None,
     **kwargs,
@@ -72,6 +73,7 @@ def cellpose(
             argument to :func:`Cellpose.eval`.
         equalize: Controls the `clip_limit` argument to the :func:`clahe` function.
             Set this value to a non-positive value to turn off equalization.
+        sanitize: Whether to sanitize disconnected labels.
         layer: Layer that contains staining image. Defaults to `stain`.
         out_layer: Layer to put resulting labels. Defaults to `{layer}_labels`.
         **kwargs: Additional keyword arguments to :func:`Cellpose.eval`
@@ -99,5 +101,8 @@ def cellpose(
 
     lm.main_info(f"Running Cellpose with model {model}.")
     labels = _cellpose(img, model, channels=[0, 0], normalize=normalize, **kwargs)
+    if sanitize:
+        lm.main_info(f"Fixing disconnected labels.")
+        labels = sanitize_labels(labels)
     out_layer = out_layer or SKM.gen_new_layer_key(layer, SKM.LABELS_SUFFIX)
     SKM.set_layer_data(adata, out_layer, labels)
@@ -18,7 +18,7 @@ except ModuleNotFoundError:
 from ...configuration import SKM
 from ...errors import SegmentationError
 from ...logging import logger_manager as lm
-from ..utils import clahe
+from ..utils import clahe, sanitize_labels
 
 
 def _deepcell(
@@ -45,6 +45,7 @@ def deepcell(
     adata: AnnData,
     model: Optional["Application"] = None,
     equalize: float = 2.0,
+    sanitize: bool = False,
     layer: str = SKM.STAIN_LAYER_KEY,
     out_layer: Optional[str] = None,
     **kwargs,
@@ -56,6 +57,7 @@ def deepcell(
         model: DeepCell model to use
         equalize: Controls the `clip_limit` argument to the :func:`clahe` function.
             Set this value to a non-positive value to turn off equalization.
+        sanitize: Whether to sanitize disconnected labels.
         layer: Layer that contains staining image. Defaults to `stain`.
         out_layer: Layer to put resulting labels. Defaults to `{layer}_labels`.
         **kwargs: Additional keyword arguments to :func:`Application.predict`
@@ -81,5 +83,8 @@ def deepcell(
 
     lm.main_info(f"Running DeepCell with model {model}.")
     labels = _deepcell(img, model, **kwargs)
+    if sanitize:
+        lm.main_info(f"Fixing disconnected labels.")
+        labels = sanitize_labels(labels)
     out_layer = out_layer or SKM.gen_new_layer_key(layer, SKM.LABELS_SUFFIX)
     SKM.set_layer_data(adata, out_layer, labels)
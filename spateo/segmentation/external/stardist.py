@@ -7,11 +7,9 @@ https://github.com/stardist/stardist
 import math
 from typing import Optional, Union
 
-import cv2
 import numpy as np
 from anndata import AnnData
 from csbdeep.data import Normalizer, PercentileNormalizer
-from skimage import measure
 
 try:
     from stardist.models import StarDist2D
@@ -22,7 +20,7 @@ from typing_extensions import Literal
 from ...configuration import SKM
 from ...errors import SegmentationError
 from ...logging import logger_manager as lm
-from ..utils import clahe
+from ..utils import clahe, sanitize_labels
 
 
 def _stardist(
@@ -87,37 +85,6 @@ def _stardist_big(
     return labels
 
 
-def _sanitize_labels(labels: np.ndarray) -> np.ndarray:
-    """Sanitize labels obtained from StarDist.
-
-    StarDist sometimes yields disconnected labels. This function removes
-    these problems by selecting the largest area.
-
-    Args:
-        labels: Numpy array containing labels
-
-    Returns:
-        Sanitized labels.
-    """
-
-    def components(mtx):
-        mtx = mtx.astype(np.uint8)
-        return cv2.connectedComponentsWithStats(mtx)
-
-    sanitized = labels.copy()
-    label_props = measure.regionprops(labels, extra_properties=[components])
-    for props in label_props:
-        label = props.label
-        comps = props.components
-        if comps[0] > 2:
-            lm.main_debug(f"Sanitizing label {label}.")
-            largest_comp_label = comps[2][1:, cv2.CC_STAT_AREA].argmax() + 1
-            min_row, min_col, max_row, max_col = props.bbox
-            subset = (comps[1] > 0) & (comps[1] != largest_comp_label)
-            sanitized[min_row:max_row, min_col:max_col][subset] = 0
-    return sanitized
-
-
 def stardist(
     adata: AnnData,
     model: Union[
@@ -199,6 +166,6 @@ def stardist(
         )
     if sanitize:
         lm.main_info(f"Fixing disconnected labels.")
-        labels = _sanitize_labels(labels)
+        labels = sanitize_labels(labels)
     out_layer = out_layer or SKM.gen_new_layer_key(layer, SKM.LABELS_SUFFIX)
     SKM.set_layer_data(adata, out_layer, labels)
@@ -0,0 +1,309 @@
+"""Run external segmentation models tile by tile on a pool of local workers and
+stitch the tile labels into one label array.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from anndata import AnnData
+from joblib import Parallel, delayed
+from scipy import sparse
+from typing_extensions import Literal
+
+from ...configuration import SKM, config
+from ...errors import SegmentationError
+from ...logging import logger_manager as lm
+from ..utils import clahe, sanitize_labels
+
+# Models loaded by each worker process, keyed by (method, model name).
+_MODEL_CACHE: Dict[Tuple[str, Any], Any] = {}
+
+
+def _tile_starts(size: int, tilesize: int, overlap: int) -> List[int]:
+    """Start positions of tiles of size `tilesize` overlapping by `overlap`
+    along an axis of size `size`. The last tile is aligned with the end.
+    """
+    if size <= tilesize:
+        return [0]
+    starts = list(range(0, size - tilesize, tilesize - overlap))
+    return starts + [size - tilesize]
+
+
+def tile_slices(shape: Tuple[int, int], tilesize: int, overlap: int) -> List[Tuple[slice, slice]]:
+    """Split an image into overlapping square tiles.
+
+    Args:
+        shape: Shape of the image.
+        tilesize: Size of each tile. Tiles at the image border may be smaller
+            only if the image itself is smaller than `tilesize`.
+        overlap: Number of pixels adjacent tiles overlap by. Must be smaller
+            than `tilesize`.
+
+    Returns:
+        List of (row slice, column slice) tuples, one per tile, in row-major order.
+
+    Raises:
+        SegmentationError: If `overlap` is not smaller than `tilesize`.
+    """
+    if overlap >= tilesize:
+        raise SegmentationError(f"`overlap` ({overlap}) must be smaller than `tilesize` ({tilesize}).")
+    return [
+        (slice(row, row + tilesize), slice(col, col + tilesize))
+        for row in _tile_starts(shape[0], tilesize, overlap)
+        for col in _tile_starts(shape[1], tilesize, overlap)
+    ]
+
+
+def _load_model(method: str, model: Any) -> Any:
+    """Load a pretrained model by name once per worker process. Model objects
+    are returned as is.
+    """
+    if model is not None and not isinstance(model, str):
+        return model
+    key = (method, model)
+    if key not in _MODEL_CACHE:
+        if method == "stardist":
+            from stardist.models import StarDist2D
+
+            _MODEL_CACHE[key] = StarDist2D.from_pretrained(model)
+        elif method == "cellpose":
+            from cellpose.models import Cellpose
+
+            _MODEL_CACHE[key] = Cellpose(model_type=model, gpu=True)  # Use GPU if available
+        elif method == "deepcell":
+            from deepcell.applications import NuclearSegmentation
+
+            _MODEL_CACHE[key] = NuclearSegmentation()
+    return _MODEL_CACHE[key]
+
+
+def _segment_tile(method: str, model: Any, tile: np.ndarray, kwargs: dict) -> np.ndarray:
+    """Segment a single tile with one of the external models."""
+    model = _load_model(method, model)
+    if method == "stardist":
+        from .stardist import _stardist
+
+        return _stardist(tile, model, **kwargs)
+    if method == "cellpose":
+        from .cellpose import _cellpose
+
+        return _cellpose(tile, model, **kwargs)
+    from .deepcell import _deepcell
+
+    return _deepcell(tile, model, **kwargs)
+
+
+def _interior_border_labels(labels: np.ndarray, rows: slice, cols: slice, shape: Tuple[int, int]) -> np.ndarray:
+    """Labels touching a tile edge that does not lie on the image border. These
+    instances may be cut off by the tile and are left to the neighboring tile.
+    """
+    edges = []
+    if rows.start > 0:
+        edges.append(labels[0])
+    if rows.stop < shape[0]:
+        edges.append(labels[-1])
+    if cols.start > 0:
+        edges.append(labels[:, 0])
+    if cols.stop < shape[1]:
+        edges.append(labels[:, -1])
+    if len(edges) == 0:
+        return np.zeros(0, dtype=labels.dtype)
+    return np.unique(np.concatenate(edges))
+
+
+def stitch_tiles(
+    tiles: List[Tuple[slice, slice]],
+    tile_labels: List[np.ndarray],
+    shape: Tuple[int, int],
+    iou_threshold: float = 0.5,
+) -> np.ndarray:
+    """Merge labels of overlapping tiles into one label array.
+
+    Tiles are added in order. Instances of a tile that touch an edge of the tile
+    in the interior of the image are discarded, as they may be cut off (the
+    neighboring tile, which overlaps it, contains them entirely as long as
+    objects are smaller than the overlap). Instances that overlap an already
+    added instance with an intersection-over-union of at least `iou_threshold`
+    are duplicates across the seam and are discarded as well. The remaining
+    instances are given new consecutive labels and written to pixels that are
+    not yet labeled.
+
+    Args:
+        tiles: (row slice, column slice) of each tile, as returned by
+            :func:`tile_slices`.
+        tile_labels: Label array of each tile, with 0 as background.
+        shape: Shape of the full image.
+        iou_threshold: Intersection-over-union above which two instances of
+            overlapping tiles are considered the same instance.
+
+    Returns:
+        Label array of shape `shape`.
+    """
+    labels = np.zeros(shape, dtype=np.int32)
+    areas = np.zeros(1, dtype=np.int64)
+    for (rows, cols), tile in zip(tiles, tile_labels):
+        tile = tile.astype(np.int64)
+        tile[np.isin(tile, _interior_border_labels(tile, rows, cols, shape))] = 0
+        n_tile = tile.max() + 1
+        if n_tile == 1:
+            continue
+        region = labels[rows, cols]
+        tile_areas = np.bincount(tile.ravel(), minlength=n_tile)
+
+        # Intersections with the instances already added, as a (tile label, label) sparse matrix.
+        both = (tile > 0) & (region > 0)
+        intersections = sparse.coo_matrix(
+            (np.ones(both.sum(), dtype=np.int64), (tile[both], region[both])), shape=(n_tile, len(areas))
+        ).tocsr()
+        duplicate = np.zeros(n_tile, dtype=bool)
+        if intersections.nnz > 0:
+            coo = intersections.tocoo()
+            iou = coo.data / (tile_areas[coo.row] + areas[coo.col] - coo.data)
+            duplicate[coo.row[iou >= iou_threshold]] = True
+
+        new = (tile_areas > 0) & ~duplicate
+        new[0] = False
+        lut = np.zeros(n_tile, dtype=np.int64)
+        lut[new] = np.arange(len(areas), len(areas) + new.sum())
+        tile = lut[tile]
+        write = (tile > 0) & (region == 0)
+        region[write] = tile[write]
+        areas = np.concatenate([areas, np.bincount(tile[write], minlength=len(areas) + new.sum())[len(areas) :]])
+    return labels
+
+
+def segment_tiles(
+    img: np.ndarray,
+    segment: Callable[[np.ndarray], np.ndarray],
+    tilesize: int = 2000,
+    overlap: int = 100,
+    iou_threshold: float = 0.5,
+    n_jobs: Optional[int] = None,
+    backend: str = "loky",
+) -> np.ndarray:
+    """Segment an image tile by tile on a pool of local workers and stitch the
+    results with :func:`stitch_tiles`.
+
+    Args:
+        img: Image as a Numpy array.
+        segment: Function that takes an image tile and returns its labels. It
+            must be picklable when a process-based `backend` is used.
+        tilesize: Size of each tile.
+        overlap: Number of pixels adjacent tiles overlap by. Should be larger
+            than the largest object.
+        iou_threshold: Intersection-over-union above which two instances of
+            overlapping tiles are considered the same instance.
+        n_jobs: Number of workers. Defaults to `config.n_threads`.
+        backend: Joblib backend of the worker pool.
+
+    Returns:
+        Label array with the same shape as `img`.
+    """
+    tiles = tile_slices(img.shape[:2], tilesize, overlap)
+    n_jobs = config.n_threads if n_jobs is None else n_jobs
+    lm.main_debug(f"Segmenting {len(tiles)} tiles with {n_jobs} workers.")
+    tile_labels = Parallel(n_jobs=n_jobs, backend=backend)(delayed(segment)(img[rows, cols]) for rows, cols in tiles)
+    return stitch_tiles(tiles, tile_labels, img.shape[:2], iou_threshold)
+
+
+class _ModelSegmenter:
+    """Picklable callable segmenting a tile with an external model."""
+
+    def __init__(self, method: str, model: Any, kwargs: dict):
+        self.method = method
+        self.model = model
+        self.kwargs = kwargs
+
+    def __call__(self, tile: np.ndarray) -> np.ndarray:
+        return _segment_tile(self.method, self.model, tile, self.kwargs)
+
+
+def tiled_segmentation(
+    adata: AnnData,
+    method: Literal["stardist", "cellpose", "deepcell"] = "stardist",
+    model: Optional[Union[str, Any]] = None,
+    tilesize: int = 2000,
+    overlap: int = 100,
+    iou_threshold: float = 0.5,
+    n_jobs: Optional[int] = None,
+    backend: str = "loky",
+    equalize: float = 2.0,
+    normalize: bool = True,
+    sanitize: bool = True,
+    layer: str = SKM.STAIN_LAYER_KEY,
+    out_layer: Optional[str] = None,
+    **kwargs,
+):
+    """Label cells from a staining image by running StarDist, Cellpose or
+    DeepCell on overlapping tiles in parallel, merging instances across tile
+    seams into one label layer.
+
+    Equalization and (for StarDist) percentile normalization are applied to the
+    whole image before tiling, so that all tiles are processed consistently.
+
+    Args:
+        adata: Input Anndata
+        method: External model to use, one of "stardist", "cellpose", "deepcell".
+        model: Model to use. Either the name of a pretrained model ("2D_versatile_fluo"
+            by default for StarDist, "nuclei" for Cellpose), which is loaded once
+            by each worker, or a model object, which must be picklable when a
+            process-based `backend` is used. For DeepCell, `None` uses
+            `NuclearSegmentation`.
+        tilesize: Size of each tile.
+        overlap: Number of pixels adjacent tiles overlap by. Should be larger
+            than the largest cell.
+        iou_threshold: Intersection-over-union above which two instances of
+            overlapping tiles are considered the same cell.
+        n_jobs: Number of workers. Defaults to `config.n_threads`.
+        backend: Joblib backend of the worker pool. Use "threading" for model
+            objects that can not be pickled.
+        equalize: Controls the `clip_limit` argument to the :func:`clahe` function.
+            Set this value to a non-positive value to turn off equalization.
+        normalize: Whether to percentile-normalize the image (StarDist and
+            Cellpose only).
+        sanitize: Whether to sanitize disconnected labels.
+        layer: Layer that contains staining image. Defaults to `stain`.
+        out_layer: Layer to put resulting labels. Defaults to `{layer}_labels`.
+        **kwargs: Additional keyword arguments to the prediction function of the
+            model (see :func:`stardist`, :func:`cellpose`, :func:`deepcell`).
+    """
+    if method not in ("stardist", "cellpose", "deepcell"):
+        raise SegmentationError(f"Unknown method `{method}`. Must be one of `stardist`, `cellpose`, `deepcell`.")
+    if layer not in adata.layers:
+        raise SegmentationError(
+            f'Layer "{layer}" does not exist in AnnData. '
+            "Please import nuclei staining results either manually or "
+            "with the `nuclei_path` argument to `st.io.read_bgi_agg`."
+        )
+    img = SKM.select_layer_data(adata, layer, make_dense=True)
+    if equalize > 0:
+        lm.main_info("Equalizing image with CLAHE.")
+        img = clahe(img, equalize)
+
+    if method == "stardist":
+        model = "2D_versatile_fluo" if model is None else model
+        if normalize:
+            from csbdeep.data import PercentileNormalizer
+
+            img = PercentileNormalizer().before(img, "YX")
+        kwargs.setdefault("normalizer", None)
+    elif method == "cellpose":
+        model = "nuclei" if model is None else model
+        kwargs.setdefault("channels", [0, 0])
+        kwargs.setdefault("normalize", normalize)
+
+    lm.main_info(f"Running {method} with model {model} on tiles of size {tilesize}.")
+    labels = segment_tiles(
+        img,
+        _ModelSegmenter(method, model, kwargs),
+        tilesize=tilesize,
+        overlap=overlap,
+        iou_threshold=iou_threshold,
+        n_jobs=n_jobs,
+        backend=backend,
+    )
+    if sanitize:
+        lm.main_info(f"Fixing disconnected labels.")
+        labels = sanitize_labels(labels)
+    out_layer = out_layer or SKM.gen_new_layer_key(layer, SKM.LABELS_SUFFIX)
+    SKM.set_layer_data(adata, out_layer, labels)
@@ -3,12 +3,12 @@
 Adapted from code written by @HailinPan.
 """
 
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 
 import cv2
 import numpy as np
 from anndata import AnnData
-from scipy import signal, stats
+from scipy import ndimage, signal, special, stats
 from skimage.filters import sobel, threshold_otsu
 from skimage.segmentation import watershed
 
@@ -16,6 +16,11 @@ from ..configuration import SKM
 from ..logging import logger_manager as lm
 from . import utils
 
+try:
+    from typing import Literal
+except ImportError:
+    from typing_extensions import Literal
+
 
 def moranI(
     X: np.ndarray, kernel: np.ndarray, mask: Optional[np.ndarray] = None
@@ -55,26 +60,188 @@ def moranI(
     return z, c, i, pvalue
 
 
-def run_moran(X: np.ndarray, k: int = 7, p_threshold: float = 0.05, mask: Optional[np.ndarray] = None) -> np.ndarray:
+def _moran_kernel(k: int) -> np.ndarray:
+    """Circular Gaussian kernel of size `k` with a zero center, used as the
+    spatial weights of Moran's I.
+    """
+    kx = cv2.getGaussianKernel(k, 0)
+    ky = cv2.getGaussianKernel(k, 0)
+    kernel = (ky * kx.T) * utils.circle(k)
+    kernel[(k - 1) // 2, (k - 1) // 2] = 0
+    return kernel
+
+
+def _moran_moments(
+    X: np.ndarray, mask: Optional[np.ndarray] = None, chunk_size: int = 1024
+) -> Tuple[int, float, float, float]:
+    """Global statistics of Moran's I, computed in row chunks of `chunk_size`
+    rows so that no full-image intermediate is created.
+
+    Args:
+        X: Numpy array containing (possibly smoothed) UMI counts or binarized
+            values.
+        mask: If provided, only consider pixels within the mask
+        chunk_size: Number of rows per chunk.
+
+    Returns:
+        A 4-element tuple containing the number of considered pixels, their
+        mean, and the second and fourth central moments.
+    """
+    n = 0
+    total = 0.0
+    for start in range(0, X.shape[0], chunk_size):
+        chunk = X[start : start + chunk_size].astype(np.float64)
+        if mask is not None:
+            chunk = chunk[mask[start : start + chunk_size]]
+        n += chunk.size
+        total += chunk.sum()
+    x_bar = total / n
+
+    m2 = 0.0
+    m4 = 0.0
+    for start in range(0, X.shape[0], chunk_size):
+        chunk = X[start : start + chunk_size].astype(np.float64)
+        if mask is not None:
+            chunk = chunk[mask[start : start + chunk_size]]
+        z2 = (chunk - x_bar) ** 2
+        m2 += z2.sum()
+        m4 += (z2**2).sum()
+    return n, x_bar, m2 / n, m4 / n
+
+
+def _convolve_valid(
+    X: np.ndarray, kernel: np.ndarray, conv_method: Literal["direct", "fft", "separable"] = "direct"
+) -> np.ndarray:
+    """Convolve `X` with `kernel`, keeping only the part of the output computed
+    without padding (as `mode="valid"` of :func:`scipy.signal.convolve2d`).
+
+    Args:
+        X: Padded 2D array.
+        kernel: 2D kernel.
+        conv_method: "direct" for direct convolution, "fft" for FFT
+            convolution, or "separable" to convolve with the rank-1 terms of the
+            singular value decomposition of the kernel, one axis at a time.
+
+    Returns:
+        The convolution, of shape `X.shape - kernel.shape + 1`.
+    """
+    if conv_method == "direct":
+        return signal.convolve2d(X, kernel.astype(X.dtype), mode="valid")
+    if conv_method == "fft":
+        return signal.fftconvolve(X, kernel.astype(X.dtype), mode="valid")
+    if conv_method == "separable":
+        u, s, vt = np.linalg.svd(kernel)
+        rank = max((s > s[0] * 1e-12).sum(), 1)
+        ky, kx = kernel.shape
+        result = np.zeros((X.shape[0] - ky + 1, X.shape[1] - kx + 1), dtype=X.dtype)
+        for r in range(rank):
+            # Rows are only needed where the output is valid along the second axis.
+            tmp = ndimage.convolve1d(X, (s[r] * u[:, r]).astype(X.dtype), axis=0)[ky // 2 : ky // 2 + result.shape[0]]
+            result += ndimage.convolve1d(tmp, vt[r].astype(X.dtype), axis=1)[:, kx // 2 : kx // 2 + result.shape[1]]
+        return result
+    raise ValueError(f"Unknown convolution method {conv_method}, must be one of `direct`, `fft`, `separable`.")
+
+
+def tiled_moranI(
+    X: np.ndarray,
+    kernel: np.ndarray,
+    mask: Optional[np.ndarray] = None,
+    tile_size: Optional[int] = None,
+    conv_method: Literal["direct", "fft", "separable"] = "direct",
+    dtype: Union[str, np.dtype] = "float64",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the spatial lag and p-value of Moran's I for cell masking, tile by
+    tile to bound peak memory.
+
+    The global statistics are computed once over the whole image, and each tile
+    is convolved together with a halo of half the kernel size (padded
+    symmetrically at the image border), so the result does not depend on the
+    tile size and matches :func:`moranI`.
+
+    Args:
+        X: Numpy array containing (possibly smoothed) UMI counts or binarized
+            values.
+        kernel: 2D kernel containing weights
+        mask: If provided, only consider pixels within the mask
+        tile_size: Size of the square tiles. If None, the whole image is
+            processed as a single tile.
+        conv_method: Convolution method, one of "direct", "fft" or "separable".
+            See :func:`_convolve_valid`.
+        dtype: Floating point type of the convolution and outputs. "float32"
+            halves the memory.
+
+    Returns:
+        A 2-element tuple containing (c, pvalue).
+    """
+    dtype = np.dtype(dtype)
+    n, x_bar, m2, m4 = _moran_moments(X, mask)
+
+    ei = -kernel.sum() / (n - 1)
+    wi2 = (kernel**2).sum()
+    b2 = m4 / (m2**2)
+    tow_wikh = (kernel.reshape(-1, 1) * kernel.reshape(1, -1)).sum()
+    vari = wi2 * (n - b2) / (n - 1) + tow_wikh * (2 * b2 - n) / ((n - 1) * (n - 2)) - kernel.sum() ** 2 / (n - 1) ** 2
+    sd = vari**0.5
+
+    # Halo of the convolution with mode="same" before and after each tile.
+    ky, kx = kernel.shape
+    before = np.array([ky // 2, kx // 2])
+    after = np.array([(ky - 1) // 2, (kx - 1) // 2])
+    shape = np.array(X.shape)
+    tile_size = max(shape) if tile_size is None else tile_size
+
+    c = np.empty(X.shape, dtype=dtype)
+    pvalue = np.empty(X.shape, dtype=dtype)
+    for row in range(0, shape[0], tile_size):
+        for col in range(0, shape[1], tile_size):
+            start = np.array([row, col])
+            end = np.minimum(start + tile_size, shape)
+            region_start = np.maximum(start - before, 0)
+            region_end = np.minimum(end + after, shape)
+            region = X[region_start[0] : region_end[0], region_start[1] : region_end[1]]
+            z = region.astype(dtype) - dtype.type(x_bar)
+            pad = [
+                (before[axis] - (start[axis] - region_start[axis]), after[axis] - (region_end[axis] - end[axis]))
+                for axis in range(2)
+            ]
+            if any(p for axis_pad in pad for p in axis_pad):
+                z = np.pad(z, pad, mode="symmetric")
+
+            tile_c = _convolve_valid(z, kernel, conv_method)
+            tile_z = z[before[0] : before[0] + tile_c.shape[0], before[1] : before[1] + tile_c.shape[1]]
+            zscore = (tile_z / dtype.type(m2) * tile_c - dtype.type(ei)) / dtype.type(sd)
+            c[row : end[0], col : end[1]] = tile_c
+            pvalue[row : end[0], col : end[1]] = special.ndtr(-np.abs(zscore)) * 2
+    return c, pvalue
+
+
+def run_moran(
+    X: np.ndarray,
+    k: int = 7,
+    p_threshold: float = 0.05,
+    mask: Optional[np.ndarray] = None,
+    tile_size: Optional[int] = None,
+    conv_method: Literal["direct", "fft", "separable"] = "direct",
+    dtype: Union[str, np.dtype] = "float64",
+) -> np.ndarray:
     """Compute scores using Moran's I method.
 
     Args:
         X: Numpy array containing (possibly smoothed) UMI counts or binarized
             values.
         k: Kernel size
-        p_threshold: P-value threshold. Test. Test Test
+        p_threshold: P-value threshold.
         mask: If provided, only consider pixels within the mask
+        tile_size: If provided, evaluate Moran's I in square tiles of this size
+            to bound peak memory. See :func:`tiled_moranI`.
+        conv_method: Convolution method, one of "direct", "fft" or "separable".
+        dtype: Floating point type of the computation, "float64" or "float32".
 
     Returns:
         A 2D Numpy array indicating pixel scores
     """
-    # Create Gaussian kernel
-    kx = cv2.getGaussianKernel(k, 0)
-    ky = cv2.getGaussianKernel(k, 0)
-    kernel = (ky * kx.T) * utils.circle(k)
-    kernel[(k - 1) // 2, (k - 1) // 2] = 0
-
-    z, c, i, pvalue = moranI(X, kernel, mask=mask)
+    kernel = _moran_kernel(k)
+    c, pvalue = tiled_moranI(X, kernel, mask=mask, tile_size=tile_size, conv_method=conv_method, dtype=dtype)
 
     # Set pixels whose p values are < p_threshold to zero, which indicate
     # no spatial correlation.
@@ -90,6 +257,9 @@ def run_moran_and_mask_pixels(
     mk: int = 3,
     mask: Optional[np.ndarray] = None,
     mask_layer: Optional[str] = None,
+    tile_size: Optional[int] = None,
+    conv_method: Literal["direct", "fft", "separable"] = "direct",
+    dtype: Union[str, np.dtype] = "float64",
 ) -> np.ndarray:
     """Compute scores using Moran's I method.
 
@@ -102,19 +272,19 @@ def run_moran_and_mask_pixels(
             noise in the mask.
         mask: If provided, only consider pixels within the mask
         mask_layer: Layer to save the final mask. Defaults to `{layer}_mask`.
+        tile_size: If provided, evaluate Moran's I in square tiles of this size
+            to bound peak memory. See :func:`tiled_moranI`.
+        conv_method: Convolution method, one of "direct", "fft" or "separable".
+        dtype: Floating point type of the computation, "float64" or "float32".
 
     Returns:
         A boolean mask.
     """
-    # Create Gaussian kernel
-    kx = cv2.getGaussianKernel(k, 0)
-    ky = cv2.getGaussianKernel(k, 0)
-    kernel = (ky * kx.T) * utils.circle(k)
-    kernel[(k - 1) // 2, (k - 1) // 2] = 0
+    kernel = _moran_kernel(k)
 
     X = SKM.select_layer_data(adata, layer, make_dense=True)
     lm.main_info(f"run Moran’s I.")
-    z, c, i, pvalue = moranI(X, kernel, mask=mask)
+    c, pvalue = tiled_moranI(X, kernel, mask=mask, tile_size=tile_size, conv_method=conv_method, dtype=dtype)
 
     if mask is not None:
         m = binary_morani_result(c, pvalue, method=method, tissue_mask=mask)
@@ -183,4 +353,4 @@ def binary_morani_result(
     else:
         cell_mask = np.where((p_cell_mask == 255) & (c >= c_cutoff), 255, 0).astype(np.uint8)
 
-    return cell_mask.astype(np.bool)
+    return cell_mask.astype(bool)
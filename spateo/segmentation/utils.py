@@ -8,6 +8,7 @@ import numpy as np
 from anndata import AnnData
 from kneed import KneeLocator
 from scipy import signal, sparse
+from skimage import measure
 from skimage.segmentation import find_boundaries
 from tqdm import tqdm
 from typing_extensions import Literal
@@ -324,6 +325,46 @@ def label_overlap(X: np.ndarray, Y: np.ndarray) -> sparse.csr_matrix:
     return _label_overlap(X.flatten(), Y.flatten()).tocsr()
 
 
+def sanitize_labels(labels: np.ndarray) -> np.ndarray:
+    """Sanitize labels obtained from external segmentation models.
+
+    Models such as StarDist sometimes yield disconnected labels. This function
+    removes these problems by keeping only the largest 8-connected component of
+    each label. Among components of equal area, the one whose first pixel comes
+    first in row-major order is kept. Connected components of the whole image
+    are labeled once, and the largest component of each label is selected with
+    grouped area reductions.
+
+    Args:
+        labels: Numpy array containing labels
+
+    Returns:
+        Sanitized labels.
+    """
+    components = measure.label(labels, background=0, connectivity=2)
+    n_components = components.max()
+    if n_components == 0:
+        return labels.copy()
+    areas = np.bincount(components.ravel(), minlength=n_components + 1)[1:]
+    # Original label of each component, taken from any one of its pixels.
+    foreground = components > 0
+    component_labels = np.zeros(n_components, dtype=labels.dtype)
+    component_labels[components[foreground] - 1] = labels[foreground]
+
+    # Sort components by label, then by decreasing area, then by row-major order of their first pixels, which is the
+    # order in which they are numbered by `measure.label`.
+    order = np.lexsort((np.arange(n_components), -areas, component_labels))
+    first = np.ones(n_components, dtype=bool)
+    first[1:] = component_labels[order[1:]] != component_labels[order[:-1]]
+    keep = np.zeros(n_components + 1, dtype=bool)
+    keep[order[first] + 1] = True
+
+    n_removed = n_components - first.sum()
+    if n_removed > 0:
+        lm.main_debug(f"Removing {n_removed} disconnected components.")
+    return np.where(keep[components], labels, 0).astype(labels.dtype)
+
+
 def clahe(X: np.ndarray, clip_limit: float = 1.0, tile_grid: Tuple[int, int] = (100, 100)) -> np.ndarray:
     """Contrast-limited adaptive histogram equalization (CLAHE).
 
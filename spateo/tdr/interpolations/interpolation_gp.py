@@ -18,6 +18,7 @@ from scipy.sparse import issparse
 from ...alignment.methods import _chunk, _unsqueeze
 from ...logging import logger_manager as lm
 from .interpolation_gaussianprocess import Approx_GPModel, Exact_GPModel, gp_train
+from .utils import allocate_interpolation_output, predict_in_chunks
 
 
 class Imputation_GPR:
@@ -143,11 +144,33 @@ class Imputation_GPR:
         self,
         use_chunk: bool = False,
         chunk_num: int = 20,
+        chunk_size: Optional[int] = None,
+        n_threads: int = 1,
+        out: Optional[np.ndarray] = None,
     ):
+        n_keys = len(self.info_keys["obs_keys"]) + len(self.info_keys["var_keys"])
+        if chunk_size is not None and n_keys != 1:
+            raise ValueError(
+                f"The GP model predicts a single key, but {n_keys} keys were given. Please interpolate one key at a "
+                f"time."
+            )
+
         # Get into evaluation (predictive posterior) mode
         self.GPR_model.eval()
         self.likelihood.eval()
 
+        if chunk_size is not None:
+            # Stream fixed-size chunks of target points into a preallocated output.
+            def _predict(target_points_ss):
+                if self.normalize_spatial:
+                    target_points_ss = self.normalize_coords(target_points_ss, given_normalize=True)
+                with torch.no_grad(), gpytorch.settings.fast_pred_var():
+                    predictions = self.likelihood(self.GPR_model(target_points_ss)).mean
+                return predictions.cpu().numpy()
+
+            out = allocate_interpolation_output((self.target_points.shape[0], n_keys)) if out is None else out
+            return predict_in_chunks(_predict, self.target_points, out=out, chunk_size=chunk_size, n_threads=n_threads)
+
         target_points = self.target_points
         if self.normalize_spatial:
             target_points = self.normalize_coords(target_points, given_normalize=True)
@@ -181,6 +204,10 @@ def gp_interpolation(
     batch_size: int = 1024,
     shuffle: bool = True,
     inducing_num: int = 512,
+    chunk_size: Optional[int] = None,
+    n_threads: int = 1,
+    dtype: str = "float32",
+    filename: Optional[str] = None,
 ) -> AnnData:
     """
     Learn a continuous mapping from space to gene expression pattern with the Gaussian Process method.
@@ -193,6 +220,13 @@ def gp_interpolation(
         layer: If ``'X'``, uses ``.X``, otherwise uses the representation given by ``.layers[layer]``.
         training_iter:  Max number of iterations for training.
         device: Equipment used to run the program. You can also set the specified GPU for running. ``E.g.: '0'``.
+        chunk_size: If given, the target points are predicted in chunks of ``chunk_size`` points that are written
+            straight into a preallocated output, so that the peak memory does not depend on the number of target
+            points. The GP model predicts a single key, so ``keys`` must contain exactly one key.
+        n_threads: The number of threads used to predict the chunks. Only used when ``chunk_size`` is given.
+        dtype: The data type of the interpolated values, e.g. ``float16``. Only used when ``chunk_size`` is given.
+        filename: If given, the interpolated values are written into a memory-mapped ``.npy`` file at this path. Only
+            used when ``chunk_size`` is given.
 
     Returns:
         interp_adata: an anndata object that has interpolated expression.
@@ -214,8 +248,16 @@ def gp_interpolation(
     GPR.inference(training_iter=training_iter)
 
     # Interpolation
-    target_info_data = GPR.interpolate(use_chunk=True)
-    target_info_data = target_info_data[:, None]
+    if chunk_size is None:
+        target_info_data = GPR.interpolate(use_chunk=True)
+        target_info_data = target_info_data[:, None]
+    else:
+        n_keys = len(GPR.info_keys["obs_keys"]) + len(GPR.info_keys["var_keys"])
+        target_info_data = GPR.interpolate(
+            chunk_size=chunk_size,
+            n_threads=n_threads,
+            out=allocate_interpolation_output((len(target_points), n_keys), dtype=dtype, filename=filename),
+        )
     # Output interpolated anndata
     lm.main_info("Creating an adata object with the interpolated expression...")
 
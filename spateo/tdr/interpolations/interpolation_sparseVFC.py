@@ -6,8 +6,10 @@ from anndata import AnnData
 from dynamo.vectorfield.scVectorField import SparseVFC
 from numpy import ndarray
 from scipy.sparse import issparse
+from scipy.spatial.distance import cdist
 
 from ...logging import logger_manager as lm
+from .utils import allocate_interpolation_output, predict_in_chunks
 
 
 def kernel_interpolation(
@@ -18,6 +20,10 @@ def kernel_interpolation(
     layer: str = "X",
     lambda_: float = 0.02,
     lstsq_method: str = "scipy",
+    chunk_size: Optional[int] = None,
+    n_threads: int = 1,
+    dtype: Optional[str] = None,
+    filename: Optional[str] = None,
     **kwargs,
 ) -> AnnData:
     """
@@ -32,6 +38,14 @@ def kernel_interpolation(
         lambda_: Represents the trade-off between the goodness of data fit and regularization. Larger Lambda_ put more
             weights on regularization.
         lstsq_method: The name of the linear least square solver, can be either 'scipy` or `douin`.
+        chunk_size: If given, the target points are predicted in chunks of ``chunk_size`` points, so that the kernel
+            matrix between the target points and the control points never exceeds ``chunk_size`` rows. All keys are
+            predicted from each kernel evaluation.
+        n_threads: The number of threads used to predict the chunks. Only used when ``chunk_size`` is given.
+        dtype: The data type of the interpolated values, e.g. ``float16``. Only used when ``chunk_size`` is given.
+            Defaults to ``float32``.
+        filename: If given, the interpolated expression is written into a memory-mapped ``.npy`` file at this path,
+            which backs the ``.X`` of the returned object. Only used when ``chunk_size`` is given.
         **kwargs: Additional parameters that will be passed to SparseVFC function.
 
     Returns:
@@ -60,17 +74,46 @@ def kernel_interpolation(
     info_data = info_data[:, 1:]
 
     # Interpolation
-    res = SparseVFC(source_spatial_data, info_data, target_points, lambda_=lambda_, lstsq_method=lstsq_method, **kwargs)
-    target_info_data = res["grid_V"]
+    if chunk_size is None:
+        res = SparseVFC(
+            source_spatial_data, info_data, target_points, lambda_=lambda_, lstsq_method=lstsq_method, **kwargs
+        )
+        target_info_data = res["grid_V"]
+        obs_info_data, var_info_data = target_info_data[:, : len(obs_keys)], target_info_data[:, len(obs_keys) :]
+    else:
+        if kwargs.get("div_cur_free_kernels", False):
+            raise ValueError("`chunk_size` is not supported with `div_cur_free_kernels`.")
+        res = SparseVFC(source_spatial_data, info_data, None, lambda_=lambda_, lstsq_method=lstsq_method, **kwargs)
+        ctrl_pts, beta, C = res["X_ctrl"], res["beta"], res["C"]
+
+        def _predict(x):
+            K = np.exp(-beta * cdist(x, ctrl_pts, "sqeuclidean"))
+            return K @ C[:, : len(obs_keys)], K @ C[:, len(obs_keys) :]
+
+        lm.main_info(f"Predicting {len(target_points)} target points in chunks of {chunk_size}...")
+        target_points = np.asarray(target_points)
+        obs_info_data, var_info_data = predict_in_chunks(
+            _predict,
+            target_points,
+            out=(
+                np.zeros((target_points.shape[0], len(obs_keys))),
+                allocate_interpolation_output(
+                    (target_points.shape[0], len(var_keys)),
+                    dtype="float32" if dtype is None else dtype,
+                    filename=filename,
+                ),
+            ),
+            chunk_size=chunk_size,
+            n_threads=n_threads,
+        )
 
     lm.main_info("Creating an adata object with the interpolated expression...")
 
     if len(obs_keys) != 0:
-        obs_data = target_info_data[:, : len(obs_keys)]
-        obs_data = pd.DataFrame(obs_data, columns=obs_keys)
+        obs_data = pd.DataFrame(obs_info_data, columns=obs_keys)
 
     if len(var_keys) != 0:
-        X = target_info_data[:, len(obs_keys) :]
+        X = var_info_data
         var_data = pd.DataFrame(index=var_keys)
 
     interp_adata = AnnData(
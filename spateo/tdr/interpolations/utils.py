@@ -1,4 +1,5 @@
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, Union
 
 import numpy as np
 from anndata import AnnData
@@ -53,3 +54,66 @@ def get_X_Y_grid(
     grid_in_hull = in_hull(Grid, hull.points[hull.vertices, :])
 
     return X, Y, Grid, grid_in_hull
+
+
+def allocate_interpolation_output(
+    shape: Tuple[int, int], dtype: Union[str, np.dtype] = "float32", filename: Optional[str] = None
+) -> np.ndarray:
+    """Preallocate the array that receives the interpolated values.
+
+    Args:
+        shape: The (n_targets, n_keys) shape of the output.
+        dtype: The data type of the output, e.g. ``float16`` to halve the size of large grids.
+        filename: If given, the output is a memory-mapped ``.npy`` file at this path, so that the interpolated values
+            are written to disk instead of being kept in memory.
+
+    Returns:
+        The preallocated (optionally memory-mapped) output array.
+    """
+    if filename is None:
+        return np.zeros(shape, dtype=dtype)
+    return np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=shape)
+
+
+def predict_in_chunks(
+    predict: Callable,
+    target_points: np.ndarray,
+    out: Union[np.ndarray, Tuple[np.ndarray, ...]],
+    chunk_size: int = 10000,
+    n_threads: int = 1,
+) -> Union[np.ndarray, Tuple[np.ndarray, ...]]:
+    """Evaluate a prediction function on the target points chunk by chunk and write the results into ``out``, so that
+    the peak memory only depends on ``chunk_size`` rather than on the number of target points.
+
+    Args:
+        predict: A function that maps (n, d) target points to (n, n_keys) predictions, or to a tuple of such
+            predictions if ``out`` is a tuple.
+        target_points: The (n_targets, d) target points.
+        out: The preallocated (n_targets, n_keys) output or a tuple of outputs, see ``allocate_interpolation_output``.
+        chunk_size: The number of target points predicted at once.
+        n_threads: The number of threads used to predict the chunks.
+
+    Returns:
+        The output ``out``.
+    """
+    n = target_points.shape[0]
+    outs = out if isinstance(out, tuple) else (out,)
+
+    def _predict_chunk(start):
+        end = min(start + chunk_size, n)
+        predictions = predict(target_points[start:end])
+        predictions = predictions if isinstance(out, tuple) else (predictions,)
+        for o, prediction in zip(outs, predictions):
+            prediction = np.asarray(prediction).reshape(end - start, -1)
+            if prediction.shape[1] != o.shape[1]:
+                raise ValueError(f"Got {prediction.shape[1]} predicted values per point for {o.shape[1]} output keys.")
+            o[start:end] = prediction
+
+    if n_threads > 1:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            list(executor.map(_predict_chunk, range(0, n, chunk_size)))
+    else:
+        for start in range(0, n, chunk_size):
+            _predict_chunk(start)
+
+    return out
@@ -8,6 +8,7 @@ from .morphofield_dg import (
     morphofield_acceleration,
     morphofield_curl,
     morphofield_curvature,
+    morphofield_differential_geometry,
     morphofield_divergence,
     morphofield_jacobian,
     morphofield_torsion,
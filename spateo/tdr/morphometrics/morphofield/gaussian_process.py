@@ -1,7 +1,8 @@
-from typing import List, Optional, Tuple, Union
+from typing import Callable, List, Optional, Tuple, Union
 
 import numpy as np
 from anndata import AnnData
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist
 
 try:
@@ -36,37 +37,75 @@ def _con_K(
         return K
 
 
-def _con_K_geodist(
+def _geodist_index(kernel_dict: dict) -> Tuple[cKDTree, np.ndarray, np.ndarray]:
+    """Build the KD-tree over the graph nodes of a geodesic kernel, together with the per-node quantities that only
+    depend on the nearest graph node of a query point. Building the index costs O(N * m), so it should be built once
+    per vector field and passed to the evaluations (see ``_gp_velocity_func``).
+
+    Args:
+        kernel_dict: The kernel dictionary that contains the graph nodes ``X``, the first node on the path from each
+            node to each inducing point ``first_node_idx`` and the graph distances ``kernel_graph_distance``.
+
+    Returns:
+        tree: The KD-tree over the graph nodes.
+        first_nodes: The (N, m) first nodes on the paths, with nodes in other connected components set to 0.
+        base_dist: The (N, m) graph distances minus the distances between each node and the first nodes on its paths.
+    """
+    X = kernel_dict["X"]
+    first_nodes = np.where(kernel_dict["first_node_idx"] < 0, 0, kernel_dict["first_node_idx"])
+    origin_to_first_node_dist = np.sqrt(np.sum((X[:, None, :] - X[first_nodes]) ** 2, axis=2))
+    return cKDTree(X), first_nodes, kernel_dict["kernel_graph_distance"] - origin_to_first_node_dist
+
+
+def _geodist_components(
     x: np.ndarray,
     kernel_dict: dict,
-    beta: float = 0.1,
-    return_d: bool = False,
-) -> Union[Tuple[np.ndarray, np.ndarray], np.ndarray]:
+    geodist_index: Optional[Tuple[cKDTree, np.ndarray, np.ndarray]] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Compute the geodesic distances between query points and the inducing points of a graph kernel.
+
+    Args:
+        x: The (n, d) query points.
+        kernel_dict: The kernel dictionary that contains the graph nodes ``X``, the first node on the path from each
+            node to each inducing point ``first_node_idx`` and the graph distances ``kernel_graph_distance``.
+        geodist_index: The index of the kernel built by ``_geodist_index``. If None, it is built for this call.
+
+    Returns:
+        D: The (n, m) geodesic distances to the m inducing points.
+        K_mask: The (n, m) mask of inducing points that are not in the same connected component as the query points.
+        to_first_node_dist_D: The (n, m, d) displacements between the query points and the first nodes on the paths.
+        to_first_node_dist: The (n, m) euclidean distances between the query points and the first nodes on the paths.
+    """
+    if geodist_index is None:
+        geodist_index = _geodist_index(kernel_dict)
+    tree, first_nodes, base_dist = geodist_index
     # find the nearest neighbor
-    if len(x.shape) == 1:
-        x = x[None, :]
-    d = cdist(x, kernel_dict["X"], "euclidean")
-    nearest_idx = np.argmin(d, axis=1)
-    # calculate the geodesic distance
+    _, nearest_idx = tree.query(x)
 
-    # get the first node in the path to inducing points
-    nearest_inducing_nodes = kernel_dict["first_node_idx"][nearest_idx]
     # mask that indicates whether the inducing points are in the same connected component
-    K_mask = nearest_inducing_nodes < 0
-    nearest_inducing_nodes[nearest_inducing_nodes < 0] = 0
-    # calculate the distance to that first nodes
-    gather_inducing_nodes = kernel_dict["X"][nearest_inducing_nodes]
-    to_first_node_dist_D = np.tile(x[:, None, :], [1, gather_inducing_nodes.shape[1], 1]) - gather_inducing_nodes
+    K_mask = kernel_dict["first_node_idx"][nearest_idx] < 0
+    # calculate the distance to the first nodes in the path to inducing points
+    to_first_node_dist_D = x[:, None, :] - kernel_dict["X"][first_nodes[nearest_idx]]
     to_first_node_dist = np.sqrt(np.sum(to_first_node_dist_D**2, axis=2))
-    origin_to_first_node_dist = (
-        np.tile(kernel_dict["X"][nearest_idx][:, None, :], [1, gather_inducing_nodes.shape[1], 1])
-        - gather_inducing_nodes
-    )
-    origin_to_first_node_dist = np.sqrt(np.sum(origin_to_first_node_dist**2, axis=2))
-    D = kernel_dict["kernel_graph_distance"][nearest_idx] + to_first_node_dist - origin_to_first_node_dist
+    # calculate the geodesic distance
+    D = base_dist[nearest_idx] + to_first_node_dist
 
     # apply the mask
     D[K_mask] = 10000
+    return D, K_mask, to_first_node_dist_D, to_first_node_dist
+
+
+def _con_K_geodist(
+    x: np.ndarray,
+    kernel_dict: dict,
+    beta: float = 0.1,
+    return_d: bool = False,
+    geodist_index: Optional[Tuple[cKDTree, np.ndarray, np.ndarray]] = None,
+) -> Union[Tuple[np.ndarray, np.ndarray], np.ndarray]:
+    if len(x.shape) == 1:
+        x = x[None, :]
+    D, K_mask, to_first_node_dist_D, to_first_node_dist = _geodist_components(x, kernel_dict, geodist_index)
+
     # calculate the kernel
     K = D**2
     K = -beta * K
@@ -80,21 +119,42 @@ def _con_K_geodist(
         return K
 
 
-def _gp_velocity(X: np.ndarray, vf_dict: dict) -> np.ndarray:
+def _gp_velocity_from_kernel(X: np.ndarray, norm_x: np.ndarray, quary_velocities: np.ndarray, vf_dict: dict):
+    """Assemble the velocities from the kernel part ``K @ C`` of the vector field evaluated at ``X``."""
+    quary_rigid = np.dot(norm_x, vf_dict["R"].T) + vf_dict["t"]
+    quary_norm_x = quary_velocities + quary_rigid
+    quary_x = quary_norm_x * vf_dict["norm_dict"]["scale_fixed"] + vf_dict["norm_dict"]["mean_fixed"]
+    _velocities = quary_x - X
+    return _velocities / 10000
+
+
+def _gp_velocity(
+    X: np.ndarray, vf_dict: dict, geodist_index: Optional[Tuple[cKDTree, np.ndarray, np.ndarray]] = None
+) -> np.ndarray:
     # pre_scale = vf_dict["pre_norm_scale"]
     norm_x = (X - vf_dict["norm_dict"]["mean_transformed"]) / vf_dict["norm_dict"]["scale_transformed"]
     if vf_dict["kernel_dict"]["dist"] == "cdist":
         quary_kernel = _con_K(norm_x, vf_dict["X_ctrl"], vf_dict["beta"])
     elif vf_dict["kernel_dict"]["dist"] == "geodist":
-        quary_kernel = _con_K_geodist(norm_x, vf_dict["kernel_dict"], vf_dict["beta"])
+        quary_kernel = _con_K_geodist(norm_x, vf_dict["kernel_dict"], vf_dict["beta"], geodist_index=geodist_index)
     else:
         raise ValueError(f"current only support cdist and geodist")
     quary_velocities = np.dot(quary_kernel, vf_dict["C"])
-    quary_rigid = np.dot(norm_x, vf_dict["R"].T) + vf_dict["t"]
-    quary_norm_x = quary_velocities + quary_rigid
-    quary_x = quary_norm_x * vf_dict["norm_dict"]["scale_fixed"] + vf_dict["norm_dict"]["mean_fixed"]
-    _velocities = quary_x - X
-    return _velocities / 10000
+    return _gp_velocity_from_kernel(X, norm_x, quary_velocities, vf_dict)
+
+
+def _gp_geodist_index(vf_dict: dict) -> Optional[Tuple[cKDTree, np.ndarray, np.ndarray]]:
+    """Build the nearest-node index of a vector field with a geodesic kernel, or return None for other kernels."""
+    if vf_dict["kernel_dict"]["dist"] == "geodist":
+        return _geodist_index(vf_dict["kernel_dict"])
+    return None
+
+
+def _gp_velocity_func(vf_dict: dict) -> Callable:
+    """Get the velocity function of a GP vector field. The nearest-node index of a geodesic kernel is built once here
+    and reused by every evaluation of the returned function."""
+    geodist_index = _gp_geodist_index(vf_dict)
+    return lambda X: _gp_velocity(X, vf_dict, geodist_index=geodist_index)
 
 
 def morphofield_gp(
@@ -134,7 +194,8 @@ def morphofield_gp(
     if vf_key in adata.uns.keys():
         vf_dict = adata.uns[vf_key]
         vf_dict["X"] = np.asarray(adata.obsm[spatial_key], dtype=float)
-        vf_dict["V"] = _gp_velocity(vf_dict["X"], vf_dict=vf_dict)
+        velocity_func = _gp_velocity_func(vf_dict)
+        vf_dict["V"] = velocity_func(vf_dict["X"])
 
         if not (NX is None):
             predict_X = NX
@@ -145,7 +206,7 @@ def morphofield_gp(
             _, _, Grid, grid_in_hull = get_X_Y_grid(X=vf_dict["X"].copy(), Y=vf_dict["V"].copy(), grid_num=grid_num)
             predict_X = Grid
         vf_dict["grid"] = predict_X
-        vf_dict["grid_V"] = _gp_velocity(predict_X, vf_dict=vf_dict)
+        vf_dict["grid_V"] = velocity_func(predict_X)
 
         vf_dict["method"] = "gaussian_process"
         lm.main_finish_progress(progress_name="morphofield")
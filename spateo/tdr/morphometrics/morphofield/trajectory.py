@@ -1,5 +1,7 @@
-from typing import Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, Union
 
+import numpy as np
 from anndata import AnnData
 
 try:
@@ -7,6 +9,157 @@ try:
 except ImportError:
     from typing_extensions import Literal
 
+from spateo.logging import logger_manager as lm
+
+# Dormand-Prince 5(4) coefficients.
+_DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+_DP_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+_DP_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0])
+_DP_E = _DP_B - np.array([5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40])
+
+
+def _integrate_rk4(f: Callable, y0: np.ndarray, t: np.ndarray, out: np.ndarray, substeps: int = 1, **kwargs) -> None:
+    """Integrate all rows of ``y0`` together with the classical fixed-step Runge-Kutta method, writing the states at
+    the time points ``t`` into ``out`` of shape (len(t), n, d)."""
+    y = np.array(y0, dtype=float)
+    out[0] = y
+    for k in range(1, len(t)):
+        h = (t[k] - t[k - 1]) / substeps
+        for _ in range(substeps):
+            k1 = f(y)
+            k2 = f(y + h / 2 * k1)
+            k3 = f(y + h / 2 * k2)
+            k4 = f(y + h * k3)
+            y = y + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        out[k] = y
+
+
+def _integrate_rk45(
+    f: Callable,
+    y0: np.ndarray,
+    t: np.ndarray,
+    out: np.ndarray,
+    rtol: float = 1e-3,
+    atol: float = 1e-6,
+    max_iter: int = 100000,
+    **kwargs,
+) -> None:
+    """Integrate all rows of ``y0`` together with the adaptive Dormand-Prince method. Every row keeps its own time and
+    step size, which are controlled by its own error estimate, while each stage evaluates ``f`` once for all rows that
+    are still being integrated. The states at the time points ``t`` are written into ``out`` of shape (len(t), n, d).
+    """
+    n = y0.shape[0]
+    y = np.array(y0, dtype=float)
+    out[0] = y
+    t_cur = np.full(n, t[0], dtype=float)
+    next_idx = np.ones(n, dtype=int)
+    h = np.full(n, (t[-1] - t[0]) / max(len(t) - 1, 1))
+    k_first = f(y)
+
+    for _ in range(max_iter):
+        active = np.where(next_idx < len(t))[0]
+        if len(active) == 0:
+            break
+        ya, ta = y[active], t_cur[active]
+        # never step over the next requested time point, so that it is hit exactly.
+        t_next = t[next_idx[active]]
+        ha = np.minimum(h[active], t_next - ta)[:, None]
+
+        ks = [k_first[active]]
+        for i in range(1, 7):
+            ks.append(f(ya + ha * sum(a * k for a, k in zip(_DP_A[i], ks) if a != 0)))
+        y_new = ya + ha * sum(b * k for b, k in zip(_DP_B, ks) if b != 0)
+        y_err = ha * sum(e * k for e, k in zip(_DP_E, ks) if e != 0)
+
+        scale = atol + rtol * np.maximum(np.abs(ya), np.abs(y_new))
+        err = np.sqrt(np.mean((y_err / scale) ** 2, axis=1))
+        accepted = err <= 1
+
+        acc = active[accepted]
+        y[acc] = y_new[accepted]
+        t_cur[acc] = ta[accepted] + ha[accepted, 0]
+        k_first[acc] = ks[6][accepted]
+
+        reached = acc[np.isclose(t_cur[acc], t_next[accepted], rtol=1e-12, atol=0)]
+        t_cur[reached] = t[next_idx[reached]]
+        out[next_idx[reached], reached] = y[reached]
+        next_idx[reached] += 1
+
+        factor = np.clip(0.9 * np.power(np.maximum(err, 1e-10), -0.2), 0.2, 5)
+        h[active] = np.where(accepted, np.maximum(h[active], ha[:, 0]), ha[:, 0]) * factor
+    else:
+        lm.main_warning(f"Max iteration reached before all cells are integrated to the last time point.")
+
+
+def _integrate_cells(
+    f: Callable,
+    init_states: np.ndarray,
+    t: np.ndarray,
+    solver: Literal["rk4", "rk45"] = "rk4",
+    n_threads: int = 1,
+    dtype: str = "float32",
+    **kwargs,
+) -> np.ndarray:
+    """Integrate the vector field ``f`` from all initial states at once and return the states at the time points
+    ``t`` as a preallocated (len(t), n_cells, n_features) array. If ``n_threads`` > 1, the cells are split into
+    ``n_threads`` blocks that are integrated in a thread pool sharing the same vector field."""
+    integrator = {"rk4": _integrate_rk4, "rk45": _integrate_rk45}[solver]
+    out = np.zeros((len(t), init_states.shape[0], init_states.shape[1]), dtype=dtype)
+
+    bounds = np.linspace(0, init_states.shape[0], max(min(n_threads, init_states.shape[0]), 1) + 1).astype(int)
+    if len(bounds) == 2:
+        integrator(f, init_states, t, out, **kwargs)
+    else:
+        # each block writes into its own contiguous slice of the output array.
+        with ThreadPoolExecutor(max_workers=len(bounds) - 1) as executor:
+            futures = [
+                executor.submit(integrator, f, init_states[start:end], t, out[:, start:end], **kwargs)
+                for start, end in zip(bounds[:-1], bounds[1:])
+            ]
+            for future in futures:
+                future.result()
+
+    return out
+
+
+def _morphopath_builtin(
+    vf: Callable,
+    init_states: np.ndarray,
+    t_end: float,
+    direction: str = "forward",
+    interpolation_num: int = 250,
+    solver: Literal["rk4", "rk45"] = "rk4",
+    n_threads: int = 1,
+    **kwargs,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Predict the trajectories of all cells with the built-in batched integrators.
+
+    Returns:
+        t: The (T,) time points.
+        prediction: The (T, n_cells, n_features) predicted cell states.
+    """
+    t = np.linspace(0, t_end, interpolation_num)
+    if direction == "forward":
+        return t, _integrate_cells(vf, init_states, t, solver=solver, n_threads=n_threads, **kwargs)
+    elif direction == "backward":
+        backward_vf = lambda x: -vf(x)
+        return -t, _integrate_cells(backward_vf, init_states, t, solver=solver, n_threads=n_threads, **kwargs)
+    elif direction == "both":
+        backward_vf = lambda x: -vf(x)
+        prediction_b = _integrate_cells(backward_vf, init_states, t, solver=solver, n_threads=n_threads, **kwargs)
+        prediction_f = _integrate_cells(vf, init_states, t, solver=solver, n_threads=n_threads, **kwargs)
+        return np.concatenate([-t[::-1], t[1:]]), np.concatenate([prediction_b[::-1], prediction_f[1:]])
+    else:
+        raise Exception("both, forward, backward are the only valid direction argument strings")
+
 
 def morphopath(
     adata: AnnData,
@@ -18,6 +171,7 @@ def morphopath(
     t_end: Optional[Union[int, float]] = None,
     average: bool = False,
     cores: int = 1,
+    solver: Literal["dynamo", "rk4", "rk45"] = "dynamo",
     inplace: bool = True,
     **kwargs,
 ) -> Optional[AnnData]:
@@ -38,9 +192,21 @@ def morphopath(
                  cells predicted from the vector field function at each time point will be used. If ``average`` is
                  ``False``, no averaging will be applied.
         cores: Number of cores to calculate path integral for predicting cell fate. If cores is set to be > 1,
-               multiprocessing will be used to parallel the fate prediction.
+               multiprocessing will be used to parallel the fate prediction. For the built-in solvers, the cells are
+               split into ``cores`` blocks that are integrated in a thread pool.
+        solver: The ODE solver used for predicting cell fate.
+
+                * ``'dynamo'``: Integrate each cell separately with dynamo's ``fate`` function, sampling the trajectories
+                  with uniform arc length.
+                * ``'rk4'``: Integrate all cells together as one (n_cells, n_features) state array with the fixed-step
+                  Runge-Kutta method, one step per interpolated time point (see ``substeps`` in ``**kwargs``).
+                * ``'rk45'``: Integrate all cells together with the adaptive Dormand-Prince method, where the step size
+                  of each cell is controlled by its own error estimate (see ``rtol`` and ``atol`` in ``**kwargs``).
+
+                The built-in solvers evaluate the vector field once per stage for all cells and write the states at
+                ``interpolation_num`` uniformly spaced time points into a preallocated float32 array.
         inplace: Whether to copy adata or modify it inplace.
-        **kwargs: Additional parameters that will be passed into the ``fate`` function.
+        **kwargs: Additional parameters that will be passed into the ``fate`` function, or into the built-in solvers.
 
     Returns:
 
@@ -56,9 +222,24 @@ def morphopath(
                         embeddings. Of note, if the average is set to be True, the average cell state at each time point
                         is calculated for all cells.
     """
+    adata = adata if inplace else adata.copy()
+    if solver != "dynamo":
+        _morphopath_batched(
+            adata=adata,
+            vf_key=vf_key,
+            key_added=key_added,
+            direction=direction,
+            interpolation_num=interpolation_num,
+            t_end=t_end,
+            average=average,
+            cores=cores,
+            solver=solver,
+            **kwargs,
+        )
+        return None if inplace else adata
+
     from dynamo.prediction.fate import fate
 
-    adata = adata if inplace else adata.copy()
     fate_adata = adata.copy()
     if vf_key not in fate_adata.uns_keys():
         raise Exception(
@@ -77,7 +258,7 @@ def morphopath(
 
     method = adata.uns[vf_key]["method"]
     if method == "gaussian_process":
-        from .gaussian_process import _gp_velocity
+        from .gaussian_process import _gp_velocity_func
 
         fate(
             fate_adata,
@@ -89,7 +270,7 @@ def morphopath(
             direction=direction,
             average=average,
             cores=cores,
-            VecFld_true=lambda X: _gp_velocity(X=X, vf_dict=fate_adata.uns[vf_key]),
+            VecFld_true=_gp_velocity_func(fate_adata.uns[vf_key]),
             **kwargs,
         )
     elif method == "sparsevfc":
@@ -113,3 +294,70 @@ def morphopath(
     adata.uns[key_added]["t"] = {i: cell_times for i, cell_times in enumerate(cells_times)}
 
     return None if inplace else adata
+
+
+def _morphopath_batched(
+    adata: AnnData,
+    vf_key: str = "VecFld_morpho",
+    key_added: str = "fate_morpho",
+    direction: str = "forward",
+    interpolation_num: int = 250,
+    t_end: Optional[Union[int, float]] = None,
+    average: Union[bool, str] = False,
+    cores: int = 1,
+    solver: Literal["rk4", "rk45"] = "rk4",
+    **kwargs,
+):
+    """Predict cell trajectories with the built-in batched solvers, see ``morphopath``."""
+    from dynamo.tools.utils import getTend
+
+    if vf_key not in adata.uns_keys():
+        raise Exception(
+            f"The {vf_key} that corresponds to the reconstructed vector field is not in ``anndata.uns``."
+            f"Please run ``st.tdr.morphofield_gp`` or ``st.tdr.morphofield_sparsevfc`` before fate prediction."
+        )
+    if solver not in ["rk4", "rk45"]:
+        raise ValueError(f"`solver` must be one of `dynamo`, `rk4` or `rk45`, but got `{solver}`.")
+
+    vf_dict = adata.uns[vf_key]
+    method = vf_dict["method"]
+    if method == "gaussian_process":
+        from .gaussian_process import _gp_velocity_func
+
+        vf = _gp_velocity_func(vf_dict)
+    elif method == "sparsevfc":
+        from dynamo.vectorfield.utils import vector_field_function
+
+        vf = lambda X: vector_field_function(x=X, vf_dict=vf_dict)
+    else:
+        raise Exception(
+            f"The method for vector field  reconstruction is not in avaliable."
+            f"Please re-run ``st.tdr.morphofield_gp`` or ``st.tdr.morphofield_sparsevfc`` before fate prediction."
+        )
+
+    init_states = np.asarray(vf_dict["X"], dtype=float)
+    if t_end is None:
+        t_end = getTend(init_states, np.asarray(vf_dict["V"]))
+    if average in ["origin", True]:
+        init_states = init_states.mean(0, keepdims=True)
+
+    lm.main_info(f"Integrating {init_states.shape[0]} cells together with the `{solver}` solver.")
+    t, prediction = _morphopath_builtin(
+        vf=vf,
+        init_states=init_states,
+        t_end=t_end,
+        direction=direction,
+        interpolation_num=interpolation_num,
+        solver=solver,
+        n_threads=cores,
+        **kwargs,
+    )
+    if average == "trajectory":
+        prediction = prediction.mean(1, keepdims=True)
+
+    adata.uns[key_added] = {
+        "init_states": init_states,
+        "average": average,
+        "prediction": {i: prediction[:, i, :] for i in range(prediction.shape[1])},
+        "t": {i: t for i in range(prediction.shape[1])},
+    }
@@ -1,7 +1,8 @@
-from typing import Callable, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 from anndata import AnnData
+from scipy.spatial.distance import cdist
 from tqdm import tqdm
 
 #########################
@@ -52,26 +53,26 @@ def compute_curvature(vf, f_jac, X, Js=None, formula=2):
     return curv, cur_mat
 
 
-def compute_curl(f_jac, X):
+def compute_curl(f_jac, X, Js=None):
     """Calculate curl for 2D or 3D systems."""
 
     n = len(X)
     if X.shape[1] == 2:
         curl = np.zeros(n)
         for i in tqdm(range(n), desc=f"Calculating {X.shape[1]}-D curl"):
-            jac = f_jac(X[i])
+            jac = f_jac(X[i]) if Js is None else Js[:, :, i]
             curl[i] = jac[1, 0] - jac[0, 1]
     elif X.shape[1] == 3:
         curl = np.zeros((n, 3, 3))
         for i in tqdm(range(n), desc=f"Calculating {X.shape[1]}-D curl"):
-            jac = f_jac(X[i])
+            jac = f_jac(X[i]) if Js is None else Js[:, :, i]
             curl[i] = np.array([jac[2, 1] - jac[1, 2], jac[0, 2] - jac[2, 0], jac[1, 0] - jac[0, 1]])
     else:
         raise ValueError(f"X has incorrect dimensions.")
     return curl
 
 
-def compute_torsion(vf, f_jac, X):
+def compute_torsion(vf, f_jac, X, Js=None):
     """Calculate torsion."""
 
     def _torsion(v, J, a):
@@ -86,7 +87,7 @@ def compute_torsion(vf, f_jac, X):
     n = len(X)
 
     tor = np.zeros((n, X.shape[1], X.shape[1]))
-    v, J, a_, a = compute_acceleration(vf, f_jac, X, return_all=True)
+    v, J, a_, a = compute_acceleration(vf, f_jac, X, Js=Js, return_all=True)
 
     for i in tqdm(range(n), desc="Calculating torsion"):
         tor[i] = _torsion(v[i], J[:, :, i], a[i])
@@ -140,7 +141,56 @@ def compute_sensitivity(f_jac, X):
 #################
 
 
-def Jacobian_GP_gaussian_kernel(X: np.ndarray, vf_dict: dict, vectorize: bool = False) -> np.ndarray:
+def _gp_kernel_jacobian(
+    x_norm: np.ndarray, vf_dict: dict, CY: Optional[np.ndarray] = None, geodist_index: Optional[tuple] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluate the kernel part of a GP vector field and its Jacobian for a block of normalized query points.
+
+    For the ``cdist`` kernel the Jacobian is reduced to two matrix products over the control points, so that no
+    (n, d, m) displacement tensor is materialized.
+
+    Args:
+        x_norm: The (n, d) normalized query points.
+        vf_dict: A dictionary containing RKHS vector field control points, Gaussian bandwidth, and RKHS coefficients.
+        CY: The precomputed (m, d * d) products of the RKHS coefficients and the control points, only used by the
+            ``cdist`` kernel.
+        geodist_index: The nearest-node index of a ``geodist`` kernel, see ``_geodist_index``.
+
+    Returns:
+        KC: The (n, d) kernel part ``K @ C`` of the vector field.
+        J: The (n, d, d) Jacobians of ``KC`` with respect to ``x_norm``, without the ``-2 * beta`` factor.
+    """
+    from ..morphofield.gaussian_process import _geodist_components
+
+    C, beta = vf_dict["C"], vf_dict["beta"]
+    n, d = x_norm.shape
+    if vf_dict["kernel_dict"]["dist"] == "cdist":
+        Y = vf_dict["X_ctrl"]
+        if CY is None:
+            CY = (C[:, :, None] * Y[:, None, :]).reshape(len(Y), -1)
+        K = np.exp(-beta * cdist(x_norm, Y, "sqeuclidean"))
+        KC = K @ C
+        # sum_m K_nm C_mi (x_nj - y_mj) = x_nj (K @ C)_ni - (K @ (C_mi y_mj))_nij
+        J = KC[:, :, None] * x_norm[:, None, :] - (K @ CY).reshape(n, d, d)
+    else:
+        D, K_mask, to_first_node_dist_D, to_first_node_dist = _geodist_components(
+            x_norm, vf_dict["kernel_dict"], geodist_index
+        )
+        K = np.exp(-beta * D**2)
+        KC = K @ C
+        W = np.divide(K * D, to_first_node_dist, out=np.zeros_like(D), where=(to_first_node_dist > 0) & ~K_mask)
+        J = np.einsum("nm, mi, nmj -> nij", W, C, to_first_node_dist_D, optimize=True)
+
+    return KC, J
+
+
+def Jacobian_GP_gaussian_kernel(
+    X: np.ndarray,
+    vf_dict: dict,
+    vectorize: bool = False,
+    chunk_size: Optional[int] = 1000,
+    geodist_index: Optional[tuple] = None,
+) -> np.ndarray:
     """analytical Jacobian for RKHS vector field functions with Gaussian kernel.
 
     Args:
@@ -148,40 +198,130 @@ def Jacobian_GP_gaussian_kernel(X: np.ndarray, vf_dict: dict, vectorize: bool =
     vf_dict: A dictionary containing RKHS vector field control points, Gaussian bandwidth,
         and RKHS coefficients.
         Essential keys: 'X_ctrl', 'beta', 'C'
+    vectorize: Kept for backward compatibility. The Jacobian is always evaluated in vectorized blocks of
+        ``chunk_size`` points.
+    chunk_size: The number of points evaluated at once, which bounds the memory to ``chunk_size`` times the number of
+        control points. If None, all points are evaluated at once.
+    geodist_index: The nearest-node index of a ``geodist`` kernel. If None, it is built for this call.
 
     Returns:
         Jacobian matrices stored as d-by-d-by-n numpy arrays evaluated at x.
             d is the number of dimensions and n the number of coordinates in x.
     """
-    from ..morphofield.gaussian_process import _con_K, _con_K_geodist
+    J = compute_gp_differential_geometry(
+        X=X, vf_dict=vf_dict, quantities=["jacobian"], chunk_size=chunk_size, geodist_index=geodist_index
+    )
+    return J["jacobian"][:, :, 0] if np.ndim(X) == 1 else J["jacobian"]
+
+
+def compute_gp_differential_geometry(
+    X: np.ndarray,
+    vf_dict: dict,
+    quantities: Union[str, List[str]] = "jacobian",
+    chunk_size: Optional[int] = 1000,
+    formula: int = 2,
+    geodist_index: Optional[tuple] = None,
+) -> Dict[str, np.ndarray]:
+    """Calculate several differential geometry quantities of a GP vector field from a single pass over the query
+    points. The kernel values, velocities and analytical Jacobians are evaluated for blocks of ``chunk_size`` points,
+    and all requested quantities are derived from them, so the Jacobian is never recomputed.
+
+    Args:
+        X: The (n, d) coordinates where the quantities are evaluated.
+        vf_dict: A dictionary containing RKHS vector field control points, Gaussian bandwidth, and RKHS coefficients.
+        quantities: The quantities to calculate, any of ``'velocity'``, ``'jacobian'``, ``'divergence'``,
+            ``'curl'``, ``'acceleration'``, ``'curvature'`` and ``'torsion'``.
+        chunk_size: The number of points evaluated at once. If None, all points are evaluated at once.
+        formula: Which formula of curvature will be used, see ``compute_curvature``.
+        geodist_index: The nearest-node index of a ``geodist`` kernel. If None, it is built once for this call.
 
-    pre_scale = vf_dict["norm_dict"]["scale_fixed"] / vf_dict["norm_dict"]["scale_transformed"]
-    x_norm = (X - vf_dict["norm_dict"]["mean_transformed"]) / vf_dict["norm_dict"]["scale_transformed"]
-    if x_norm.ndim == 1:
-        if vf_dict["kernel_dict"]["dist"] == "cdist":
-            K, D = _con_K(x_norm[None, :], vf_dict["X_ctrl"], vf_dict["beta"], return_d=True)
+    Returns:
+        A dictionary with the requested quantities:
+
+            velocity: (n, d) velocities.
+            jacobian: (d, d, n) Jacobian matrices.
+            divergence: (n,) divergence.
+            curl: (n,) curl for 2D systems or (n, 3) curl vectors for 3D systems.
+            acceleration: (n, d) acceleration vectors.
+            curvature: (n, d) curvature vectors when ``formula = 2``, otherwise (n,) curvature.
+            torsion: (n, 3) torsion vectors, only defined for 3D systems.
+    """
+    from ..morphofield.gaussian_process import (
+        _gp_geodist_index,
+        _gp_velocity_from_kernel,
+    )
+
+    quantities = [quantities] if isinstance(quantities, str) else list(quantities)
+    valid_quantities = ["velocity", "jacobian", "divergence", "curl", "acceleration", "curvature", "torsion"]
+    for q in quantities:
+        if q not in valid_quantities:
+            raise ValueError(f"`{q}` is not a valid quantity, please choose from {valid_quantities}.")
+
+    X = np.asarray(X, dtype=float)
+    X = X[None, :] if X.ndim == 1 else X
+    n, d = X.shape
+    if "curl" in quantities and d not in [2, 3]:
+        raise ValueError(f"X has incorrect dimensions.")
+    if "torsion" in quantities and d != 3:
+        raise ValueError(f"torsion is only defined in 3 dimension.")
+    chunk_size = n if chunk_size is None else max(int(chunk_size), 1)
+
+    norm_dict = vf_dict["norm_dict"]
+    pre_scale = norm_dict["scale_fixed"] / norm_dict["scale_transformed"]
+    CY = None
+    if vf_dict["kernel_dict"]["dist"] == "cdist":
+        C, Y = vf_dict["C"], vf_dict["X_ctrl"]
+        CY = (C[:, :, None] * Y[:, None, :]).reshape(len(Y), -1)
+    elif geodist_index is None:
+        geodist_index = _gp_geodist_index(vf_dict)
+
+    results = {}
+    for q in quantities:
+        if q == "jacobian":
+            results[q] = np.zeros((d, d, n))
+        elif q in ["divergence"] or (q == "curl" and d == 2) or (q == "curvature" and formula != 2):
+            results[q] = np.zeros(n)
         else:
-            K, D = _con_K_geodist(x_norm[None, :], vf_dict["kernel_dict"], vf_dict["beta"], return_d=True)
-        J = (vf_dict["C"].T * K) @ D[0].T
-    elif not vectorize:
-        n, d = x_norm.shape
-        J = np.zeros((d, d, n))
-        for i, xi in enumerate(x_norm):
-            if vf_dict["kernel_dict"]["dist"] == "cdist":
-                K, D = _con_K(xi[None, :], vf_dict["X_ctrl"], vf_dict["beta"], return_d=True)
+            results[q] = np.zeros((n, d))
+
+    need_velocity = any(q in quantities for q in ["velocity", "acceleration", "curvature", "torsion"])
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        x = X[start:end]
+        x_norm = (x - norm_dict["mean_transformed"]) / norm_dict["scale_transformed"]
+        KC, J = _gp_kernel_jacobian(x_norm, vf_dict, CY=CY, geodist_index=geodist_index)
+        J = -2 * vf_dict["beta"] * J * pre_scale
+
+        if need_velocity:
+            v = _gp_velocity_from_kernel(x, x_norm, KC, vf_dict)
+            a = np.einsum("nij, nj -> ni", J, v)
+        if "velocity" in quantities:
+            results["velocity"][start:end] = v
+        if "jacobian" in quantities:
+            results["jacobian"][:, :, start:end] = J.transpose([1, 2, 0])
+        if "divergence" in quantities:
+            results["divergence"][start:end] = np.einsum("nii -> n", J)
+        if "curl" in quantities:
+            if d == 2:
+                results["curl"][start:end] = J[:, 1, 0] - J[:, 0, 1]
             else:
-                K, D = _con_K_geodist(xi[None, :], vf_dict["kernel_dict"], vf_dict["beta"], return_d=True)
-            J[:, :, i] = (vf_dict["C"].T * K) @ D[0].T
-    else:
-        if vf_dict["kernel_dict"]["dist"] == "cdist":
-            K, D = _con_K(x_norm, vf_dict["X_ctrl"], vf_dict["beta"], return_d=True)
-        else:
-            K, D = _con_K_geodist(x_norm, vf_dict["kernel_dict"], vf_dict["beta"], return_d=True)
-        if K.ndim == 1:
-            K = K[None, :]
-        J = np.einsum("nm, mi, njm -> ijn", K, vf_dict["C"], D)
+                results["curl"][start:end] = np.stack(
+                    [J[:, 2, 1] - J[:, 1, 2], J[:, 0, 2] - J[:, 2, 0], J[:, 1, 0] - J[:, 0, 1]], axis=1
+                )
+        if "acceleration" in quantities:
+            results["acceleration"][start:end] = a
+        if "curvature" in quantities:
+            vv, va = np.sum(v * v, axis=1), np.sum(v * a, axis=1)
+            if formula == 2:
+                results["curvature"][start:end] = (a * vv[:, None] - v * va[:, None]) / vv[:, None] ** 2
+            else:
+                results["curvature"][start:end] = np.linalg.norm(a, axis=1) / vv
+        if "torsion" in quantities:
+            # outer(v, a) @ (J @ a) / ||outer(v, a)||^2
+            aJa = np.einsum("ni, nij, nj -> n", a, J, a)
+            results["torsion"][start:end] = v * (aJa / (np.sum(v * v, axis=1) * np.sum(a * a, axis=1)))[:, None]
 
-    return -2 * vf_dict["beta"] * J * pre_scale
+    return results
 
 
 class GPVectorField:
@@ -189,7 +329,7 @@ class GPVectorField:
         self.data = {}
 
     def from_adata(self, adata: AnnData, vf_key: str = "VecFld"):
-        from ..morphofield.gaussian_process import _gp_velocity
+        from ..morphofield.gaussian_process import _gp_geodist_index, _gp_velocity
 
         if vf_key in adata.uns.keys():
             vf_dict = adata.uns[vf_key]
@@ -200,7 +340,9 @@ class GPVectorField:
             )
 
         self.vf_dict = vf_dict
-        self.func = lambda x: _gp_velocity(x, vf_dict)
+        # the nearest-node index of a geodesic kernel is built once and reused by all evaluations.
+        self.geodist_index = _gp_geodist_index(vf_dict)
+        self.func = lambda x: _gp_velocity(x, vf_dict, geodist_index=self.geodist_index)
         self.data["X"] = vf_dict["X"]
         self.data["V"] = vf_dict["V"]
 
@@ -210,7 +352,7 @@ class GPVectorField:
     def compute_velocity(self, X: np.ndarray):
         from ..morphofield.gaussian_process import _gp_velocity
 
-        return _gp_velocity(X, self.vf_dict)
+        return _gp_velocity(X, self.vf_dict, geodist_index=self.geodist_index)
 
     def compute_acceleration(self, X: Optional[np.ndarray] = None, **kwargs):
         X = self.data["X"] if X is None else X
@@ -231,12 +373,29 @@ class GPVectorField:
         else:
             X = X[:, [dim1, dim2, dim3]]
         f_jac = self.get_Jacobian(**kwargs)
-        return compute_curl(f_jac=f_jac, X=X)
+        return compute_curl(f_jac=f_jac, X=X, Js=f_jac(X))
 
     def compute_torsion(self, X: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
         X = self.data["X"] if X is None else X
         f_jac = self.get_Jacobian(**kwargs)
-        return compute_torsion(vf=self.func, f_jac=f_jac, X=X)
+        return compute_torsion(vf=self.func, f_jac=f_jac, X=X, Js=f_jac(X))
+
+    def compute_differential_geometry(
+        self,
+        X: Optional[np.ndarray] = None,
+        quantities: Union[str, List[str]] = "jacobian",
+        chunk_size: Optional[int] = 1000,
+        formula: int = 2,
+    ) -> Dict[str, np.ndarray]:
+        X = self.data["X"] if X is None else X
+        return compute_gp_differential_geometry(
+            X=X,
+            vf_dict=self.vf_dict,
+            quantities=quantities,
+            chunk_size=chunk_size,
+            formula=formula,
+            geodist_index=self.geodist_index,
+        )
 
     def compute_divergence(self, X: Optional[np.ndarray] = None, **kwargs) -> np.ndarray:
         X = self.data["X"] if X is None else X
@@ -256,4 +415,4 @@ class GPVectorField:
                 ...         ...         ...         ...
         """
         if method == "analytical":
-            return lambda x: Jacobian_GP_gaussian_kernel(X=x, vf_dict=self.vf_dict)
+            return lambda x: Jacobian_GP_gaussian_kernel(X=x, vf_dict=self.vf_dict, geodist_index=self.geodist_index)
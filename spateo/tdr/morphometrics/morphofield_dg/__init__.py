@@ -2,6 +2,7 @@ from .differential_geometry import (
     morphofield_acceleration,
     morphofield_curl,
     morphofield_curvature,
+    morphofield_differential_geometry,
     morphofield_divergence,
     morphofield_jacobian,
     morphofield_torsion,
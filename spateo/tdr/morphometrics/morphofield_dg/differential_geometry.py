@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional, Union
 
 import numpy as np
 from anndata import AnnData
@@ -306,3 +306,63 @@ def morphofield_jacobian(
     adata.uns[key_added] = Js
 
     return None if inplace else adata
+
+
+def morphofield_differential_geometry(
+    adata: AnnData,
+    vf_key: str = "VecFld_morpho",
+    quantities: Union[str, List[str]] = ("acceleration", "curvature", "curl", "divergence"),
+    formula: int = 2,
+    chunk_size: Optional[int] = 1000,
+    inplace: bool = True,
+) -> Optional[AnnData]:
+    """
+    Calculate several differential geometry quantities for each cell with the reconstructed Gaussian process vector
+    field function. Compared with calling ``morphofield_acceleration``, ``morphofield_curl``, etc. one by one, the
+    analytical Jacobian is computed only once, in memory-bounded chunks of cells.
+
+    Args:
+        adata: AnnData object that contains the reconstructed vector field.
+        vf_key: The key in ``.uns`` that corresponds to the reconstructed vector field.
+        quantities: The quantities to calculate, any of ``'velocity'``, ``'jacobian'``, ``'divergence'``,
+                    ``'curl'``, ``'acceleration'``, ``'curvature'`` and ``'torsion'``. Each quantity is saved under the
+                    key of the same name.
+        formula: Which formula of curvature will be used, see ``morphofield_curvature``.
+        chunk_size: The number of cells evaluated at once. If None, all cells are evaluated at once.
+        inplace: Whether to copy adata or modify it inplace.
+
+    Returns:
+        An ``AnnData`` object is updated/copied with the following keys:
+
+        ``velocity``: The velocity vectors in ``.obsm``.
+        ``jacobian``: The determinant of jacobian in ``.obs`` and jacobian tensor in ``.uns``.
+        ``divergence``: The divergence in ``.obs``.
+        ``curl``, ``acceleration``, ``curvature``, ``torsion``: The magnitudes in ``.obs`` and the vectors in ``.obsm``.
+                    For 2D systems the curl is a scalar and only saved in ``.obs``.
+    """
+
+    adata = adata if inplace else adata.copy()
+    if adata.uns[vf_key]["method"] != "gaussian_process":
+        raise Exception(
+            f"Batched differential geometry is only available for the vector field reconstructed by "
+            f"``st.tdr.morphofield_gp``. Please use ``morphofield_acceleration``, ``morphofield_curl``, etc. instead."
+        )
+    vector_field_class = _generate_vf_class(adata=adata, vf_key=vf_key, method=adata.uns[vf_key]["method"])
+
+    X, V = vector_field_class.get_data()
+    results = vector_field_class.compute_differential_geometry(
+        X=X, quantities=quantities, chunk_size=chunk_size, formula=formula
+    )
+    for key, value in results.items():
+        if key == "velocity":
+            adata.obsm[key] = value
+        elif key == "jacobian":
+            adata.obs[key] = np.linalg.det(value.transpose([2, 0, 1]))
+            adata.uns[key] = value
+        elif value.ndim == 1:
+            adata.obs[key] = value
+        else:
+            adata.obs[key] = np.linalg.norm(value, axis=1)
+            adata.obsm[key] = value
+
+    return None if inplace else adata
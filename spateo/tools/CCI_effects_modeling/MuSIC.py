@@ -30,7 +30,12 @@ from ...tools.spatial_smooth import smooth
 from ..find_neighbors import find_bw_for_n_neighbors, get_wi, neighbors
 from ..spatial_degs import moran_i
 from .distributions import Gaussian, NegativeBinomial, Poisson
-from .regression_utils import compute_betas_local, iwls, multicollinearity_check
+from .regression_utils import (
+    compute_betas_local,
+    iwls,
+    multicollinearity_check,
+    spatial_lag_ligands,
+)
 
 
 # ---------------------------------------------------------------------------------------------------
@@ -1531,20 +1536,9 @@ class MuSIC:
                         self.logger.info(f"Saving spatial weights for secreted ligands to {secreted_path}.")
                         scipy.sparse.save_npz(secreted_path, spatial_weights_secreted)
 
-                lagged_expr_mat = np.zeros_like(self.ligands_expr.values, dtype=float)
-
-                for i, ligand in enumerate(self.ligands_expr.columns):
-                    expr = self.ligands_expr[ligand]
-                    expr_sparse = scipy.sparse.csr_matrix(expr.values.reshape(-1, 1))
-                    matching_rows = self.lr_db[self.lr_db["from"] == ligand]
-                    if (
-                        matching_rows["type"].str.contains("Secreted Signaling").any()
-                        or matching_rows["type"].str.contains("ECM-Receptor").any()
-                    ):
-                        lagged_expr = spatial_weights_secreted.dot(expr_sparse).A.flatten()
-                    else:
-                        lagged_expr = spatial_weights_membrane_bound.dot(expr_sparse).A.flatten()
-                    lagged_expr_mat[:, i] = lagged_expr
+                lagged_expr_mat = spatial_lag_ligands(
+                    self.ligands_expr, self.lr_db, spatial_weights_secreted, spatial_weights_membrane_bound
+                )
                 self.ligands_expr = pd.DataFrame(
                     lagged_expr_mat, index=adata.obs_names, columns=self.ligands_expr.columns
                 )
@@ -69,6 +69,37 @@ def sparse_dot(
     return prod
 
 
+def spatial_lag_ligands(
+    ligands_expr: pd.DataFrame,
+    lr_db: pd.DataFrame,
+    spatial_weights_secreted: scipy.sparse.spmatrix,
+    spatial_weights_membrane_bound: scipy.sparse.spmatrix,
+) -> np.ndarray:
+    """Compute the spatially-lagged expression of ligands. Secreted and ECM ligands are lagged with the secreted
+    spatial weights and all other ligands with the membrane-bound spatial weights, each group with a single sparse
+    matrix product.
+
+    Args:
+        ligands_expr: Ligand expression, with cells as rows and ligands as columns
+        lr_db: Ligand-receptor database, with ligands in the "from" column and the signaling type in the "type" column
+        spatial_weights_secreted: Sparse (n_cells, n_cells) spatial weights for secreted and ECM ligands
+        spatial_weights_membrane_bound: Sparse (n_cells, n_cells) spatial weights for membrane-bound ligands
+
+    Returns:
+        lagged_expr: The (n_cells, n_ligands) lagged ligand expression, in the column order of `ligands_expr`
+    """
+    secreted_types = lr_db["type"].str.contains("Secreted Signaling|ECM-Receptor", na=False)
+    is_secreted = ligands_expr.columns.isin(set(lr_db.loc[secreted_types, "from"]))
+    expr_sparse = scipy.sparse.csc_matrix(ligands_expr.values, dtype=float)
+
+    lagged_expr = np.zeros(ligands_expr.shape)
+    if is_secreted.any():
+        lagged_expr[:, is_secreted] = (spatial_weights_secreted @ expr_sparse[:, is_secreted]).toarray()
+    if (~is_secreted).any():
+        lagged_expr[:, ~is_secreted] = (spatial_weights_membrane_bound @ expr_sparse[:, ~is_secreted]).toarray()
+    return lagged_expr
+
+
 def sparse_element_by_element(
     a: Union[np.ndarray, scipy.sparse.csr_matrix, scipy.sparse.csc_matrix],
     b: Union[np.ndarray, scipy.sparse.csr_matrix, scipy.sparse.csc_matrix],
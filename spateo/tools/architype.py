@@ -11,36 +11,118 @@ from typing import List, Optional, Tuple, Union
 import anndata
 import numpy as np
 import pandas as pd
+import scipy.sparse
 from scipy.cluster import hierarchy
-from scipy.stats import pearsonr
+from scipy.stats import t as t_dist
+from sklearn.cluster import AgglomerativeClustering
+from sklearn.decomposition import TruncatedSVD
+from sklearn.neighbors import kneighbors_graph
 from tqdm import tqdm
 
 from ..configuration import SKM
 from ..logging import logger_manager as lm
 
 
+def pearson_correlations(exp_mat: Union[np.ndarray, scipy.sparse.spmatrix], profiles: np.ndarray) -> np.ndarray:
+    """Pearson correlations of every row of the expression matrix with every profile, computed as one matrix product
+    of the expression matrix with the centered and scaled profiles.
+
+    Args:
+        exp_mat: expression matrix, dense or sparse. Rows are genes and columns are buckets.
+        profiles: array of profiles (e.g. archetypes). Rows are profiles and columns are buckets.
+
+    Returns:
+        Array of shape (n_genes, n_profiles) with the Pearson correlation of every gene with every profile. Genes or
+        profiles with zero variance get NaN correlations.
+    """
+    n = exp_mat.shape[1]
+    profiles = np.atleast_2d(np.asarray(profiles, dtype=np.float64))
+    profiles_centered = profiles - profiles.mean(axis=1, keepdims=True)
+    profiles_norm = np.linalg.norm(profiles_centered, axis=1)
+
+    if scipy.sparse.issparse(exp_mat):
+        exp_mat = scipy.sparse.csr_matrix(exp_mat, dtype=np.float64)
+        gene_means = np.asarray(exp_mat.mean(axis=1)).ravel()
+        gene_sq_sums = np.asarray(exp_mat.multiply(exp_mat).sum(axis=1)).ravel()
+        gene_norm = np.sqrt(np.maximum(gene_sq_sums - n * gene_means**2, 0))
+    else:
+        exp_mat = np.asarray(exp_mat, dtype=np.float64)
+        gene_norm = np.sqrt(n * exp_mat.var(axis=1))
+
+    # Centering one side of the product is enough for the covariance:
+    cov = np.asarray(exp_mat @ profiles_centered.T)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corrs = cov / (gene_norm[:, None] * profiles_norm[None, :])
+        corrs[(gene_norm[:, None] == 0) | (profiles_norm[None, :] == 0)] = np.nan
+    return np.clip(corrs, -1.0, 1.0)
+
+
+def pearson_pvalues(corrs: np.ndarray, n: int) -> np.ndarray:
+    """Two-sided p-values of Pearson correlations, as returned by :func:`scipy.stats.pearsonr`.
+
+    Args:
+        corrs: array of Pearson correlations
+        n: number of observations each correlation was computed from
+
+    Returns:
+        Array of p-values with the same shape as `corrs`.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_stat = np.abs(corrs) * np.sqrt((n - 2) / (1.0 - corrs**2))
+    return 2 * t_dist.sf(t_stat, n - 2)
+
+
 def find_spatial_archetypes(
     num_clusters: int,
-    exp_mat: np.ndarray,
+    exp_mat: Union[np.ndarray, scipy.sparse.spmatrix],
+    n_components: Optional[int] = None,
+    n_neighbors: Optional[int] = None,
+    random_state: int = 0,
 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """Clusters the expression data and finds gene archetypes. Current implementation is based on hierarchical
     clustering with the Ward method. The archetypes are simply the average of genes belong to the same cell cluster.
 
     Args:
         num_clusters: number of gene clusters or archetypes.
-        exp_mat: expression matrix. Rows are genes and columns are buckets.
+        exp_mat: expression matrix, dense or sparse. Rows are genes and columns are buckets.
+        n_components: optional, if given the genes are clustered on a truncated SVD of the expression matrix with this
+            many components instead of on the full matrix. The archetypes are still averages of the full expression.
+        n_neighbors: optional, if given the Ward clustering is constrained to a sparse k-nearest neighbor graph of the
+            genes, which avoids computing all pairwise distances between genes.
+        random_state: random seed of the truncated SVD.
 
     Returns:
         Returns the archetypes, the gene sets (clusters) and the Pearson correlations of every gene with respect to
         each archetype.
     """
-    clusters = hierarchy.fcluster(hierarchy.ward(exp_mat), num_clusters, criterion="maxclust")
-    arch_comp = lambda x: np.mean(exp_mat[np.where(clusters == x)[0], :], axis=0)
-    archetypes = np.array([arch_comp(xi) for xi in range(1, num_clusters + 1)])
-    gene_corrs = np.array([])
+    if n_components is not None:
+        lm.main_info(f"Reducing the expression matrix to {n_components} components.")
+        features = TruncatedSVD(n_components=n_components, random_state=random_state).fit_transform(exp_mat)
+    else:
+        features = exp_mat.toarray() if scipy.sparse.issparse(exp_mat) else exp_mat
+
+    if n_neighbors is not None:
+        lm.main_info(f"Clustering genes on a {n_neighbors}-nearest neighbor graph.")
+        connectivity = kneighbors_graph(features, n_neighbors=n_neighbors, include_self=False)
+        clusters = (
+            AgglomerativeClustering(n_clusters=num_clusters, linkage="ward", connectivity=connectivity).fit_predict(
+                features
+            )
+            + 1
+        )
+    else:
+        clusters = hierarchy.fcluster(hierarchy.ward(features), num_clusters, criterion="maxclust")
+
+    # Archetypes are the average expression of the genes of each cluster:
+    indicator = scipy.sparse.csr_matrix(
+        (np.ones(len(clusters)), (clusters - 1, np.arange(len(clusters)))), shape=(num_clusters, len(clusters))
+    )
+    cluster_sums = indicator @ exp_mat
+    cluster_sums = cluster_sums.toarray() if scipy.sparse.issparse(cluster_sums) else cluster_sums
+    with np.errstate(divide="ignore", invalid="ignore"):
+        archetypes = cluster_sums / np.asarray(indicator.sum(axis=1))
 
-    for gene in lm.main_tqdm(range(len(exp_mat)), "Finding gene archetypes"):
-        gene_corrs = np.append(gene_corrs, pearsonr(exp_mat[gene, :], archetypes[clusters[gene] - 1, :])[0])
+    gene_corrs = pearson_correlations(exp_mat, archetypes)[np.arange(len(clusters)), clusters - 1]
 
     lm.main_info("done!")
 
@@ -68,12 +150,8 @@ def get_genes_from_spatial_archetype(
     """
 
     # Classify all genes and return the most significant ones
-    all_corrs = np.array([])
-    all_corrs_p = np.array([])
-
-    for g in range(len(exp_mat)):
-        all_corrs = np.append(all_corrs, pearsonr(exp_mat[g, :], archetypes[archetype, :])[0])
-        all_corrs_p = np.append(all_corrs_p, pearsonr(exp_mat[g, :], archetypes[archetype, :])[1])
+    all_corrs = pearson_correlations(exp_mat, archetypes[archetype, :])[:, 0]
+    all_corrs_p = pearson_pvalues(all_corrs, exp_mat.shape[1])
 
     indices = np.where(all_corrs_p[all_corrs > 0] <= pval_threshold)[0]
 
@@ -106,10 +184,7 @@ def find_spatially_related_genes(
         a list of genes which are the best representatives of the archetype
     """
     # First find the archetype of the gene
-    arch_corrs = np.array([])
-
-    for archetype in range(len(archetypes)):
-        arch_corrs = np.append(arch_corrs, pearsonr(exp_mat[gene, :], archetypes[archetype, :])[0])
+    arch_corrs = pearson_correlations(exp_mat[gene : gene + 1, :], archetypes)[0]
 
     if np.max(arch_corrs) < 0.7:
         lm.main_warning("No significant correlation between the gene and the spatial archetypes was found.")
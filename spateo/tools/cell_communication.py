@@ -5,7 +5,7 @@ import pandas as pd
 from anndata import AnnData
 from scipy import sparse
 from scipy.sparse import issparse
-from scipy.stats import gmean, pearsonr
+from scipy.stats import pearsonr
 
 try:
     from typing import Literal
@@ -95,8 +95,6 @@ def niches(
     else:
         adata.X = adata.layers[layer]
 
-    x_sparse = issparse(adata.X)
-
     # expressed lr_network
     ligand = lr_network["from"].unique()
     expressed_ligand = list(set(ligand) & set(adata.var_names))
@@ -108,7 +106,8 @@ def niches(
     if len(expressed_receptor) == 0:
         raise ValueError(f"No intersected receptor between your adata object" f" and lr_network dataset.")
     lr_network = lr_network[lr_network["to"].isin(expressed_receptor)]
-    ligand_matrix = adata[:, lr_network["from"]].X.A.T if x_sparse else adata[:, lr_network["from"]].X.T
+    ligand_matrix = sparse.csr_matrix(adata[:, lr_network["from"]].X, dtype=float)
+    receptor_matrix = sparse.csr_matrix(adata[:, lr_network["to"]].X, dtype=float)
 
     # spatial neighbors
     if spatial_neighbors not in adata.uns.keys():
@@ -125,178 +124,39 @@ def niches(
     nw = {"neighbors": adata.uns["spatial_neighbors"]["indices"], "weights": adata.obsp["spatial_distances"]}
     k = adata.uns["spatial_neighbors"]["params"]["n_neighbors"]
 
+    # Every (cell, neighbor) edge, with the edge weights given by the inverse spatial distances if applicable:
+    neighbors = np.asarray(nw["neighbors"])[:, :k]
+    rows = np.repeat(np.arange(adata.n_obs), neighbors.shape[1])
+    cols = neighbors.ravel()
+    weight = _niche_edge_weights(nw["weights"], rows, cols) if weighted else np.ones(len(rows))
+
     # construct c2c matrix
     if system == "niches_c2c":
-        X = np.zeros(shape=(ligand_matrix.shape[0], k * adata.n_obs))
-        if weighted:
-            # weighted matrix (weighted distance)
-            row, col = np.diag_indices_from(nw["weights"])
-            nw["weights"][row, col] = 1
-            weight = np.zeros(shape=(adata.n_obs, k))
-            for i, row in enumerate(nw["weights"].A):
-                weight[i, :] = 1 / row[nw["neighbors"][i]]
-            for i in range(ligand_matrix.shape[1]):
-                receptor_matrix = adata[nw["neighbors"][i], lr_network["to"]].X.A.T * weight[i, :]
-                X[:, i * k : (i + 1) * k] = receptor_matrix * ligand_matrix[:, i].reshape(-1, 1)
-        else:
-            for i in range(ligand_matrix.shape[1]):
-                receptor_matrix = adata[nw["neighbors"][i], lr_network["to"]].X.A.T
-                X[:, i * k : (i + 1) * k] = receptor_matrix * ligand_matrix[:, i].reshape(-1, 1)
+        # Product of the ligand expression of each cell and the receptor expression of each of its neighbors:
+        X = ligand_matrix[rows].multiply(receptor_matrix[cols]).multiply(weight[:, None])
         # bucket-bucket pair
-        cell_pair = []
-        for i, cell_id in enumerate(nw["neighbors"]):
-            cell_pair.append(adata.obs.index[i] + "-" + adata.obs.index[cell_id])
-        cell_pair = [i for j in cell_pair for i in j]
+        cell_pair = adata.obs.index.values[rows] + "-" + adata.obs.index.values[cols]
         cell_pair = pd.DataFrame({"cell_pair_name": cell_pair})
         cell_pair.set_index("cell_pair_name", inplace=True)
 
     # construct n2c matrix or construct c2n matrix
     if system == "niches_n2c" or system == "niches_c2n":
-        X = np.zeros(shape=(ligand_matrix.shape[0], adata.n_obs))
-        if weighted:
-            # weighted matrix (weighted distance)
-            row, col = np.diag_indices_from(nw["weights"])
-            nw["weights"][row, col] = 1
-            weight = np.zeros(shape=(adata.n_obs, k))
-            for i, row in enumerate(nw["weights"].A):
-                weight[i, :] = 1 / row[nw["neighbors"][i]]
-            for i in range(ligand_matrix.shape[1]):
-                if method == "gmean":
-                    receptor_matrix = (
-                        gmean((adata[nw["neighbors"][i], lr_network["to"]].X.A.T + 1) * weight[i, :], axis=1)
-                        if x_sparse
-                        else gmean((adata[nw["neighbors"][i], lr_network["to"]].X.T + 1) * weight[i, :], axis=1)
-                    )
-                elif method == "mean":
-                    receptor_matrix = (
-                        np.mean(adata[nw["neighbors"][i], lr_network["to"]].X.A.T * weight[i, :], axis=1)
-                        if x_sparse
-                        else np.mean(adata[nw["neighbors"][i], lr_network["to"]].X.T * weight[i, :], axis=1)
-                    )
-                else:
-                    receptor_matrix = (
-                        np.sum(adata[nw["neighbors"][i], lr_network["to"]].X.A.T * weight[i, :], axis=1)
-                        if x_sparse
-                        else np.sum(adata[nw["neighbors"][i], lr_network["to"]].X.T * weight[i, :], axis=1)
-                    )
-                X[:, i] = receptor_matrix * ligand_matrix[:, i]
-        else:
-            for i in range(ligand_matrix.shape[1]):
-                if method == "gmean":
-                    receptor_matrix = (
-                        gmean((adata[nw["neighbors"][i], lr_network["to"]].X.A.T + 1), axis=1)
-                        if x_sparse
-                        else gmean((adata[nw["neighbors"][i], lr_network["to"]].X.T + 1), axis=1)
-                    )
-                elif method == "mean":
-                    receptor_matrix = (
-                        np.mean(adata[nw["neighbors"][i], lr_network["to"]].X.A.T, axis=1)
-                        if x_sparse
-                        else np.mean(adata[nw["neighbors"][i], lr_network["to"]].X.T, axis=1)
-                    )
-                else:
-                    receptor_matrix = (
-                        np.sum(adata[nw["neighbors"][i], lr_network["to"]].X.A.T, axis=1)
-                        if x_sparse
-                        else np.sum(adata[nw["neighbors"][i], lr_network["to"]].X.T, axis=1)
-                    )
-                X[:, i] = receptor_matrix * ligand_matrix[:, i]
-        # bucket-bucket pair
-        cell_pair = []
-        for i, cell_id in enumerate(nw["neighbors"]):
-            cell_pair.append(adata.obs.index[i] + "-" + adata.obs.index[cell_id])
-        cell_pair = pd.DataFrame({"cell_pair_name": cell_pair})
+        # Aggregated receptor expression over the neighborhood of each cell times the ligand expression of the cell:
+        X = ligand_matrix.multiply(
+            _aggregate_niche_expression(receptor_matrix, rows, cols, weight, adata.n_obs, k, method)
+        )
 
     # construct n2n matrix
     if system == "niches_n2n":
-        X = np.zeros(shape=(ligand_matrix.shape[0], adata.n_obs))
-        if weighted:
-            # weighted matrix (weighted distance)
-            row, col = np.diag_indices_from(nw["weights"])
-            nw["weights"][row, col] = 1
-            weight = np.zeros(shape=(adata.n_obs, k))
-            for i, row in enumerate(nw["weights"].A):
-                weight[i, :] = 1 / row[nw["neighbors"][i]]
-            for i in range(ligand_matrix.shape[1]):
-                if method == "gmean":
-                    receptor_matrix = (
-                        gmean((adata[nw["neighbors"][i], lr_network["to"]].X.A.T + 1) * weight[i, :], axis=1)
-                        if x_sparse
-                        else gmean((adata[nw["neighbors"][i], lr_network["to"]].X.T + 1) * weight[i, :], axis=1)
-                    )
-                    ligand_matrix = (
-                        gmean((adata[nw["neighbors"][i], lr_network["from"]].X.A.T + 1) * weight[i, :], axis=1)
-                        if x_sparse
-                        else gmean((adata[nw["neighbors"][i], lr_network["from"]].X.T + 1) * weight[i, :], axis=1)
-                    )
-                elif method == "mean":
-                    receptor_matrix = (
-                        np.mean(adata[nw["neighbors"][i], lr_network["to"]].X.A.T * weight[i, :], axis=1)
-                        if x_sparse
-                        else np.mean(adata[nw["neighbors"][i], lr_network["to"]].X.T * weight[i, :], axis=1)
-                    )
-                    ligand_matrix = (
-                        np.mean(adata[nw["neighbors"][i], lr_network["from"]].X.A.T * weight[i, :], axis=1)
-                        if x_sparse
-                        else np.mean(adata[nw["neighbors"][i], lr_network["from"]].X.T * weight[i, :], axis=1)
-                    )
-                else:
-                    receptor_matrix = (
-                        np.sum(adata[nw["neighbors"][i], lr_network["to"]].X.A.T * weight[i, :], axis=1)
-                        if x_sparse
-                        else np.sum(adata[nw["neighbors"][i], lr_network["to"]].X.T * weight[i, :], axis=1)
-                    )
-                    ligand_matrix = (
-                        np.sum(adata[nw["neighbors"][i], lr_network["from"]].X.A.T * weight[i, :], axis=1)
-                        if x_sparse
-                        else np.sum(adata[nw["neighbors"][i], lr_network["from"]].X.T * weight[i, :], axis=1)
-                    )
-                X[:, i] = np.array(receptor_matrix).reshape(receptor_matrix.shape[0]) * np.array(ligand_matrix).reshape(
-                    ligand_matrix.shape[0]
-                )
-        else:
-            for i in range(ligand_matrix.shape[1]):
-                if method == "gmean":
-                    receptor_matrix = (
-                        gmean((adata[nw["neighbors"][i], lr_network["to"]].X.A.T + 1), axis=1)
-                        if x_sparse
-                        else gmean((adata[nw["neighbors"][i], lr_network["to"]].X.T + 1), axis=1)
-                    )
-                    ligand_matrix = (
-                        gmean((adata[nw["neighbors"][i], lr_network["from"]].X.A.T + 1), axis=1)
-                        if x_sparse
-                        else gmean((adata[nw["neighbors"][i], lr_network["from"]].X.T + 1), axis=1)
-                    )
-                elif method == "mean":
-                    receptor_matrix = (
-                        np.mean(adata[nw["neighbors"][i], lr_network["to"]].X.A.T, axis=1)
-                        if x_sparse
-                        else np.mean(adata[nw["neighbors"][i], lr_network["to"]].X.T, axis=1)
-                    )
-                    ligand_matrix = (
-                        np.mean(adata[nw["neighbors"][i], lr_network["from"]].X.A.T, axis=1)
-                        if x_sparse
-                        else np.mean(adata[nw["neighbors"][i], lr_network["from"]].X.T, axis=1)
-                    )
-                else:
-                    receptor_matrix = (
-                        np.sum(adata[nw["neighbors"][i], lr_network["to"]].X.A.T, axis=1)
-                        if x_sparse
-                        else np.sum(adata[nw["neighbors"][i], lr_network["to"]].X.T, axis=1)
-                    )
-                    ligand_matrix = (
-                        np.sum(adata[nw["neighbors"][i], lr_network["from"]].X.A.T, axis=1)
-                        if x_sparse
-                        else np.sum(adata[nw["neighbors"][i], lr_network["from"]].X.T, axis=1)
-                    )
-                X[:, i] = np.array(receptor_matrix).reshape(receptor_matrix.shape[0]) * np.array(ligand_matrix).reshape(
-                    ligand_matrix.shape[0]
-                )
+        X = _aggregate_niche_expression(ligand_matrix, rows, cols, weight, adata.n_obs, k, method)
+        X = sparse.csr_matrix(X).multiply(
+            _aggregate_niche_expression(receptor_matrix, rows, cols, weight, adata.n_obs, k, method)
+        )
+
+    if system != "niches_c2c":
         # bucket-bucket pair
-        cell_pair = []
-        for i, cell_id in enumerate(nw["neighbors"]):
-            cell_pair.append(adata.obs.index[i] + "-" + adata.obs.index[cell_id])
-        cell_pair = pd.DataFrame({"cell_pair_name": cell_pair})
+        cell_pair = adata.obs.index.values[rows] + "-" + adata.obs.index.values[cols]
+        cell_pair = pd.DataFrame({"cell_pair_name": list(cell_pair.reshape(adata.n_obs, -1))})
 
     # lr_pair
     lr_pair = lr_network["from"] + "-" + lr_network["to"]
@@ -304,13 +164,69 @@ def niches(
     lr_pair.set_index("lr_pair_name", inplace=True)
 
     # csr_matrix
-    X = sparse.csr_matrix(X.T)
+    X = sparse.csr_matrix(X)
 
     # adata_nichec2c
     adata_niche = AnnData(X=X, obs=cell_pair, var=lr_pair)
     return adata_niche
 
 
+def _niche_edge_weights(distances: sparse.spmatrix, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """Inverse spatial distance of each (cell, neighbor) edge, where the distance of each cell to itself is taken to
+    be 1.
+
+    Args:
+        distances: Pairwise spatial distances between cells, dense or sparse.
+        rows: Index of the cell of each edge.
+        cols: Index of the neighbor of each edge.
+
+    Returns:
+        The weight of each edge.
+    """
+    edge_distances = np.asarray(distances[rows, cols], dtype=float).ravel()
+    edge_distances[rows == cols] = 1
+    return 1 / edge_distances
+
+
+def _aggregate_niche_expression(
+    expression: sparse.csr_matrix,
+    rows: np.ndarray,
+    cols: np.ndarray,
+    weight: np.ndarray,
+    n_obs: int,
+    k: int,
+    method: Literal["gmean", "mean", "sum"] = "sum",
+) -> sparse.spmatrix:
+    """Aggregate the weighted expression of the neighbors of each cell with a single sparse product over all
+    (cell, neighbor) edges.
+
+    Args:
+        expression: Expression of each cell (cells x features).
+        rows: Index of the cell of each edge.
+        cols: Index of the neighbor of each edge.
+        weight: Weight of each edge.
+        n_obs: Number of cells.
+        k: Number of neighbors of each cell.
+        method: How to aggregate the weighted neighbor expression. For "gmean", the geometric mean of the weighted
+            pseudo-counted expression (expression + 1) is taken.
+
+    Returns:
+        The aggregated expression of each cell (cells x features). Dense for "gmean", sparse otherwise.
+    """
+    if method == "gmean":
+        adjacency = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_obs, n_obs))
+        log_expression = expression.copy()
+        log_expression.data = np.log1p(log_expression.data)
+        log_weight = np.bincount(rows, weights=np.log(weight), minlength=n_obs)
+        return np.exp(((adjacency @ log_expression).toarray() + log_weight[:, None]) / k)
+
+    adjacency = sparse.csr_matrix((weight, (rows, cols)), shape=(n_obs, n_obs))
+    aggregated = adjacency @ expression
+    if method == "mean":
+        aggregated = aggregated / k
+    return sparse.csr_matrix(aggregated)
+
+
 # NicheNet
 @SKM.check_adata_is_type(SKM.ADATA_UMI_TYPE)
 def predict_ligand_activities(
@@ -237,13 +237,11 @@ def compute_variance_decomposition(
             genes = [genes]
         adata_copy = adata_copy[:, genes]
 
-    # Dataframe containing gene expression, cell type labels and spatial domain labels:
-    data = adata_copy.X.toarray() if scipy.sparse.issparse(adata_copy.X) else adata_copy.X
-    df = pd.DataFrame(data, columns=adata_copy.var_names)
-    df["Spatial Domain"] = pd.Series(list(adata.obs[spatial_label_id]), dtype="category")
-    df["Cell Type"] = pd.Series(list(adata.obs[celltype_label_id]), dtype="category")
-    domains = np.unique(df["Spatial Domain"])
-    var_decomposition_list = []
+    X = adata_copy.X
+    X = scipy.sparse.csr_matrix(X, dtype=np.float64) if scipy.sparse.issparse(X) else np.asarray(X, dtype=np.float64)
+    domains, domain_codes = np.unique(np.asarray(adata.obs[spatial_label_id]).astype(str), return_inverse=True)
+    _, celltype_codes = np.unique(np.asarray(adata.obs[celltype_label_id]).astype(str), return_inverse=True)
+    n_celltypes = celltype_codes.max() + 1
 
     # For reference, within each spatial domain:
     # intra-cell type variance: for all cells of a given celltype, how much does each gene vary from the mean within
@@ -252,39 +250,37 @@ def compute_variance_decomposition(
     # to the overall mean of the spatial domain for that gene?
     # gene variance: for each spatial domain, how much does the mean expression of each gene vary compared to the
     # overall mean of all genes?
-    with tqdm(total=len(domains)) as pbar:
-        for domain in domains:
-            # For each gene, compute mean within the domain:
-            mean_domain_genes = np.mean(df[df["Spatial Domain"] == domain][::-2], axis=0)
-            # Compute average for all genes:
-            mean_domain_global = np.mean(mean_domain_genes)
-
-            intra_ct_var = []
-            inter_ct_var = []
-            gene_var = []
-            for celltype in np.unique(df["Cell Type"]):
-                # Gene expression (take all but last two columns) for each cell type within each spatial domain
-                domain_celltype = np.array(df[(df["Spatial Domain"] == domain) & (df["Cell Type"] == celltype)])[:, :-2]
-                if domain_celltype.shape[0] == 0:
-                    continue
-                # For each cell type, compute the mean expression for each gene
-                mean_domain_celltype = np.mean(domain_celltype, axis=0)
-
-                # Compute variances for each cell:
-                for i in range(domain_celltype.shape[0]):
-                    # Within the cell type, variance for each gene from the mean of the cell type
-                    intra_ct_var.append((domain_celltype[i, :] - mean_domain_celltype) ** 2)
-                    # For each cell type, the difference in mean expression within the cell type as compared to the
-                    # mean of the domain
-                    inter_ct_var.append((mean_domain_celltype - mean_domain_genes) ** 2)
-                    # Within each domain, variance for the domain from the mean of the domain
-                    gene_var.append((mean_domain_genes - mean_domain_global) ** 2)
-
-            intra_ct_var = np.sum(intra_ct_var)
-            inter_ct_var = np.sum(inter_ct_var)
-            gene_var = np.sum(gene_var)
-            var_decomposition_list.append(np.array([domain, intra_ct_var, inter_ct_var, gene_var]))
-            pbar.update(1)
+    # All three follow from the number of cells, the sums and the sums of squares of each (domain, cell type) group:
+    group_codes = domain_codes * n_celltypes + celltype_codes
+    group_ids, group_codes = np.unique(group_codes, return_inverse=True)
+    group_domains = group_ids // n_celltypes
+    group_counts, group_sums, group_sq_sums = _grouped_sums(X, group_codes, len(group_ids))
+
+    group_means = group_sums / group_counts[:, None]
+    domain_counts = np.bincount(group_domains, weights=group_counts, minlength=len(domains))
+    domain_sums = np.zeros((len(domains), X.shape[1]))
+    np.add.at(domain_sums, group_domains, group_sums)
+    domain_means = domain_sums / domain_counts[:, None]
+    domain_global_means = domain_means.mean(axis=1, keepdims=True)
+
+    # Within each cell type, squared deviation of each cell from the mean of the cell type:
+    intra_ct_var = np.bincount(
+        group_domains,
+        weights=(group_sq_sums - group_counts[:, None] * group_means**2).sum(axis=1),
+        minlength=len(domains),
+    )
+    # For each cell of each cell type, squared deviation of the mean of the cell type from the mean of the domain:
+    inter_ct_var = np.bincount(
+        group_domains,
+        weights=group_counts * ((group_means - domain_means[group_domains]) ** 2).sum(axis=1),
+        minlength=len(domains),
+    )
+    # For each cell of each domain, squared deviation of the mean of the domain from the global mean of the domain:
+    gene_var = domain_counts * ((domain_means - domain_global_means) ** 2).sum(axis=1)
+    var_decomposition_list = [
+        np.array([domain, intra, inter, gene])
+        for domain, intra, inter, gene in zip(domains, intra_ct_var, inter_ct_var, gene_var)
+    ]
 
     df = (
         pd.DataFrame(var_decomposition_list, columns=["Domain", "intra_celltype_var", "inter_celltype_var", "gene_var"])
@@ -306,7 +302,7 @@ def compute_variance_decomposition(
     df["Gene variance"] = df.gene_var / df["Total variance"]
 
     # Optionally plot with default plotting parameters if appropriate option is given to 'save_show_or_return':
-    if len(genes) == 1:
+    if genes is not None and len(genes) == 1:
         title = f"Variance Decomposition for Spatial Domains: {genes}"
     else:
         title = None
@@ -317,6 +313,35 @@ def compute_variance_decomposition(
     return df
 
 
+def _grouped_sums(
+    X: Union[np.ndarray, scipy.sparse.csr_matrix], group_codes: np.ndarray, n_groups: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Computes the number of cells, the per-gene sums and the per-gene sums of squares of each group of cells using a
+    sparse group-indicator matrix, so that memory scales with the number of groups rather than the number of cells.
+
+    Args:
+        X: Gene expression array or sparse matrix (shape n x m)
+        group_codes: Integer group index of each cell, in [0, n_groups)
+        n_groups: Number of groups
+
+    Returns:
+        group_counts: Number of cells in each group (shape n_groups)
+        group_sums: Sum of the expression of each gene in each group (shape n_groups x m)
+        group_sq_sums: Sum of the squared expression of each gene in each group (shape n_groups x m)
+    """
+    indicator = scipy.sparse.csr_matrix(
+        (np.ones(len(group_codes)), (group_codes, np.arange(len(group_codes)))), shape=(n_groups, len(group_codes))
+    )
+    group_counts = np.bincount(group_codes, minlength=n_groups).astype(np.float64)
+    if scipy.sparse.issparse(X):
+        group_sums = (indicator @ X).toarray()
+        group_sq_sums = (indicator @ X.multiply(X)).toarray()
+    else:
+        group_sums = indicator @ X
+        group_sq_sums = indicator @ (X * X)
+    return group_counts, np.asarray(group_sums), np.asarray(group_sq_sums)
+
+
 def genewise_variance_decomposition(
     adata: AnnData,
     celltype_label_id: str,
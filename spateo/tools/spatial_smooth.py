@@ -6,6 +6,7 @@ from typing import Optional, Tuple, Union
 import numpy as np
 import psutil
 import scipy
+from numba import njit, prange
 
 from ..logging import logger_manager as lm
 
@@ -19,12 +20,14 @@ def smooth(
     ct: Optional[np.ndarray] = None,
     gene_expr_subset: Optional[Union[np.ndarray, scipy.sparse.csr_matrix]] = None,
     min_jaccard: Optional[float] = 0.05,
+    jaccard_top_k: Optional[int] = None,
     manual_mask: Optional[np.ndarray] = None,
     normalize_W: bool = True,
     return_discrete: bool = False,
     smoothing_threshold: Optional[float] = None,
     n_subsample: Optional[int] = None,
     return_W: bool = False,
+    vectorized: bool = False,
 ) -> Tuple[scipy.sparse.csr_matrix, Optional[Union[np.ndarray, scipy.sparse.csr_matrix]], Optional[np.ndarray]]:
     """Leverages neighborhood information to smooth gene expression.
 
@@ -40,6 +43,10 @@ def smooth(
             the median score).
         min_jaccard: Optional, and only used if 'gene_expr_subset' is also given. Minimum Jaccard similarity score to
             be considered "nonzero".
+        jaccard_top_k: Optional, and only used if 'gene_expr_subset' is also given and 'W' is sparse. If given,
+            keeps only the 'jaccard_top_k' most similar neighbors of each cell before thresholding. Note that for
+            sparse 'W', Jaccard similarities are only computed between neighboring cells, so the median threshold is
+            taken over neighboring pairs rather than over all pairs of cells.
         manual_mask: Optional, binary array of shape n x n. For each cell (row), manually indicate which neighbors (
             if any) to use for smoothing.
         normalize_W: Set True to scale the rows of the weights matrix to sum to 1. Use this to smooth by taking an
@@ -53,6 +60,11 @@ def smooth(
         n_subsample: Optional, sets the number of random neighbor samples to use in the smoothing. If not given,
             will use all neighbors (nonzero weights) for each cell.
         return_W: Set True to return the weights matrix post-processing
+        vectorized: Only used if 'normalize_W' is False. Set True to smooth all genes at once with sparse matrix
+            products instead of sampling one expressing neighbor per cell and gene in a process pool. Each eligible
+            entry is then set to the weighted average over the neighbors that express the gene, i.e. the expected
+            value of the sampled value. Memory scales with the number of nonzero entries rather than with the number
+            of cells squared.
 
     Returns:
         x_new: Smoothed gene expression array or sparse matrix
@@ -103,14 +115,8 @@ def smooth(
             logger.info(
                 "Conditioning smoothing on cell type- only information from cells of the same type will be used."
             )
-            rows, cols = np.where(ct[:, None] == ct)
-            sparse_ct_matrix = scipy.sparse.coo_matrix((np.ones_like(rows), (rows, cols)), shape=(len(ct), len(ct)))
-            ct_masks = sparse_ct_matrix.tocsr()
             logger.info("Modifying spatial weights considering cell type...")
-            W = W.multiply(ct_masks)
-
-            # ct_masks can be quite large- delete to free up memory once it's no longer necessary
-            del ct_masks
+            W = restrict_weights_to_same_type(W, ct)
 
         # Incorporate gene expression information
         if gene_expr_subset is not None:
@@ -118,7 +124,13 @@ def smooth(
                 "Conditioning smoothing on gene expression- only information from cells with similar gene "
                 "expression patterns will be used."
             )
-            jaccard_mat = compute_jaccard_similarity_matrix(gene_expr_subset, min_jaccard=min_jaccard)
+            if scipy.sparse.issparse(W):
+                # Similarities are only needed where there are nonzero weights:
+                jaccard_mat = compute_sparse_jaccard_similarity_matrix(
+                    gene_expr_subset, W, min_jaccard=min_jaccard, top_k=jaccard_top_k, shared_neighbors=False
+                )
+            else:
+                jaccard_mat = compute_jaccard_similarity_matrix(gene_expr_subset, min_jaccard=min_jaccard)
             logger.info("Computing median Jaccard score from nonzero entries only")
             if scipy.sparse.isspmatrix_csr(jaccard_mat):
                 jaccard_threshold = sparse_matrix_median(jaccard_mat, nonzero_only=True)
@@ -175,6 +187,17 @@ def smooth(
             return x_new, W, d
         else:
             return x_new, d
+    elif vectorized:
+        x_new = smooth_nonzero_mean(X, W, threshold=threshold)
+        logger.info(f"Sparsity of smoothed array: {x_new.count_nonzero()}")
+
+        if return_discrete:
+            x_new.data = np.round(x_new.data)
+
+        if return_W:
+            return x_new, W
+        else:
+            return x_new
     else:
         processor_func = functools.partial(smooth_process_column, X=X, W=W, threshold=threshold)
         pool = Pool(cpu_count())
@@ -207,6 +230,71 @@ def smooth(
             return x_new
 
 
+def restrict_weights_to_same_type(
+    W: Union[np.ndarray, scipy.sparse.csr_matrix], ct: np.ndarray
+) -> Union[np.ndarray, scipy.sparse.csr_matrix]:
+    """Keep only the spatial weights between cells of the same type. For sparse weights, this filters the edges of the
+    neighbor graph directly, so that no n x n cell type mask is built.
+
+    Args:
+        W: Dense or sparse array pairwise spatial weights matrix
+        ct: Cell type label for each cell (shape n)
+
+    Returns:
+        W: Weights matrix with the weights between cells of different types removed
+    """
+    _, ct_codes = np.unique(ct, return_inverse=True)
+    if scipy.sparse.issparse(W):
+        W = scipy.sparse.csr_matrix(W, copy=True)
+        rows = np.repeat(np.arange(W.shape[0]), np.diff(W.indptr))
+        W.data[ct_codes[rows] != ct_codes[W.indices]] = 0
+        W.eliminate_zeros()
+        return W
+    else:
+        return W * (ct_codes[:, None] == ct_codes[None, :])
+
+
+def smooth_nonzero_mean(
+    X: Union[np.ndarray, scipy.sparse.csr_matrix],
+    W: Union[np.ndarray, scipy.sparse.csr_matrix],
+    threshold: float = 0,
+) -> scipy.sparse.csr_matrix:
+    """Smooth all features at once by filling each zero entry with the weighted average of the nonzero values of its
+    neighbors, if more than 'threshold' neighbors are nonzero for that feature. Nonzero entries are kept as they are.
+    This is the expected value of the probabilistic smoothing performed by :func:`smooth_process_column`, computed
+    from sparse matrix products over all features.
+
+    Args:
+        X: Dense or sparse array input data matrix
+        W: Dense or sparse array pairwise spatial weights matrix
+        threshold: Threshold value for the number of feature-expressing neighbors for a given row to be included in
+            the smoothing.
+
+    Returns:
+        x_new: Smoothed sparse array
+    """
+    X = scipy.sparse.csr_matrix(X)
+    X.eliminate_zeros()
+    W = scipy.sparse.csr_matrix(W)
+    X_bool = X.copy()
+    X_bool.data = np.ones_like(X_bool.data)
+    W_bool = W.copy()
+    W_bool.data = np.ones_like(W_bool.data)
+
+    # Weighted sum of neighboring values, sum of weights and number of neighbors over nonzero entries only:
+    numerator = (W @ X).tocsr()
+    denominator = (W @ X_bool).tocsr()
+    n_expressing = (W_bool @ X_bool).tocsr()
+
+    denominator.data = 1 / denominator.data
+    x_smooth = numerator.multiply(denominator).multiply(n_expressing > threshold).tocsr()
+    # Entries that are nonzero in the original array do not need to be smoothed:
+    x_smooth = x_smooth - x_smooth.multiply(X_bool)
+    x_new = (x_smooth + X).tocsr()
+    x_new.eliminate_zeros()
+    return x_new
+
+
 def compute_jaccard_similarity_matrix(
     data: Union[np.ndarray, scipy.sparse.csr_matrix], chunk_size: int = 1000, min_jaccard: float = 0.1
 ) -> np.ndarray:
@@ -271,6 +359,96 @@ def compute_jaccard_similarity_matrix(
     return jaccard_matrix
 
 
+def compute_sparse_jaccard_similarity_matrix(
+    data: Union[np.ndarray, scipy.sparse.csr_matrix],
+    graph: Union[np.ndarray, scipy.sparse.csr_matrix],
+    min_jaccard: float = 0.1,
+    top_k: Optional[int] = None,
+    shared_neighbors: bool = True,
+) -> scipy.sparse.csr_matrix:
+    """Compute a sparse Jaccard similarity matrix for input data with rows corresponding to samples and columns
+    corresponding to features, evaluating only pairs of samples that are connected in a neighbor graph. The
+    intersections are computed pair by pair from the sparse feature indices of the two samples, so memory scales with
+    the number of evaluated pairs rather than with the number of samples squared.
+
+    Args:
+        data: A dense numpy array or a sparse matrix in CSR format, with rows as samples
+        graph: Dense or sparse array neighbor graph (e.g. kNN graph or spatial weights matrix) of shape n x n. Only its
+            sparsity pattern is used.
+        min_jaccard: Minimum Jaccard similarity to be considered "nonzero"
+        top_k: Optional, if given keeps only the 'top_k' highest similarities in each row. Ties are broken in favor of
+            the lower column index.
+        shared_neighbors: If True, similarities are computed for all pairs of samples that are neighbors or share
+            at least one neighbor in the graph. If False, only for pairs of samples that are neighbors.
+
+    Returns:
+        jaccard_matrix: A sparse square matrix of Jaccard similarity coefficients
+    """
+    n_samples = data.shape[0]
+    data_bool = scipy.sparse.csr_matrix(scipy.sparse.csr_matrix(data) > 0)
+    data_bool.sort_indices()
+    row_sums = np.diff(data_bool.indptr)
+
+    graph_bool = scipy.sparse.csr_matrix(graph) != 0
+    if shared_neighbors:
+        graph_bool = graph_bool + graph_bool @ graph_bool.T
+    graph_bool = scipy.sparse.csr_matrix(graph_bool)
+    graph_bool.sort_indices()
+    cols = graph_bool.indices
+    rows = np.repeat(np.arange(n_samples), np.diff(graph_bool.indptr))
+    lm.main_info(f"Computing Jaccard similarity for {len(rows)} pairs of samples...")
+
+    intersection = _csr_pair_intersections(data_bool.indptr, data_bool.indices, rows, cols)
+    union = row_sums[rows] + row_sums[cols] - intersection
+    similarity = intersection / np.maximum(union, 1)
+    similarity[similarity < min_jaccard] = 0.0
+
+    if top_k is not None:
+        # Rank the similarities within each row, highest first:
+        order = np.lexsort((-similarity, rows))
+        row_counts = np.bincount(rows, minlength=n_samples)
+        row_starts = np.concatenate(([0], np.cumsum(row_counts)[:-1]))
+        ranks = np.arange(len(order)) - row_starts[rows[order]]
+        similarity[order[ranks >= top_k]] = 0.0
+
+    jaccard_matrix = scipy.sparse.csr_matrix(
+        (similarity.astype(np.float32), (rows, cols)), shape=(n_samples, n_samples)
+    )
+    jaccard_matrix.eliminate_zeros()
+    return jaccard_matrix
+
+
+@njit(parallel=True, cache=True)
+def _csr_pair_intersections(indptr: np.ndarray, indices: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """Count the features shared by pairs of rows of a boolean CSR matrix with sorted indices.
+
+    Args:
+        indptr: The index pointer array of the CSR matrix
+        indices: The sorted column indices of the CSR matrix
+        rows: The first row of each pair
+        cols: The second row of each pair
+
+    Returns:
+        intersection: The number of column indices shared by the two rows of each pair
+    """
+    intersection = np.zeros(len(rows), dtype=np.int64)
+    for k in prange(len(rows)):
+        i, i_end = indptr[rows[k]], indptr[rows[k] + 1]
+        j, j_end = indptr[cols[k]], indptr[cols[k] + 1]
+        count = 0
+        while i < i_end and j < j_end:
+            if indices[i] == indices[j]:
+                count += 1
+                i += 1
+                j += 1
+            elif indices[i] < indices[j]:
+                i += 1
+            else:
+                j += 1
+        intersection[k] = count
+    return intersection
+
+
 def sparse_matrix_median(spmat: scipy.sparse.csr_matrix, nonzero_only: bool = False) -> scipy.sparse.csr_matrix:
     """Computes the median value of a sparse matrix, used here for determining a threshold value for Jaccard similarity.
 
@@ -0,0 +1,78 @@
+from unittest import TestCase
+
+import numpy as np
+from anndata import AnnData
+
+from spateo.alignment.deformation import _grid_lines, grid_deformation
+
+from ..mixins import TestMixin
+
+
+def create_identity_model(dims, n_obs=50, seed=0):
+    """Model with a vector field that maps every point to itself."""
+    rng = np.random.default_rng(seed)
+    vecfld = {
+        "normalize_scale": 1.0,
+        "normalize_mean_list": [np.zeros(dims), np.zeros(dims)],
+        "normalize_c": False,
+        "ctrl_pts": rng.uniform(0, 10, size=(5, dims)),
+        "Coff": np.zeros((5, dims)),
+        "s": 1.0,
+        "R": np.eye(dims),
+        "t": np.zeros(dims),
+        "optimal_R": np.eye(dims),
+        "optimal_t": np.zeros(dims),
+        "init_R": np.eye(dims),
+        "init_t": np.zeros(dims),
+        "beta": 0.1,
+    }
+    return AnnData(
+        X=np.zeros((n_obs, 1)), obsm={"spatial": rng.uniform(0, 10, size=(n_obs, dims))}, uns={"VecFld_morpho": vecfld}
+    )
+
+
+class TestGridDeformation(TestMixin, TestCase):
+    def test_grid_lines(self):
+        for grid_num in [[3, 4], [2, 3, 4]]:
+            with self.subTest(dims=len(grid_num)):
+                dims, line_points = len(grid_num), 5
+                min_vec, max_vec = np.zeros(dims), np.arange(1, dims + 1, dtype=float)
+                points = _grid_lines(min_vec, max_vec, np.asarray(grid_num), line_points)
+
+                # The lines parallel to an axis sit at every combination of levels along the other axes.
+                n_lines = [int(np.prod(np.delete(grid_num, axis))) for axis in range(dims)]
+                self.assertEqual(points.shape, (sum(n_lines) * line_points, dims))
+                lines = np.split(points.reshape(-1, line_points, dims), np.cumsum(n_lines)[:-1])
+                for axis, axis_lines in enumerate(lines):
+                    others = [d for d in range(dims) if d != axis]
+                    np.testing.assert_allclose(axis_lines[:, :, axis] - np.linspace(0, max_vec[axis], line_points), 0)
+                    np.testing.assert_array_equal(np.ptp(axis_lines[:, :, others], axis=1), 0)
+                    self.assertEqual(len(np.unique(axis_lines[:, 0, others], axis=0)), len(axis_lines))
+
+    def test_identity_vector_field(self):
+        for grid_num in [[3, 4], [2, 3, 4]]:
+            with self.subTest(dims=len(grid_num)):
+                dims, line_points = len(grid_num), 6
+                model = create_identity_model(dims)
+                grid, deformed_grid = grid_deformation(model, grid_num=grid_num, line_points=line_points)
+
+                n_lines = sum(int(np.prod(np.delete(grid_num, axis))) for axis in range(dims))
+                self.assertEqual(grid.n_points, n_lines * line_points)
+                self.assertEqual(grid.n_lines, n_lines * (line_points - 1))
+                # Each segment connects consecutive points of the same line.
+                segments = grid.lines.reshape(-1, 3)
+                np.testing.assert_array_equal(segments[:, 0], 2)
+                np.testing.assert_array_equal(segments[:, 2], segments[:, 1] + 1)
+                self.assertFalse(np.any(segments[:, 1] % line_points == line_points - 1))
+                np.testing.assert_array_equal(deformed_grid.lines, grid.lines)
+
+                coords = model.obsm["spatial"]
+                np.testing.assert_allclose(grid.points[:, :dims].min(axis=0), coords.min(axis=0), rtol=1e-6)
+                np.testing.assert_allclose(grid.points[:, :dims].max(axis=0), coords.max(axis=0), rtol=1e-6)
+                if dims == 2:
+                    np.testing.assert_array_equal(grid.points[:, 2], 0)
+                np.testing.assert_allclose(deformed_grid.points, grid.points, atol=1e-6)
+
+                self.assertEqual(len(grid.point_data["deformation"]), grid.n_points)
+                self.assertEqual(len(deformed_grid.point_data["deformation"]), deformed_grid.n_points)
+                np.testing.assert_array_equal(deformed_grid.point_data["deformation"], 0)
@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial.distance import cdist
+
+from spateo.alignment.methods.utils import voxel_data
+
+from ..mixins import TestMixin
+
+
+def voxel_data_loop(coords, gene_exp, voxel_size=None, voxel_num=10000):
+    """Voxelization with a loop over the voxels, as voxel_data with method="ball" did before it was vectorized."""
+    N, D = coords.shape
+    min_coords, max_coords = coords.min(axis=0), coords.max(axis=0)
+    if voxel_size is None:
+        voxel_size = np.sqrt(np.prod(max_coords - min_coords)) / (np.sqrt(N) / 5)
+    voxel_steps = (max_coords - min_coords) / int(np.sqrt(voxel_num))
+    voxel_coords = [np.arange(lo, hi, step) for lo, hi, step in zip(min_coords, max_coords, voxel_steps)]
+    voxel_coords = np.stack(np.meshgrid(*voxel_coords), axis=-1).reshape(-1, D)
+    voxel_gene_exps = np.zeros((voxel_coords.shape[0], gene_exp.shape[1]))
+    is_voxels = np.zeros(voxel_coords.shape[0], dtype=bool)
+    for i, voxel_coord in enumerate(voxel_coords):
+        mask = np.sqrt(np.sum((coords - voxel_coord) ** 2, axis=1)) < voxel_size / 2
+        if np.any(mask):
+            voxel_gene_exps[i] = np.mean(gene_exp[mask], axis=0)
+            is_voxels[i] = True
+    return voxel_coords[is_voxels], voxel_gene_exps[is_voxels]
+
+
+class TestVoxelData(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.coords = {2: rng.uniform(0, 100, size=(400, 2)), 3: rng.uniform(0, 100, size=(400, 3))}
+        self.gene_exp = rng.poisson(0.5, size=(400, 30)).astype(float)
+
+    def test_ball_matches_loop(self):
+        for D, coords in self.coords.items():
+            for voxel_size in [None, 7.0]:
+                expected_coords, expected_exp = voxel_data_loop(coords, self.gene_exp, voxel_size, voxel_num=400)
+                for gene_exp in [self.gene_exp, csr_matrix(self.gene_exp)]:
+                    with self.subTest(D=D, voxel_size=voxel_size, sparse=not isinstance(gene_exp, np.ndarray)):
+                        voxel_coords, voxel_exp = voxel_data(coords, gene_exp, voxel_size, voxel_num=400)
+                        np.testing.assert_allclose(voxel_coords, expected_coords)
+                        np.testing.assert_allclose(voxel_exp, expected_exp)
+
+    def test_grid_assigns_nearest_voxel(self):
+        for D, coords in self.coords.items():
+            with self.subTest(D=D):
+                voxel_coords, voxel_exp = voxel_data(coords, csr_matrix(self.gene_exp), voxel_num=400, method="grid")
+                # All voxel centers, as every voxel contains a point with an infinite ball.
+                all_voxel_coords, _ = voxel_data(coords, self.gene_exp, voxel_size=np.inf, voxel_num=400)
+                nearest = np.argmin(cdist(coords, all_voxel_coords), axis=1)
+                occupied, counts = np.unique(nearest, return_counts=True)
+
+                np.testing.assert_allclose(voxel_coords, all_voxel_coords[occupied])
+                expected = np.stack([self.gene_exp[nearest == v].mean(axis=0) for v in occupied])
+                np.testing.assert_allclose(voxel_exp, expected)
+                # Every point is in exactly one voxel, so the voxels keep the total expression.
+                np.testing.assert_allclose((voxel_exp * counts[:, None]).sum(axis=0), self.gene_exp.sum(axis=0))
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            voxel_data(self.coords[2], self.gene_exp, method="cube")
@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+import numpy as np
+import ot
+from anndata import AnnData
+from scipy.sparse import csr_matrix
+
+from spateo.alignment.methods.paste import (
+    _anchor_assignments,
+    _extend_anchor_coupling,
+    generalized_procrustes_analysis,
+    paste_pairwise_align,
+)
+
+from ..mixins import TestMixin
+
+
+def create_rigid_pair(n_spots=300, n_genes=20, angle=np.pi / 6, shift=(3.0, -2.0), seed=0):
+    rng = np.random.default_rng(seed)
+    coords = rng.uniform(0, 10, size=(n_spots, 2))
+    # Expression varies smoothly in space, so that spots are matched to nearby spots.
+    centers = rng.uniform(0, 10, size=(n_genes, 2))
+    X = 10 * np.exp(-((coords[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1) / 8)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    sampleA = AnnData(X=X.copy(), obsm={"spatial": coords.copy()})
+    sampleB = AnnData(X=X.copy(), obsm={"spatial": coords @ rotation.T + np.asarray(shift)})
+    sampleA.var_names = sampleB.var_names = [f"gene{i}" for i in range(n_genes)]
+    return sampleA, sampleB, rotation
+
+
+class TestPastePairwiseAlignAnchors(TestMixin, TestCase):
+    def test_rigid_transform_is_recovered(self):
+        sampleA, sampleB, rotation = create_rigid_pair()
+        a = np.ones(sampleA.n_obs) / sampleA.n_obs
+        pi, _ = paste_pairwise_align(
+            sampleA,
+            sampleB,
+            dissimilarity="euclidean",
+            dtype="float64",
+            verbose=False,
+            n_anchors=40,
+            random_seed=0,
+        )
+
+        self.assertIsInstance(pi, csr_matrix)
+        self.assertEqual(pi.shape, (sampleA.n_obs, sampleB.n_obs))
+        self.assertFalse(np.isnan(pi.data).any())
+        np.testing.assert_allclose(np.asarray(pi.sum(axis=1)).ravel(), a)
+
+        X, Y, mapping = generalized_procrustes_analysis(sampleA.obsm["spatial"], sampleB.obsm["spatial"], pi)
+        # Rotating sampleB back onto sampleA inverts the rotation.
+        np.testing.assert_allclose(mapping["R"], rotation.T, atol=0.05)
+        self.assertLess(np.median(np.linalg.norm(X - Y, axis=1)), 0.3)
+
+    def test_zero_mass_anchor(self):
+        nx = ot.backend.NumpyBackend()
+        rng = np.random.default_rng(0)
+        coords = rng.uniform(0, 10, size=(40, 2))
+        X = rng.random((40, 5))
+        assign = _anchor_assignments(coords, 4, random_seed=0)
+        # Spots of the first anchor have no mass, so the anchor coupling has an empty first row.
+        a = np.where(assign[:, 0].toarray().ravel() > 0, 0.0, 1.0)
+        a /= a.sum()
+        pi_anchors = np.outer(assign.T @ a, np.full(assign.shape[1], 1 / assign.shape[1]))
+
+        pi = _extend_anchor_coupling(nx, pi_anchors, assign, assign, a, X, X, "euclidean", 2)
+
+        self.assertFalse(np.isnan(pi.data).any())
+        np.testing.assert_allclose(np.asarray(pi.sum(axis=1)).ravel(), a)
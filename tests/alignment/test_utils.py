@@ -0,0 +1,67 @@
+from unittest import TestCase, mock
+
+import numpy as np
+from anndata import AnnData
+
+import spateo.alignment.utils as utils
+
+from ..mixins import TestMixin
+
+
+class TestGetLabelsBasedOnCoords(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        # Coordinates up to 1e4 on a grid of spacing 1, as for aligned cells in micrometers.
+        coords = rng.choice(10000, size=(500, 2), replace=False).astype(np.float64)
+        coords[:, 1] = rng.permutation(500) * 20.0
+        self.model = AnnData(
+            X=np.zeros((500, 1)),
+            obs={"label": [f"label{i}" for i in range(500)]},
+            obsm={"align_spatial": coords},
+        )
+        self.order = rng.permutation(500)
+
+    def test_exact_matches(self):
+        coords = self.model.obsm["align_spatial"][self.order]
+        result = utils.get_labels_based_on_coords(self.model, coords, "label")
+
+        np.testing.assert_array_equal(result["map_index"], np.arange(500))
+        np.testing.assert_array_equal(result["model_index"], self.order)
+        np.testing.assert_array_equal(result["distance"], 0)
+        np.testing.assert_array_equal(result["label"], self.model.obs["label"].values[self.order])
+
+    def test_matches_within_tol(self):
+        rotation = np.array([[np.cos(0.3), -np.sin(0.3)], [np.sin(0.3), np.cos(0.3)]])
+        # Rotating float32 coordinates there and back adds rounding noise of up to about 1e-3.
+        coords = self.model.obsm["align_spatial"][self.order].astype(np.float32)
+        coords = ((coords @ rotation.T.astype(np.float32)) @ rotation.astype(np.float32)).astype(np.float32)
+        self.assertGreater(np.abs(coords - self.model.obsm["align_spatial"][self.order]).max(), 1e-6)
+
+        result = utils.get_labels_based_on_coords(self.model, coords, "label")
+
+        np.testing.assert_array_equal(result["map_index"], np.arange(500))
+        np.testing.assert_array_equal(result["label"], self.model.obs["label"].values[self.order])
+
+    def test_rejects_beyond_tol(self):
+        coords = self.model.obsm["align_spatial"][self.order[:10]].copy()
+        # The coordinate scale is about 1e4, so the default tolerance is a distance of about 0.01.
+        coords[::2] += 0.5
+        result = utils.get_labels_based_on_coords(self.model, coords, ["label"])
+
+        np.testing.assert_array_equal(result["map_index"], np.arange(1, 10, 2))
+        np.testing.assert_array_equal(result["label"], self.model.obs["label"].values[self.order[1:10:2]])
+
+        result = utils.get_labels_based_on_coords(self.model, coords, ["label"], tol=1e-4)
+        np.testing.assert_array_equal(result["map_index"], np.arange(10))
+
+    def test_reuses_tree(self):
+        tree = utils.coords_tree(self.model)
+        coords = self.model.obsm["align_spatial"][self.order]
+        with mock.patch.object(utils, "coords_tree", wraps=utils.coords_tree) as build:
+            first = utils.get_labels_based_on_coords(self.model, coords[:250], "label", tree=tree)
+            second = utils.get_labels_based_on_coords(self.model, coords[250:], "label", tree=tree)
+        self.assertEqual(build.call_count, 0)
+
+        np.testing.assert_array_equal(first["model_index"], self.order[:250])
+        np.testing.assert_array_equal(second["model_index"], self.order[250:])
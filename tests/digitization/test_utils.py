@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+import numpy as np
+
+from spateo.digitization import utils
+
+from ..mixins import TestMixin
+
+
+class TestDomainHeatEqnSolver(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        n = 24
+        self.heat_field = np.zeros((n, n))
+        self.field_mask = np.zeros((n, n))
+        self.field_mask[1:-1, 1:-1] = 1
+        self.field_border = np.zeros((n, n))
+        self.field_border[1, 1:-1] = self.field_border[-2, 1:-1] = 1
+        self.field_border[1:-1, 1] = self.field_border[1:-1, -2] = 1
+
+        # Lines are (x, y) points along the border of the square domain. The heat increases downwards along the left
+        # edge and upwards along the right edge, so that the solution is not simply linear.
+        idx = np.arange(1, n - 1)
+        self.min_line = np.column_stack([idx, np.full_like(idx, 1)])
+        self.max_line = np.column_stack([idx, np.full_like(idx, n - 2)])
+        self.edge_line_a = np.column_stack([np.full_like(idx, 1), idx])
+        self.edge_line_b = np.column_stack([np.full_like(idx, n - 2), idx[::-1]])
+
+    def solve(self, solver):
+        return utils.domain_heat_eqn_solver(
+            self.heat_field,
+            self.min_line,
+            self.max_line,
+            self.edge_line_a,
+            self.edge_line_b,
+            self.field_border,
+            self.field_mask,
+            max_err=1e-10,
+            solver=solver,
+        )
+
+    def test_solvers_agree(self):
+        direct = self.solve("direct")
+        np.testing.assert_allclose(self.solve("cg"), direct, atol=1e-5)
+        np.testing.assert_allclose(self.solve("jacobi"), direct, atol=1e-5)
+        self.assertTrue(np.all(direct[self.field_mask == 0] == 0))
+        interior = direct[2:-2, 2:-2]
+        self.assertTrue(np.all((interior > 1) & (interior < 100)))
+
+    def test_invalid_solver(self):
+        with self.assertRaises(ValueError):
+            self.solve("unknown")
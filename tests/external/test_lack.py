@@ -0,0 +1,79 @@
+import csv
+import json
+import os
+import threading
+from unittest import TestCase
+
+import numpy as np
+from anndata import AnnData
+
+from spateo.external import lack
+
+from ..mixins import TestMixin
+
+
+class TestLoggerManagerProfiling(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = lack.LoggerManager("test-lack", "test-lack-temp-timer-logger")
+
+        @self.manager.profiled(name="inner")
+        def inner(adata):
+            return adata.n_obs
+
+        @self.manager.profiled(name="outer")
+        def outer(adata):
+            with self.manager.profile("block", n_items=3):
+                return inner(adata[:5])
+
+        self.outer = outer
+
+    def test_profile_nested(self):
+        adata = AnnData(np.ones((10, 4)))
+        self.assertEqual(self.outer(adata), 5)
+        self.assertEqual(self.manager.get_profile_records(), [])
+
+        self.manager.enable_profiling()
+        self.assertEqual(self.outer(adata), 5)
+        self.manager.disable_profiling()
+        self.outer(adata)
+
+        path = os.path.join(self.temp_dir, "profile.json")
+        self.manager.dump_profile(path)
+        with open(path) as f:
+            records = json.load(f)
+        self.assertEqual([r["name"] for r in records], ["inner", "block", "outer"])
+        self.assertEqual([r["depth"] for r in records], [2, 1, 0])
+        self.assertEqual([r["n_obs"] for r in records if "n_obs" in r], [5, 10])
+        self.assertEqual(records[1]["n_items"], 3)
+        self.assertTrue(all(r["wall_time_s"] >= 0 for r in records))
+        self.assertGreaterEqual(records[2]["wall_time_s"], records[0]["wall_time_s"])
+
+        path = os.path.join(self.temp_dir, "profile.csv")
+        self.manager.dump_profile(path)
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([(r["name"], r["depth"]) for r in rows], [("inner", "2"), ("block", "1"), ("outer", "0")])
+
+        with self.assertRaises(ValueError):
+            self.manager.dump_profile(os.path.join(self.temp_dir, "profile.txt"))
+
+    def test_profile_depth_per_thread(self):
+        barrier = threading.Barrier(2)
+
+        @self.manager.profiled(name="worker")
+        def worker():
+            # Both threads are inside a profiled call at the same time.
+            barrier.wait()
+            with self.manager.profile("nested"):
+                barrier.wait()
+
+        self.manager.enable_profiling()
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        records = self.manager.get_profile_records()
+        self.assertEqual(sorted((r["name"], r["depth"]) for r in records), [("nested", 1)] * 2 + [("worker", 0)] * 2)
@@ -0,0 +1,57 @@
+import os
+from unittest import TestCase
+
+import imageio.v3 as iio
+import numpy as np
+import pandas as pd
+
+import spateo.io.nanostring as nanostring
+
+from ..mixins import TestMixin
+
+
+class TestIONanoString(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(2021)
+        self.stain_dir = os.path.join(self.temp_dir, "stain")
+        self.labels_dir = os.path.join(self.temp_dir, "labels")
+        os.makedirs(self.stain_dir)
+        os.makedirs(self.labels_dir)
+        self.fovs = {}
+        positions = []
+        for fov in range(1, 5):
+            stain = rng.integers(0, 255, (4, 5), dtype=np.uint8)
+            labels = rng.integers(0, 3, (4, 5), dtype=np.uint16)
+            iio.imwrite(os.path.join(self.stain_dir, f"CellComposite_F{fov:03d}.tif"), stain)
+            iio.imwrite(os.path.join(self.labels_dir, f"CellLabels_F{fov:03d}.tif"), labels)
+            self.fovs[fov] = (stain, labels)
+            positions.append((fov, 10 + (fov % 2) * 5, 20 + (fov // 2) * 4))
+        self.positions_path = os.path.join(self.temp_dir, "positions.csv")
+        pd.DataFrame(positions, columns=["fov", "x_global_px", "y_global_px"]).to_csv(self.positions_path, index=False)
+
+    def test_stitch_images(self):
+        img = nanostring.stitch_images(self.stain_dir, self.positions_path)
+        self.assertEqual((10, 12), img.shape)
+        self.assertEqual(np.uint8, img.dtype)
+        # FOV 1 is at x=15, y=20, relative to the minimum position (10, 20).
+        np.testing.assert_array_equal(np.fliplr(self.fovs[1][0].T), img[5:10, 0:4])
+
+    def test_stitch_images_out_path(self):
+        out_path = os.path.join(self.temp_dir, "stain.npy")
+        expected = nanostring.stitch_images(self.stain_dir, self.positions_path)
+        img = nanostring.stitch_images(self.stain_dir, self.positions_path, out_path=out_path, n_jobs=2)
+        self.assertIsInstance(img, np.memmap)
+        np.testing.assert_array_equal(expected, img)
+        np.testing.assert_array_equal(expected, np.load(out_path, mmap_mode="r"))
+
+    def test_stitch_images_labels(self):
+        img = nanostring.stitch_images(self.labels_dir, self.positions_path, labels=True, n_jobs=2)
+        offset = 0
+        for fov in sorted(self.fovs):
+            labels = self.fovs[fov][1].astype(np.uint)
+            labels[labels > 0] += offset
+            offset = max(offset, labels.max())
+        self.assertEqual(offset, img.max())
+        # FOV 4 is at x=10, y=28.
+        np.testing.assert_array_equal(np.fliplr(labels.T), img[0:5, 8:12])
@@ -2,6 +2,7 @@ from unittest import TestCase, mock
 
 import numpy as np
 from scipy import sparse
+from shapely.geometry import MultiPolygon, Point, Polygon, box
 
 import spateo.io.utils as utils
 
@@ -18,3 +19,21 @@ class TestIOUtils(TestMixin, TestCase):
         expected[1, 1] = X[2, 2]
         np.testing.assert_array_equal(expected, utils.bin_matrix(X, 2))
         np.testing.assert_array_equal(expected, utils.bin_matrix(sparse.csr_matrix(X), 2).A)
+
+    def test_in_concave_hull(self):
+        rng = np.random.default_rng(2021)
+        ring = Point(50, 50).buffer(30).difference(Point(50, 50).buffer(10))
+        hull = MultiPolygon([ring, Polygon([(85, 85), (100, 88.5), (92.3, 100)])])
+        p = rng.uniform(-5, 105, size=(5000, 2))
+        int_p = np.vstack([np.round(p).astype(int), np.round(np.asarray(ring.exterior.coords)).astype(int)])
+        for points in (p, int_p):
+            expected = np.array([hull.intersects(Point(i)) for i in points])
+            np.testing.assert_array_equal(expected, utils.in_concave_hull(points, hull))
+            np.testing.assert_array_equal(expected, utils.in_concave_hull(points, hull, rasterize=False))
+
+    def test_in_concave_hull_island_in_hole(self):
+        hull = MultiPolygon([box(40, 40, 60, 60), box(0, 0, 100, 100) - box(20, 20, 80, 80)])
+        p = np.stack(np.meshgrid(np.arange(-5, 106), np.arange(-5, 106)), axis=-1).reshape(-1, 2)
+        expected = np.array([hull.intersects(Point(i)) for i in p])
+        self.assertTrue(expected[(p[:, 0] == 50) & (p[:, 1] == 50)].all())
+        np.testing.assert_array_equal(expected, utils.in_concave_hull(p, hull))
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+import numpy as np
+import torch
+from anndata import AnnData
+from scipy import ndimage
+
+import spateo.segmentation.align as align
+from spateo.configuration import SKM
+
+from ..mixins import TestMixin
+
+
+class TestAlign(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(2021)
+        img = np.zeros((128, 128))
+        points = rng.integers(8, 120, size=(60, 2))
+        img[points[:, 0], points[:, 1]] = 1
+        self.rna = ndimage.gaussian_filter(img, 2)
+        self.stain = ndimage.shift(self.rna, (3, -4), order=1)
+
+    def test_refiner_tiles(self):
+        tiles = [(slice(0, 128), slice(0, 128))]
+        for module, kwargs in ((align.RigidAlignmentRefiner, {}), (align.NonRigidAlignmentRefiner, {"meshsize": 40})):
+            full = module(self.rna, self.stain, **kwargs)
+            tiled = module(self.rna, self.stain, tiles=tiles, **kwargs)
+            with torch.no_grad():
+                for param, tiled_param in zip(full.parameters(), tiled.parameters()):
+                    noise = torch.normal(0.0, 0.05, param.shape)
+                    param.add_(noise)
+                    tiled_param.add_(noise)
+                np.testing.assert_allclose(full().numpy().ravel(), tiled().numpy().ravel(), atol=1e-4)
+
+    def test_refine_alignment_pyramid(self):
+        adata = AnnData(np.zeros(self.rna.shape))
+        SKM.init_adata_type(adata, SKM.ADATA_AGG_TYPE)
+        adata.layers[SKM.STAIN_LAYER_KEY] = self.stain
+        adata.layers[SKM.UNSPLICED_LAYER_KEY] = self.rna
+        align.refine_alignment(adata, k=1, levels=3, n_epochs=[100, 50, 20], tile_size=32, n_tiles=8)
+        theta = SKM.get_uns_spatial_attribute(adata, SKM.UNS_SPATIAL_ALIGNMENT_KEY)["theta"]
+        np.testing.assert_allclose(theta[:, 2] * 64, [-4, 3], atol=1)
@@ -17,6 +17,20 @@ class TestEM(TestMixin, TestCase):
         # np.testing.assert_allclose([53.75074877, 286.70262741], r)
         # np.testing.assert_allclose([0.33038823, 0.72543857], p)
 
+    def test_nbn_em_batched(self):
+        rng = np.random.default_rng(2021)
+        samples = [
+            rng.negative_binomial(10, 0.5, 100) + rng.negative_binomial(100, 0.5, 100),
+            rng.negative_binomial(5, 0.3, 200) + rng.negative_binomial(50, 0.2, 200),
+        ]
+        w, r, p = em.nbn_em_batched(samples, max_iter=100)
+        self.assertEqual((2, 2), w.shape)
+        for i, X in enumerate(samples):
+            expected_w, expected_r, expected_p = em.nbn_em(X, max_iter=100)
+            np.testing.assert_allclose(expected_w, w[i], rtol=1e-6)
+            np.testing.assert_allclose(expected_r, r[i], rtol=1e-6)
+            np.testing.assert_allclose(expected_p, p[i], rtol=1e-6)
+
     def test_confidence(self):
         np.testing.assert_allclose(
             [
@@ -76,6 +90,41 @@ class TestEM(TestMixin, TestCase):
         # np.testing.assert_allclose([24.349175570483077, 886.542518924474], results[2][1])
         # np.testing.assert_allclose([0.0420157787402099, 0.6167383056305975], results[2][2])
 
+    def test_run_em_bins_batched(self):
+        rng = np.random.default_rng(2021)
+        X = rng.negative_binomial(5, 0.3, (50, 50)) + rng.negative_binomial(50, 0.2, (50, 50))
+        bins = np.zeros(X.shape, dtype=int)
+        bins[:25, :25] = 1
+        bins[25:, 25:] = 3
+        results = em.run_em(X, downsample=1e6, bins=bins, max_iter=100, batched=True)
+        expected = em.run_em(X, downsample=1e6, bins=bins, max_iter=100, batched=False)
+        self.assertEqual(expected.keys(), results.keys())
+        for label in expected:
+            np.testing.assert_allclose(expected[label], results[label], rtol=1e-6)
+        np.testing.assert_allclose(em.confidence(X, expected, bins), em.confidence(X, results, bins), rtol=1e-6)
+
+    def test_run_em_bins_batched_empty(self):
+        rng = np.random.default_rng(2021)
+        X = rng.negative_binomial(5, 0.3, (50, 50)) + rng.negative_binomial(50, 0.2, (50, 50))
+        bins = np.zeros(X.shape, dtype=int)
+        bins[:25, :25] = 1
+        bins[25:, 25:] = 3
+        # The default downsampling leaves no samples in either bin.
+        results = em.run_em(X, bins=bins, batched=True)
+        expected = em.run_em(X, bins=bins, batched=False)
+        for label in expected:
+            np.testing.assert_allclose(expected[label], results[label])
+
+        w, r, p = em.nbn_em_batched([np.array([]), X[:25, :25].flatten()], max_iter=100)
+        expected_w, expected_r, expected_p = em.nbn_em(np.array([]))
+        np.testing.assert_allclose(expected_w, w[0])
+        np.testing.assert_allclose(expected_r, r[0])
+        np.testing.assert_allclose(expected_p, p[0])
+        expected_w, expected_r, expected_p = em.nbn_em(X[:25, :25].flatten(), max_iter=100)
+        np.testing.assert_allclose(expected_w, w[1], rtol=1e-6)
+        np.testing.assert_allclose(expected_r, r[1], rtol=1e-6)
+        np.testing.assert_allclose(expected_p, p[1], rtol=1e-6)
+
     def test_conditionals(self):
         X = np.array([[1, 2, 3]])
         em_results = (0, 0), (4, 5), (0.5, 0.6)
@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+import numpy as np
+
+import spateo.segmentation.moran as moran
+
+from ..mixins import TestMixin
+
+
+class TestMoran(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(2021)
+        self.X = rng.poisson(2, (50, 70)).astype(float)
+        self.X[10:30, 20:40] += 5
+        self.mask = rng.random(self.X.shape) > 0.2
+        self.kernel = moran._moran_kernel(7)
+
+    def test_tiled_moranI(self):
+        for mask in (None, self.mask):
+            _, c, _, pvalue = moran.moranI(self.X, self.kernel, mask=mask)
+            for tile_size in (None, 16, 23):
+                tiled_c, tiled_pvalue = moran.tiled_moranI(self.X, self.kernel, mask=mask, tile_size=tile_size)
+                np.testing.assert_allclose(c, tiled_c)
+                np.testing.assert_allclose(pvalue, tiled_pvalue)
+
+    def test_tiled_moranI_conv_method(self):
+        _, c, _, pvalue = moran.moranI(self.X, self.kernel)
+        for conv_method in ("fft", "separable"):
+            tiled_c, tiled_pvalue = moran.tiled_moranI(self.X, self.kernel, tile_size=16, conv_method=conv_method)
+            np.testing.assert_allclose(c, tiled_c, atol=1e-10)
+            np.testing.assert_allclose(pvalue, tiled_pvalue, atol=1e-10)
+
+    def test_tiled_moranI_float32(self):
+        _, c, _, pvalue = moran.moranI(self.X, self.kernel)
+        tiled_c, tiled_pvalue = moran.tiled_moranI(self.X, self.kernel, tile_size=16, dtype="float32")
+        self.assertEqual(np.float32, tiled_c.dtype)
+        self.assertEqual(np.float32, tiled_pvalue.dtype)
+        np.testing.assert_allclose(c, tiled_c, atol=1e-4)
+        np.testing.assert_allclose(pvalue, tiled_pvalue, atol=1e-4)
+
+    def test_run_moran(self):
+        np.testing.assert_allclose(
+            moran.run_moran(self.X), moran.run_moran(self.X, tile_size=16, conv_method="fft"), atol=1e-10
+        )
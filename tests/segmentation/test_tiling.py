@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+import numpy as np
+from skimage import measure
+
+import spateo.segmentation.external.tiling as tiling
+
+from ..mixins import TestMixin
+
+
+def _segment(tile):
+    return measure.label(tile > 0)
+
+
+class TestTiling(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(2021)
+        self.img = np.zeros((230, 170), dtype=np.uint8)
+        rows, cols = np.ogrid[: self.img.shape[0], : self.img.shape[1]]
+        for center in rng.uniform(0, self.img.shape, size=(60, 2)):
+            self.img[(rows - center[0]) ** 2 + (cols - center[1]) ** 2 <= rng.uniform(3, 7) ** 2] = 255
+        self.expected = measure.label(self.img > 0)
+
+    def assert_same_instances(self, expected, labels):
+        np.testing.assert_array_equal(expected > 0, labels > 0)
+        overlap = set(zip(expected[expected > 0], labels[labels > 0]))
+        self.assertEqual(len(np.unique(expected)) - 1, len(overlap))
+        self.assertEqual(len(np.unique(labels)) - 1, len(overlap))
+
+    def test_tile_slices(self):
+        tiles = tiling.tile_slices((230, 170), 64, 16)
+        covered = np.zeros((230, 170), dtype=int)
+        for rows, cols in tiles:
+            covered[rows, cols] += 1
+            self.assertEqual((64, 64), covered[rows, cols].shape)
+        self.assertTrue((covered > 0).all())
+        self.assertEqual([0, 48, 96, 144, 166], sorted({rows.start for rows, _ in tiles}))
+
+    def test_segment_tiles(self):
+        labels = tiling.segment_tiles(self.img, _segment, tilesize=64, overlap=24, n_jobs=1)
+        self.assertEqual(self.img.shape, labels.shape)
+        self.assert_same_instances(self.expected, labels)
+
+    def test_segment_tiles_parallel(self):
+        expected = tiling.segment_tiles(self.img, _segment, tilesize=64, overlap=24, n_jobs=1)
+        labels = tiling.segment_tiles(self.img, _segment, tilesize=64, overlap=24, n_jobs=2, backend="threading")
+        np.testing.assert_array_equal(expected, labels)
+
+    def test_segment_tiles_single_tile(self):
+        labels = tiling.segment_tiles(self.img, _segment, tilesize=500, overlap=24, n_jobs=1)
+        self.assert_same_instances(self.expected, labels)
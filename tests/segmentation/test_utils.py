@@ -114,3 +114,44 @@ class TestSegmentationUtils(TestMixin, TestCase):
         expected = np.zeros((10, 10), dtype=bool)
         expected[4:6, 4:6] = True
         np.testing.assert_array_equal(expected, utils.safe_erode(mask, 3, min_area=4, n_iter=10))
+
+    def test_sanitize_labels(self):
+        labels = np.array(
+            [
+                [1, 1, 0, 1, 0],
+                [1, 0, 0, 0, 2],
+                [0, 0, 2, 0, 0],
+                [3, 0, 0, 0, 3],
+                [3, 3, 0, 0, 3],
+            ]
+        )
+        expected = np.array(
+            [
+                [1, 1, 0, 0, 0],
+                [1, 0, 0, 0, 2],
+                [0, 0, 0, 0, 0],
+                [3, 0, 0, 0, 0],
+                [3, 3, 0, 0, 0],
+            ]
+        )
+        np.testing.assert_array_equal(expected, utils.sanitize_labels(labels))
+
+    def test_sanitize_labels_ties(self):
+        # Components of equal area: the one whose first pixel comes first in row-major order is kept.
+        labels = np.array(
+            [
+                [0, 0, 0, 0],
+                [0, 0, 0, 0],
+                [0, 0, 0, 1],
+                [0, 1, 0, 0],
+            ]
+        )
+        expected = np.array(
+            [
+                [0, 0, 0, 0],
+                [0, 0, 0, 0],
+                [0, 0, 0, 1],
+                [0, 0, 0, 0],
+            ]
+        )
+        np.testing.assert_array_equal(expected, utils.sanitize_labels(labels))
@@ -0,0 +1,82 @@
+from unittest import TestCase, mock
+
+import numpy as np
+from anndata import AnnData
+from scipy.spatial.distance import cdist
+
+import spateo.tdr.morphometrics.morphofield.gaussian_process as gp
+from spateo.tdr.morphometrics.morphofield_dg.GPVectorField import GPVectorField
+
+from ..mixins import TestMixin
+
+
+def create_geodist_vf_dict(n_nodes=60, n_ctrl=8, dim=2, seed=0):
+    rng = np.random.default_rng(seed)
+    first_node_idx = rng.integers(0, n_nodes, size=(n_nodes, n_ctrl))
+    first_node_idx[rng.random((n_nodes, n_ctrl)) < 0.1] = -1
+    return {
+        "X": rng.random((n_nodes, dim)),
+        "V": np.zeros((n_nodes, dim)),
+        "C": rng.normal(size=(n_ctrl, dim)),
+        "R": np.eye(dim),
+        "t": np.zeros(dim),
+        "beta": 0.5,
+        "norm_dict": {
+            "mean_transformed": np.zeros(dim),
+            "scale_transformed": 1.0,
+            "mean_fixed": np.zeros(dim),
+            "scale_fixed": 1.0,
+        },
+        "kernel_dict": {
+            "dist": "geodist",
+            "X": rng.random((n_nodes, dim)),
+            "first_node_idx": first_node_idx,
+            "kernel_graph_distance": rng.random((n_nodes, n_ctrl)) + 1,
+        },
+        "method": "gaussian_process",
+    }
+
+
+def brute_force_gp_velocity(X, vf_dict):
+    """Velocities of a geodesic GP vector field, with the nearest graph nodes found from all pairwise distances."""
+    kernel_dict = vf_dict["kernel_dict"]
+    nodes = kernel_dict["X"]
+    nearest_idx = np.argmin(cdist(X, nodes), axis=1)
+    first_node_idx = kernel_dict["first_node_idx"][nearest_idx]
+    K_mask = first_node_idx < 0
+    first_nodes = nodes[np.where(K_mask, 0, first_node_idx)]
+    to_first_node_dist = np.linalg.norm(X[:, None, :] - first_nodes, axis=2)
+    origin_to_first_node_dist = np.linalg.norm(nodes[nearest_idx][:, None, :] - first_nodes, axis=2)
+    D = kernel_dict["kernel_graph_distance"][nearest_idx] + to_first_node_dist - origin_to_first_node_dist
+    D[K_mask] = 10000
+    K = np.exp(-vf_dict["beta"] * D**2)
+    return gp._gp_velocity_from_kernel(X, X, K @ vf_dict["C"], vf_dict)
+
+
+class TestGeodistIndex(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.vf_dict = create_geodist_vf_dict()
+        self.X = np.random.default_rng(1).random((40, 2))
+
+    def test_velocity_func_reuses_index(self):
+        with mock.patch.object(gp, "_geodist_index", wraps=gp._geodist_index) as geodist_index:
+            velocity_func = gp._gp_velocity_func(self.vf_dict)
+            first = velocity_func(self.X)
+            second = velocity_func(self.X)
+        self.assertEqual(geodist_index.call_count, 1)
+        np.testing.assert_array_equal(first, second)
+        np.testing.assert_allclose(first, brute_force_gp_velocity(self.X, self.vf_dict))
+
+    def test_vector_field_reuses_index(self):
+        adata = AnnData(np.zeros((len(self.vf_dict["X"]), 1)))
+        adata.uns["VecFld"] = self.vf_dict
+        with mock.patch.object(gp, "_geodist_index", wraps=gp._geodist_index) as geodist_index:
+            vector_field = GPVectorField()
+            vector_field.from_adata(adata, vf_key="VecFld")
+            velocity = vector_field.compute_velocity(self.X)
+            vector_field.func(self.X)
+            vector_field.compute_differential_geometry(self.X, quantities=["velocity", "jacobian"])
+            vector_field.get_Jacobian()(self.X)
+        self.assertEqual(geodist_index.call_count, 1)
+        np.testing.assert_allclose(velocity, brute_force_gp_velocity(self.X, self.vf_dict))
@@ -0,0 +1,117 @@
+from unittest import TestCase
+
+import numpy as np
+
+from spateo.tdr.morphometrics.morphofield.gaussian_process import (
+    _con_K,
+    _con_K_geodist,
+    _gp_velocity,
+)
+from spateo.tdr.morphometrics.morphofield_dg.GPVectorField import (
+    Jacobian_GP_gaussian_kernel,
+    compute_gp_differential_geometry,
+)
+
+from ..mixins import TestMixin
+from .test_gaussian_process import create_geodist_vf_dict
+
+
+def create_cdist_vf_dict(n_nodes=40, n_ctrl=12, dim=2, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        "X": rng.uniform(-1, 1, size=(n_nodes, dim)) * 50 + 10,
+        "V": np.zeros((n_nodes, dim)),
+        "X_ctrl": rng.uniform(-1, 1, size=(n_ctrl, dim)),
+        "C": rng.normal(size=(n_ctrl, dim)),
+        "R": np.eye(dim),
+        "t": np.zeros(dim),
+        "beta": 1.5,
+        "norm_dict": {
+            "mean_transformed": np.full(dim, 10.0),
+            "scale_transformed": 50.0,
+            "mean_fixed": np.full(dim, 5.0),
+            "scale_fixed": 30.0,
+        },
+        "kernel_dict": {"dist": "cdist"},
+        "method": "gaussian_process",
+    }
+
+
+def kernel_part(X, vf_dict):
+    """The part ``K @ C`` of the vector field that the analytical Jacobian differentiates, in fixed coordinates."""
+    norm_dict = vf_dict["norm_dict"]
+    x_norm = (X - norm_dict["mean_transformed"]) / norm_dict["scale_transformed"]
+    if vf_dict["kernel_dict"]["dist"] == "cdist":
+        K = _con_K(x_norm, vf_dict["X_ctrl"], vf_dict["beta"])
+    else:
+        K = _con_K_geodist(x_norm, vf_dict["kernel_dict"], vf_dict["beta"])
+    return np.atleast_2d(K) @ vf_dict["C"] * norm_dict["scale_fixed"]
+
+
+def per_point_jacobian(X, vf_dict):
+    """The (d, d, n) analytical Jacobians evaluated one point at a time."""
+    norm_dict = vf_dict["norm_dict"]
+    pre_scale = norm_dict["scale_fixed"] / norm_dict["scale_transformed"]
+    J = np.zeros((X.shape[1], X.shape[1], X.shape[0]))
+    for i, x in enumerate((X - norm_dict["mean_transformed"]) / norm_dict["scale_transformed"]):
+        if vf_dict["kernel_dict"]["dist"] == "cdist":
+            K, D = _con_K(x[None, :], vf_dict["X_ctrl"], vf_dict["beta"], return_d=True)
+        else:
+            K, D = _con_K_geodist(x[None, :], vf_dict["kernel_dict"], vf_dict["beta"], return_d=True)
+        J[:, :, i] = (vf_dict["C"].T * K) @ D[0].T
+    return -2 * vf_dict["beta"] * J * pre_scale
+
+
+def finite_difference_jacobian(X, vf_dict, eps=1e-5):
+    J = np.zeros((X.shape[1], X.shape[1], X.shape[0]))
+    for j in range(X.shape[1]):
+        step = np.zeros(X.shape[1])
+        step[j] = eps
+        J[:, j, :] = ((kernel_part(X + step, vf_dict) - kernel_part(X - step, vf_dict)) / (2 * eps)).T
+    return J
+
+
+class TestGPJacobian(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.vf_dicts = {
+            "cdist 2D": create_cdist_vf_dict(dim=2),
+            "cdist 3D": create_cdist_vf_dict(dim=3),
+            "geodist 2D": create_geodist_vf_dict(dim=2),
+            "geodist 3D": create_geodist_vf_dict(dim=3),
+        }
+
+    def query_points(self, vf_dict, seed=1):
+        rng = np.random.default_rng(seed)
+        X = vf_dict["X"]
+        return X + rng.normal(scale=0.01 * X.std(), size=X.shape)
+
+    def test_jacobian(self):
+        for name, vf_dict in self.vf_dicts.items():
+            with self.subTest(name):
+                X = self.query_points(vf_dict)
+                J = Jacobian_GP_gaussian_kernel(X, vf_dict, chunk_size=7)
+
+                self.assertEqual(J.shape, (X.shape[1], X.shape[1], X.shape[0]))
+                np.testing.assert_allclose(J, per_point_jacobian(X, vf_dict), rtol=1e-10, atol=1e-12)
+                np.testing.assert_allclose(J, finite_difference_jacobian(X, vf_dict), rtol=1e-5, atol=1e-6)
+                # A single point gives a single (d, d) Jacobian.
+                np.testing.assert_allclose(Jacobian_GP_gaussian_kernel(X[3], vf_dict), J[:, :, 3])
+
+    def test_differential_geometry(self):
+        for name, vf_dict in self.vf_dicts.items():
+            with self.subTest(name):
+                X = self.query_points(vf_dict)
+                results = compute_gp_differential_geometry(
+                    X, vf_dict, quantities=["velocity", "jacobian", "divergence", "curl"], chunk_size=7
+                )
+                J = finite_difference_jacobian(X, vf_dict)
+
+                np.testing.assert_allclose(results["velocity"], _gp_velocity(X, vf_dict))
+                np.testing.assert_allclose(results["jacobian"], J, rtol=1e-5, atol=1e-6)
+                np.testing.assert_allclose(results["divergence"], np.trace(J), rtol=1e-5, atol=1e-6)
+                if X.shape[1] == 2:
+                    curl = J[1, 0] - J[0, 1]
+                else:
+                    curl = np.stack([J[2, 1] - J[1, 2], J[0, 2] - J[2, 0], J[1, 0] - J[0, 1]], axis=1)
+                np.testing.assert_allclose(results["curl"], curl, rtol=1e-5, atol=1e-6)
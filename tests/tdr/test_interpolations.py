@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+from anndata import AnnData
+
+from spateo.tdr.interpolations import kernel_interpolation
+from spateo.tdr.interpolations.interpolation_gp import Imputation_GPR
+
+from ..mixins import TestMixin
+
+
+class TestChunkedInterpolation(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        spatial = rng.random((80, 3))
+        X = np.c_[np.sin(3 * spatial[:, 0]), spatial[:, 1] ** 2, spatial.sum(1)]
+        self.adata = AnnData(
+            X=X,
+            obs=pd.DataFrame({"score": np.cos(2 * spatial[:, 2])}, index=[str(i) for i in range(80)]),
+            var=pd.DataFrame(index=["a", "b", "c"]),
+            obsm={"spatial": spatial},
+        )
+        self.target_points = rng.random((53, 3))
+
+    def test_kernel_interpolation_chunks(self):
+        keys = ["score", "a", "b", "c"]
+        np.random.seed(0)
+        full = kernel_interpolation(self.adata, self.target_points, keys=keys)
+        np.random.seed(0)
+        chunked = kernel_interpolation(self.adata, self.target_points, keys=keys, chunk_size=7, n_threads=2)
+        np.testing.assert_allclose(chunked.X, full.X, rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(chunked.obs["score"], full.obs["score"], rtol=1e-4, atol=1e-5)
+        # The keys must not all receive the same prediction.
+        self.assertFalse(np.allclose(chunked.X[:, 0], chunked.X[:, 1]))
+
+    def test_gp_interpolate_chunks(self):
+        GPR = Imputation_GPR(self.adata, self.target_points, keys="a", inducing_num=32)
+        GPR.inference(training_iter=5)
+        full = GPR.interpolate()
+        chunked = GPR.interpolate(chunk_size=7, n_threads=2)
+        self.assertEqual(chunked.shape, (53, 1))
+        np.testing.assert_allclose(chunked[:, 0], full, rtol=1e-4, atol=1e-5)
+
+    def test_gp_interpolate_chunks_multiple_keys(self):
+        GPR = Imputation_GPR(self.adata, self.target_points, keys=["score", "a"], inducing_num=32)
+        with self.assertRaises(ValueError):
+            GPR.interpolate(chunk_size=7)
@@ -0,0 +1,116 @@
+from unittest import TestCase
+
+import numpy as np
+from anndata import AnnData
+from scipy.integrate import solve_ivp
+from scipy.linalg import expm
+
+from spateo.tdr.morphometrics.morphofield.gaussian_process import _gp_velocity
+from spateo.tdr.morphometrics.morphofield.trajectory import (
+    _integrate_cells,
+    _integrate_rk4,
+    _integrate_rk45,
+    morphopath,
+)
+
+from ..mixins import TestMixin
+
+
+def rotation_field(y):
+    # dx/dt = -y, dy/dt = x
+    return y @ np.array([[0.0, 1.0], [-1.0, 0.0]])
+
+
+def rotation_solution(y0, t):
+    cos, sin = np.cos(t)[:, None], np.sin(t)[:, None]
+    return np.stack([y0[:, 0] * cos - y0[:, 1] * sin, y0[:, 0] * sin + y0[:, 1] * cos], axis=-1)
+
+
+def create_gp_vf_dict(n_cells=30, n_ctrl=10, angle=np.pi / 2, ctrl_scale=0.0, seed=0):
+    """GP vector field with a cdist kernel whose velocity is (R - I) x / 1e4 plus the kernel part, with R the rotation
+    by `angle`. Without the kernel part (`ctrl_scale` = 0), cells follow x(t) = expm((R - I) t / 1e4) x0."""
+    rng = np.random.default_rng(seed)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    return {
+        "X": rng.uniform(-1, 1, size=(n_cells, 2)),
+        "V": np.zeros((n_cells, 2)),
+        "X_ctrl": rng.uniform(-1, 1, size=(n_ctrl, 2)),
+        "C": ctrl_scale * rng.normal(size=(n_ctrl, 2)),
+        "R": rotation,
+        "t": np.zeros(2),
+        "beta": 2.0,
+        "norm_dict": {
+            "mean_transformed": np.zeros(2),
+            "scale_transformed": 1.0,
+            "mean_fixed": np.zeros(2),
+            "scale_fixed": 1.0,
+        },
+        "kernel_dict": {"dist": "cdist"},
+        "method": "gaussian_process",
+    }
+
+
+class TestIntegrators(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.y0 = np.random.default_rng(0).uniform(-2, 2, size=(25, 2))
+        self.t = np.linspace(0, 2 * np.pi, 40)
+
+    def test_rk4_rotation(self):
+        out = np.zeros((len(self.t), *self.y0.shape))
+        _integrate_rk4(rotation_field, self.y0, self.t, out, substeps=4)
+        np.testing.assert_allclose(out, rotation_solution(self.y0, self.t), atol=1e-5)
+
+    def test_rk45_rotation(self):
+        out = np.zeros((len(self.t), *self.y0.shape))
+        _integrate_rk45(rotation_field, self.y0, self.t, out, rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(out, rotation_solution(self.y0, self.t), atol=1e-6)
+
+    def test_threads(self):
+        for solver in ["rk4", "rk45"]:
+            single = _integrate_cells(rotation_field, self.y0, self.t, solver=solver)
+            threaded = _integrate_cells(rotation_field, self.y0, self.t, solver=solver, n_threads=3)
+            self.assertEqual(single.dtype, np.float32)
+            np.testing.assert_array_equal(single, threaded)
+
+
+class TestMorphopath(TestMixin, TestCase):
+    def test_linear_field(self):
+        vf_dict = create_gp_vf_dict()
+        A = (vf_dict["R"] - np.eye(2)) / 10000
+        adata = AnnData(X=np.zeros((vf_dict["X"].shape[0], 1)), uns={"VecFld_morpho": vf_dict})
+        for solver, kwargs in [("rk4", {"substeps": 4}), ("rk45", {"rtol": 1e-8, "atol": 1e-10})]:
+            morphopath(adata, solver=solver, t_end=20000, interpolation_num=30, **kwargs)
+            fate = adata.uns["fate_morpho"]
+            t = fate["t"][0]
+            expected = np.stack([expm(A * ti) @ vf_dict["X"].T for ti in t])
+
+            self.assertEqual(len(fate["prediction"]), vf_dict["X"].shape[0])
+            prediction = np.stack([fate["prediction"][i] for i in range(len(fate["prediction"]))], axis=1)
+            np.testing.assert_allclose(prediction, expected.transpose(0, 2, 1), atol=1e-5)
+
+    def test_batched_matches_solve_ivp(self):
+        vf_dict = create_gp_vf_dict(ctrl_scale=0.5)
+        velocity = lambda x: _gp_velocity(x, vf_dict)
+        adata = AnnData(X=np.zeros((vf_dict["X"].shape[0], 1)), uns={"VecFld_morpho": vf_dict})
+        for direction in ["forward", "backward"]:
+            sign = 1 if direction == "forward" else -1
+            reference = [
+                solve_ivp(
+                    lambda _, y: sign * velocity(y[None])[0],
+                    (0, 20000),
+                    x0,
+                    t_eval=np.linspace(0, 20000, 30),
+                    rtol=1e-10,
+                    atol=1e-12,
+                ).y.T
+                for x0 in vf_dict["X"]
+            ]
+            for solver, kwargs in [("rk4", {"substeps": 4}), ("rk45", {"rtol": 1e-8, "atol": 1e-10})]:
+                morphopath(
+                    adata, solver=solver, direction=direction, t_end=20000, interpolation_num=30, cores=2, **kwargs
+                )
+                fate = adata.uns["fate_morpho"]
+                np.testing.assert_allclose(fate["t"][0], sign * np.linspace(0, 20000, 30))
+                for i, expected in enumerate(reference):
+                    np.testing.assert_allclose(fate["prediction"][i], expected, atol=1e-5)
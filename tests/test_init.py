@@ -0,0 +1,41 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+import spateo
+
+from .mixins import TestMixin
+
+
+class TestInit(TestMixin, TestCase):
+    def test_lazy_submodules(self):
+        for name in spateo._LAZY_SUBMODULES:
+            module = getattr(spateo, name)
+            self.assertIs(sys.modules[f"spateo.{name}"], module)
+
+    def test_lazy_submodules_fresh_interpreter(self):
+        # Import order matters for circular imports, so each subpackage is accessed first in its own interpreter.
+        processes = {
+            name: subprocess.Popen(
+                [sys.executable, "-c", f"import spateo; spateo.{name}"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+            for name in spateo._LAZY_SUBMODULES
+        }
+        for name, process in processes.items():
+            _, stderr = process.communicate()
+            self.assertEqual(0, process.returncode, f"spateo.{name}: {stderr.decode()[-1000:]}")
+
+    def test_lazy_submodules_backend_threads(self):
+        import torch
+
+        n_threads = spateo.config.n_threads
+        spateo.config.n_threads = 2
+        try:
+            torch.set_num_threads(1)
+            spateo.__dict__.pop("tdr", None)
+            spateo.tdr
+            self.assertEqual(2, torch.get_num_threads())
+        finally:
+            spateo.config.n_threads = n_threads
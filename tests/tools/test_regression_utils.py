@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+from spateo.tools.CCI_effects_modeling.regression_utils import spatial_lag_ligands
+
+from ..mixins import TestMixin
+
+
+class TestSpatialLagLigands(TestMixin, TestCase):
+    def test_spatial_lag_ligands(self):
+        rng = np.random.default_rng(0)
+        n_cells = 50
+        expr = rng.random((n_cells, 5)) * (rng.random((n_cells, 5)) < 0.4)
+        ligands_expr = pd.DataFrame(expr, columns=["Wnt5a", "Col1a1", "Dll1", "Jag1", "Unknown"])
+        lr_db = pd.DataFrame(
+            {
+                "from": ["Wnt5a", "Col1a1", "Dll1", "Jag1", "Jag1"],
+                "to": ["Fzd1", "Itgb1", "Notch1", "Notch1", "Notch2"],
+                "type": ["Secreted Signaling", "ECM-Receptor", "Cell-Cell Contact", np.nan, "Secreted Signaling"],
+            }
+        )
+        spatial_weights_secreted = scipy.sparse.random(n_cells, n_cells, density=0.2, format="csr", random_state=1)
+        spatial_weights_membrane_bound = scipy.sparse.random(
+            n_cells, n_cells, density=0.1, format="csr", random_state=2
+        )
+
+        # Per-ligand reference
+        expected = np.zeros_like(expr)
+        for i, ligand in enumerate(ligands_expr.columns):
+            expr_sparse = scipy.sparse.csr_matrix(ligands_expr[ligand].values.reshape(-1, 1))
+            matching_rows = lr_db[lr_db["from"] == ligand]
+            if (
+                matching_rows["type"].str.contains("Secreted Signaling").any()
+                or matching_rows["type"].str.contains("ECM-Receptor").any()
+            ):
+                expected[:, i] = spatial_weights_secreted.dot(expr_sparse).toarray().flatten()
+            else:
+                expected[:, i] = spatial_weights_membrane_bound.dot(expr_sparse).toarray().flatten()
+
+        lagged = spatial_lag_ligands(ligands_expr, lr_db, spatial_weights_secreted, spatial_weights_membrane_bound)
+        np.testing.assert_allclose(lagged, expected)
@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+import numpy as np
+import scipy.sparse
+
+from spateo.tools import spatial_smooth
+
+from ..mixins import TestMixin
+
+
+class TestSparseJaccardSimilarity(TestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.data = scipy.sparse.random(120, 40, density=0.15, format="csr", random_state=0)
+        self.graph = scipy.sparse.random(120, 120, density=0.05, format="csr", random_state=1)
+        self.graph.data[:] = rng.random(self.graph.nnz)
+
+    def dense_reference(self, graph, min_jaccard, top_k=None):
+        reference = spatial_smooth.compute_jaccard_similarity_matrix(self.data.toarray(), min_jaccard=min_jaccard)
+        reference = reference * (graph.toarray() != 0)
+        if top_k is not None:
+            for row in reference:
+                # Keep the top_k highest similarities, breaking ties in favor of the lower column index.
+                order = np.lexsort((np.arange(len(row)), -row))
+                row[order[top_k:]] = 0
+        return reference
+
+    def test_neighbors(self):
+        for min_jaccard in [0.0, 0.1, 0.3]:
+            jaccard = spatial_smooth.compute_sparse_jaccard_similarity_matrix(
+                self.data, self.graph, min_jaccard=min_jaccard, shared_neighbors=False
+            )
+            self.assertTrue(scipy.sparse.isspmatrix_csr(jaccard))
+            np.testing.assert_allclose(jaccard.toarray(), self.dense_reference(self.graph, min_jaccard), atol=1e-6)
+
+    def test_shared_neighbors_top_k(self):
+        graph = (self.graph != 0).astype(float)
+        graph = graph + graph @ graph.T
+        jaccard = spatial_smooth.compute_sparse_jaccard_similarity_matrix(
+            self.data.toarray(), self.graph.toarray(), min_jaccard=0.05, top_k=3
+        )
+        np.testing.assert_allclose(jaccard.toarray(), self.dense_reference(graph, 0.05, top_k=3), atol=1e-6)
+        self.assertLessEqual(np.diff(jaccard.indptr).max(), 3)